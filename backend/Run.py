@@ -1,19 +1,34 @@
 from dotenv import load_dotenv
+import argparse
 import os
+import sys
+from datetime import date
 
 load_dotenv()
 
 #import all steps to our pipeline
 from ingestion.ingest_stats import run_ingestion
-from preprocessing.build_features import run_build_features
-from training.train_models import train_all_models
+from preprocessing.build_features import run_build_features, run_build_shared_features
+from training.scheduler import run_training_jobs
 from evalution.evaluate_models import run_eval
+from evalution.backtest import run_backtest
+from training.tuning import run_tuning
+from training.incremental import incremental_retrain
+from training.ensemble import run_ensemble
+from training.similarity import run_similarity_index
+from training.multi_output import compare_multi_output, run_multi_output_training
+from evalution.compiled_trees import microbenchmark
+from evalution.forecast import run_forecast
+from evalution.backfill import run_backfill
+from storage.io import load_dataframe
+from storage.model_io import read_manifest, read_tuned_params, load_artifact
+from pipeline.dag import DAG_MAX_PARALLEL, Stage, run_dag
 
 #define our s3 paths
 
 
 
-RAW_DATA_URI = "s3://mlb-ml-data/raw/batting.parquet"
+RAW_DATA_URI = "s3://mlb-ml-data/raw/batting"  # hive partitioned by Season
 FEATURES_URI = "s3://mlb-ml-data/prepared/features.parquet"
 
 MODELS_URI = "s3://mlb-ml-data/models"
@@ -46,69 +61,223 @@ EVAL_OUTPUT_URI = "s3://mlb-ml-data/evaluation"
 
 TARGET_STATS = ["HR", "AVG", "OPS", "wRC_PLUS"]
 
+#every target stat's features in one frame (multi-output mode)
+SHARED_FEATURES_URI = "s3://mlb-ml-data/prepared/features_shared.parquet"
 
+FEATURE_URIS = {stat: f"s3://mlb-ml-data/prepared/features_{stat}.parquet" for stat in TARGET_STATS}
 
-#ingest raw data
-run_ingestion(
-    start_year=2016,
-    end_year=2025,
-    min_pa=200,
-    # output_uri="data/raw/batting.parquet",
-    output_uri=RAW_DATA_URI
-)
+#last successful fingerprint of every pipeline stage (pipeline.dag)
+PIPELINE_STATE_URI = "s3://mlb-ml-data/pipeline/state.json"
 
-for stat in TARGET_STATS:
-    print(f"Building features for {stat}...")
+#one profile report per pipeline run (pipeline.profiling), also appended to the pipeline_profile table
+PIPELINE_REPORTS_URI = "s3://mlb-ml-data/pipeline/runs"
 
-    run_build_features(
-        target_stat=stat,
-        input_uri=RAW_DATA_URI,
-        output_uri=f"s3://mlb-ml-data/prepared/features_{stat}.parquet"
+
+
+def train(incremental=False):
+    if incremental:
+        #warm start from the published models, only the new seasons are fit
+        for stat in TARGET_STATS:
+            incremental_retrain(input_uri=FEATURE_URIS[stat], target_stat=stat, models_uri=BASE_MODEL_URI)
+    else:
+        #all 16 (stat, model) fits run across a process pool, the predictions and metrics
+        #tables are written straight from the fits (no separate eval pass)
+        run_training_jobs(feature_uris=FEATURE_URIS, models_uri=BASE_MODEL_URI)
+
+
+def evaluate_stat(stat):
+    run_eval(
+        models_uri=BASE_MODEL_URI,
+        features_uri=FEATURE_URIS[stat],
+        output_uri=f"{EVAL_OUTPUT_URI}/{stat}",
+        target_stat=stat
     )
 
-for stat in TARGET_STATS:
-    print(f"\nTraining models for {stat}...")
 
-    feature_uri = f"s3://mlb-ml-data/prepared/features_{stat}.parquet"
+def evaluate_all():
+    for stat in TARGET_STATS:
+        print(f"Evaluating models for {stat}...")
+        evaluate_stat(stat)
 
-    model_uris = {
-        "LinearRegression": f"{BASE_MODEL_URI}/{stat}_LinearRegression.pkl",
-        "Ridge": f"{BASE_MODEL_URI}/{stat}_Ridge.pkl",
-        "RandomForest": f"{BASE_MODEL_URI}/{stat}_RandomForest.pkl",
-        "XGBoost": f"{BASE_MODEL_URI}/{stat}_XGBoost.pkl"
-    }
 
-    metrics_uris = {
-        "LinearRegression": f"{BASE_MODEL_URI}/metrics_{stat}_LinearRegression.json",
-        "Ridge": f"{BASE_MODEL_URI}/metrics_{stat}_Ridge.json",
-        "RandomForest": f"{BASE_MODEL_URI}/metrics_{stat}_RandomForest.json",
-        "XGBoost": f"{BASE_MODEL_URI}/metrics_{stat}_XGBoost.json"
-    }
+def pipeline_stages(incremental=False):
+    """
+    The pipeline as a DAG: ingest -> features per stat -> train, then backtest -> (eval per stat) -> ensemble
+    -> forecast, then similarity (the "then"s share no data, they'd only compete for the cores)
+    """
+    manifest_uri = f"{BASE_MODEL_URI}/manifest.json"
+    oof_uri = f"{EVAL_OUTPUT_URI}/backtest/oof_predictions.parquet"
+    ensemble_outputs = [f"{BASE_MODEL_URI}/explain/{stat}_Ensemble.parquet" for stat in TARGET_STATS]
 
-    importance_uris = {
-        "LinearRegression": f"{BASE_MODEL_URI}/importance_{stat}_LinearRegression.parquet",
-        "Ridge": f"{BASE_MODEL_URI}/importance_{stat}_Ridge.parquet",
-        "RandomForest": f"{BASE_MODEL_URI}/importance_{stat}_RandomForest.parquet",
-        "XGBoost": f"{BASE_MODEL_URI}/importance_{stat}_XGBoost.parquet"
+    ingest_params = {
+        "start_year": 2016,
+        "end_year": 2025,
+        "min_pa": 200,
+        "output_uri": RAW_DATA_URI,
     }
+    #external data: while the current season is in range it is out of date once a day, so every run
+    #picks up the season still being played (the ingestion cache serves the finished ones), --force ingest otherwise
+    today = date.today()
+    in_season = ingest_params["start_year"] <= today.year <= ingest_params["end_year"]
 
-    train_all_models(
-        input_uri=feature_uri,
-        target_stat=stat,
-        model_uris=model_uris,
-        metrics_uris=metrics_uris,
-        importance_uris=importance_uris
-    )
+    stages = [
+        Stage("ingest", run_ingestion, outputs=[RAW_DATA_URI], code=["ingestion.schema"],
+              params=ingest_params, watch=[today.isoformat()] if in_season else []),
+    ]
 
-for stat in TARGET_STATS:
-    print(f"Evaluating models for {stat}...")
+    for stat in TARGET_STATS:
+        stages.append(Stage(f"features_{stat}", run_build_features,
+                            inputs=[RAW_DATA_URI], outputs=[FEATURE_URIS[stat]], code=["ingestion.schema"],
+                            params={"target_stat": stat, "input_uri": RAW_DATA_URI, "output_uri": FEATURE_URIS[stat]}))
 
-    run_eval(
+    stages.append(Stage("train", train,
+                        inputs=[*FEATURE_URIS.values(), f"{BASE_MODEL_URI}/tuned_params.json"],
+                        outputs=[manifest_uri],
+                        params={"incremental": incremental},
+                        code=["training.train_models", "training.scheduler", "training.incremental",
+                              "training.importance", "training.intervals", "evalution.evaluate_models"]))
+
+    #the ensemble's out-of-fold predictions, only rerun when the features or the tuned params change
+    stages.append(Stage("backtest", backtest,
+                        inputs=[*FEATURE_URIS.values(), f"{BASE_MODEL_URI}/tuned_params.json"],
+                        outputs=[oof_uri],
+                        code=["evalution.backtest", "training.train_models", "training.scheduler"],
+                        #no data dependency, but both size their process pool to every core
+                        after=["train"]))
+
+    if incremental:
+        #the fused training path writes these tables itself
+        for stat in TARGET_STATS:
+            stages.append(Stage(f"eval_{stat}", evaluate_stat, inputs=[manifest_uri, FEATURE_URIS[stat]],
+                                params={"stat": stat},
+                                code=["evalution.evaluate_models", "evalution.compiled_trees", "training.intervals"]))
+
+    stages.append(Stage("ensemble", ensemble,
+                        inputs=[manifest_uri, oof_uri, *FEATURE_URIS.values()],
+                        outputs=ensemble_outputs,
+                        code=["training.ensemble", "evalution.evaluate_models"]))
+
+    #after the ensemble, which publishes into the same manifest
+    stages.append(Stage("forecast", forecast, inputs=[RAW_DATA_URI, manifest_uri, *ensemble_outputs],
+                        code=["evalution.forecast", "preprocessing.build_features", "evalution.compiled_trees"]))
+
+    #also after the ensemble, both write the manifest and update_manifest isn't safe to run concurrently;
+    #and after the forecast, whose batch predicts already spread over the cores with the models' own threads
+    stages.append(Stage("similarity", similarity, inputs=[RAW_DATA_URI, manifest_uri, *ensemble_outputs],
+                        code=["training.similarity", "preprocessing.build_features"], after=["forecast"]))
+
+    return stages
+
+
+def main(incremental=False, force=(), force_all=False, only=None, dry_run=False, max_parallel=DAG_MAX_PARALLEL):
+    #stages that are already up to date are skipped, so rerunning after a failure resumes from it
+    status = run_dag(pipeline_stages(incremental), PIPELINE_STATE_URI, force=force, force_all=force_all,
+                     only=only, dry_run=dry_run, max_parallel=max_parallel, reports_uri=PIPELINE_REPORTS_URI)
+    if any(s in ("failed", "blocked") for s in status.values()):
+        sys.exit(1)
+
+
+def ensemble():
+    #blend of the just published models, weights fit on the backtest's out-of-fold predictions
+    run_ensemble(
+        feature_uris={stat: f"s3://mlb-ml-data/prepared/features_{stat}.parquet" for stat in TARGET_STATS},
         models_uri=BASE_MODEL_URI,
-        features_uri=f"s3://mlb-ml-data/prepared/features_{stat}.parquet",
-        output_uri=f"s3://mlb-ml-data/evaluation/{stat}",
-        target_stat=stat
+        oof_uri=f"{EVAL_OUTPUT_URI}/backtest/oof_predictions.parquet"
     )
 
-print("Pipeline complete.")
-# print("Evaluation Results:", eval_results)
\ No newline at end of file
+
+def forecast():
+    #projections for the season after the newest one ingested, from every published model
+    run_forecast(RAW_DATA_URI, BASE_MODEL_URI, stats=TARGET_STATS)
+
+
+def similarity():
+    #similar players index over every player-season, scaled like the published models
+    run_similarity_index(RAW_DATA_URI, BASE_MODEL_URI, stats=TARGET_STATS)
+
+
+def backfill():
+    #every historical season pair scored by every published model version (skips versions already stored)
+    run_backfill(
+        feature_uris={stat: f"s3://mlb-ml-data/prepared/features_{stat}.parquet" for stat in TARGET_STATS},
+        models_uri=BASE_MODEL_URI
+    )
+
+
+def multi_output():
+    #joint models for all target stats, compared against the per stat models
+    run_build_shared_features(TARGET_STATS, input_uri=RAW_DATA_URI, output_uri=SHARED_FEATURES_URI)
+    compare_multi_output(SHARED_FEATURES_URI, stats=TARGET_STATS)
+    run_multi_output_training(SHARED_FEATURES_URI, BASE_MODEL_URI, stats=TARGET_STATS)
+
+
+def bench_inference():
+    #compiled vs original tree model inference at batch sizes 1, 32 and 10k
+    manifest = read_manifest(BASE_MODEL_URI)
+    for stat in TARGET_STATS:
+        features_df = load_dataframe(f"s3://mlb-ml-data/prepared/features_{stat}.parquet")
+        for model_name in ["RandomForest", "XGBoost"]:
+            pipeline = load_artifact(manifest[f"{stat}_{model_name}"])
+            print(f"\n{stat} {model_name}")
+            print(microbenchmark(pipeline, features_df).to_string(index=False))
+
+
+def backtest():
+    #nightly walk-forward backtest over the already built features, fit with the params training publishes with
+    fold_metrics, _ = run_backtest(
+        feature_uris={stat: f"s3://mlb-ml-data/prepared/features_{stat}.parquet" for stat in TARGET_STATS},
+        output_uri=f"{EVAL_OUTPUT_URI}/backtest",
+        tuned_params=read_tuned_params(BASE_MODEL_URI)
+    )
+    #a stage that wrote nothing has to fail, otherwise the DAG records it as done and never retries it
+    if fold_metrics.empty:
+        raise RuntimeError("Backtest finished no fits, no out-of-fold predictions written")
+
+
+def tune():
+    #hyperparameter search, winners are used by the next training run
+    run_tuning(
+        feature_uris={stat: f"s3://mlb-ml-data/prepared/features_{stat}.parquet" for stat in TARGET_STATS},
+        models_uri=BASE_MODEL_URI
+    )
+
+
+#guarded so the training worker processes can import this module without rerunning the pipeline
+if __name__ == "__main__":
+    #python Run.py [run] -> the pipeline DAG, up to date stages skipped (rerun to resume after a failure)
+    #   --force STAGE (repeatable) / --force-all to rerun regardless, --only STAGE to run one stage (and what it needs)
+    #   --dry-run to list what would run
+    #python Run.py incremental -> same DAG with warm start retraining + eval per stat
+    #python Run.py backtest -> nightly backtest only, python Run.py tune -> hyperparameter search
+    #python Run.py bench-inference -> compiled inference timings
+    #python Run.py multi-output -> joint models for every stat + comparison with the per stat ones
+    #python Run.py eval -> re-score the published models without training
+    #python Run.py forecast -> upcoming season projections from the published models
+    #python Run.py backfill -> projection history for every published model version
+    #python Run.py ensemble -> refit the stacked ensemble from the cached backtest predictions
+    #python Run.py similarity -> rebuild the similar players index
+    commands = {
+        "backtest": backtest,
+        "tune": tune,
+        "bench-inference": bench_inference,
+        "multi-output": multi_output,
+        "eval": evaluate_all,
+        "forecast": forecast,
+        "backfill": backfill,
+        "ensemble": ensemble,
+        "similarity": similarity,
+    }
+    parser = argparse.ArgumentParser(description="InningAI pipeline")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "incremental", *commands])
+    parser.add_argument("--force", action="append", default=[], metavar="STAGE", help="rerun a stage even if up to date")
+    parser.add_argument("--force-all", action="store_true", help="rerun every stage")
+    parser.add_argument("--only", metavar="STAGE", help="run one stage, plus whatever upstream of it is out of date")
+    parser.add_argument("--dry-run", action="store_true", help="list the stages that would run")
+    parser.add_argument("--parallel", type=int, default=DAG_MAX_PARALLEL, help="stages run at once")
+    args = parser.parse_args()
+
+    if args.command in commands:
+        commands[args.command]()
+    else:
+        main(incremental=args.command == "incremental", force=args.force, force_all=args.force_all,
+             only=args.only, dry_run=args.dry_run, max_parallel=args.parallel)
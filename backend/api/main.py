@@ -1,14 +1,26 @@
 from fastapi import FastAPI, HTTPException
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from pathlib import Path
-from io import BytesIO
+import sys
+import time
+from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
+from pydantic import BaseModel
 
 from dotenv import load_dotenv
 load_dotenv()
 
+# backend/ on the path so the storage helpers import when run from backend/api
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from storage.io import load_dataframe
+from storage.backends import get_backend
+from storage.model_io import load_artifact, read_manifest
+from preprocessing.build_features import get_input_metrics, prep_forecast_rows, raw_columns_for
+from training.intervals import predict_interval
+
 app = FastAPI(title="MLB Prediction API")
 
 origins = [
@@ -38,13 +50,18 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME")
 
-DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine = create_engine(DATABASE_URL)
 
+RAW_DATA_URI = "s3://mlb-ml-data/raw/batting"  # hive partitioned by Season
+MODELS_URI = "s3://mlb-ml-data/models"
+
+
 # Helper function to load batting data with fallbacks
-def load_batting_data() -> pd.DataFrame:
+def load_batting_data(columns=None, filters=None) -> pd.DataFrame:
     """
     Load batting data from S3 first, then local fallbacks.
+    columns/filters are pushed down to parquet so only the needed seasons and columns are read
     Returns a DataFrame or raises an exception if all sources fail.
     """
     # Get the directory where this script is located
@@ -54,19 +71,16 @@ def load_batting_data() -> pd.DataFrame:
     
     # 1) Try S3 first
     try:
-        import boto3
-        s3 = boto3.client('s3')
-        buffer = BytesIO()
-        s3.download_fileobj(Bucket="mlb-ml-data", Key="raw/batting.parquet", Fileobj=buffer)
-        buffer.seek(0)
-        df = pd.read_parquet(buffer)
+        df = load_dataframe(RAW_DATA_URI, columns=columns, filters=filters)
         print("load_batting_data: Successfully loaded from S3")
         return df
     except Exception as s3_err:
         print(f"load_batting_data: S3 load failed: {s3_err}")
     
-    # 2) Try local parquet fallbacks
+    # 2) Try local parquet fallbacks (partitioned dataset, then legacy single file)
     local_paths = [
+        backend_dir / "data" / "raw" / "batting",
+        Path("data/raw/batting"),
         backend_dir / "data" / "raw" / "batting.parquet",
         project_root / "backend" / "data" / "raw" / "batting.parquet",
         Path("data/raw/batting.parquet"),
@@ -75,29 +89,12 @@ def load_batting_data() -> pd.DataFrame:
     
     for path in local_paths:
         try:
-            df = pd.read_parquet(path)
+            df = load_dataframe(str(path), columns=columns, filters=filters)
             print(f"load_batting_data: Successfully loaded from {path}")
             return df
         except Exception as local_err:
             print(f"load_batting_data: could not load {path}: {local_err}")
     
-    # 3) Try raw.csv fallback
-    csv_paths = [
-        backend_dir / "raw.csv",
-        project_root / "backend" / "raw.csv",
-        backend_dir.parent / "raw.csv",
-        Path("raw.csv"),
-        Path("backend/raw.csv"),
-    ]
-    
-    for path in csv_paths:
-        try:
-            df = pd.read_csv(path)
-            print(f"load_batting_data: Successfully loaded from CSV {path}")
-            return df
-        except Exception as csv_err:
-            print(f"load_batting_data: could not load CSV {path}: {csv_err}")
-    
     raise FileNotFoundError("Could not load batting data from any source")
 
 
@@ -106,6 +103,252 @@ def clean_model_name(model: str) -> str:
     return model.split(":")[0]
 
 
+STATS = ["hr", "avg", "ops", "wrc_plus"]
+MODELS = ["LinearRegression", "Ridge", "RandomForest", "XGBoost", "Ensemble"]
+
+# API stat/model names -> the names the training pipeline uses for artifacts
+PIPELINE_STATS = {"hr": "HR", "avg": "AVG", "ops": "OPS", "wrc_plus": "wRC_PLUS"}
+PIPELINE_MODELS = {m.lower(): m for m in MODELS}
+
+
+# Player name -> IDfg index from the raw batting data, so every player who ever played resolves
+# (not just the ones in one predictions table); rebuilt at most every PLAYER_NAMES_REFRESH_SECONDS
+PLAYER_NAMES_REFRESH_SECONDS = 300
+_player_names = None
+
+
+def load_player_names():
+    global _player_names
+    current = _player_names
+    if current and time.time() - current["checked_at"] < PLAYER_NAMES_REFRESH_SECONDS:
+        return current["names"]
+
+    df = load_batting_data(columns=["IDfg", "Name", "Season"])
+    # newest spelling of each player's name
+    latest = df.sort_values("Season").drop_duplicates("IDfg", keep="last")
+    names = pd.DataFrame({
+        "IDfg": latest["IDfg"].astype(int).to_numpy(),
+        "Name": latest["Name"].astype(str).to_numpy(),
+        "Season": latest["Season"].astype(int).to_numpy(),
+    }).sort_values(["Name", "Season"], ascending=[True, False]).reset_index(drop=True)
+    names["Lower"] = names["Name"].str.lower()
+
+    _player_names = {"names": names, "checked_at": time.time()}
+    return names
+
+
+# Helper: resolve a player name to a FanGraphs id (IDfg) once at the API boundary
+# Exact (case-insensitive) matches win over partial matches so "Will Smith" doesn't match "Will Smithson",
+# players sharing a name resolve to the one who played most recently
+def resolve_player_id(player_name: str):
+    names = load_player_names()
+    lower = player_name.lower()
+    exact = names[names["Lower"] == lower]
+    matches = exact if not exact.empty else names[names["Lower"].str.contains(lower, regex=False)]
+    if matches.empty:
+        return None
+    return int(matches["IDfg"].iloc[0])
+
+
+# Helper: latest prediction for a player from every stat/model table, keyed on IDfg
+def fetch_player_predictions(conn, player_id: int):
+    results = []
+    # the ensemble's tables only exist once a backtest has run, skip whatever isn't there yet
+    existing = set(inspect(conn).get_table_names())
+    for stat in STATS:
+        for model in MODELS:
+            if f"{stat}_{model.lower()}_predictions" not in existing:
+                continue
+            table_name = f'"{stat}_{model.lower()}_predictions"'
+            q = text(f"""
+                SELECT *, :stat AS stat, :model AS model 
+                FROM {table_name}
+                WHERE "IDfg" = :player_id
+                ORDER BY "Next_Season" DESC
+                LIMIT 1
+                     """)
+            result = conn.execute(q, {
+                "player_id": player_id,
+                "stat": stat.upper(),
+                "model": model.lower()
+            })
+            row = result.fetchone()
+            if row:
+                results.append(dict(row._mapping))
+    return results
+
+
+# Helper: next season forecasts for a player (forecast table is written by evalution.forecast)
+FORECAST_TABLE = "forecast_predictions"
+
+
+def fetch_player_forecasts(conn, player_id: int):
+    q = text(f"""
+        SELECT *
+        FROM {FORECAST_TABLE}
+        WHERE "IDfg" = :player_id
+        ORDER BY "Stat", "Model"
+             """)
+    return [dict(row._mapping) for row in conn.execute(q, {"player_id": player_id})]
+
+
+def player_predictions_response(player_id: int, player_name: str = None):
+    """
+    Every stat/model prediction plus upcoming forecasts for one player, 404 only if there are neither
+    """
+    with engine.connect() as conn:
+        results = fetch_player_predictions(conn, player_id)
+    forecasts = try_fetch_player_forecasts(player_id)
+    if not results and not forecasts:
+        raise HTTPException(status_code=404, detail="Player not found")
+
+    return {
+        "player": player_name or (results or forecasts)[0]["Player"],
+        "player_id": player_id,
+        "count": len(results),
+        "predictions": results,
+        "forecasts": forecasts
+    }
+
+
+def try_fetch_player_forecasts(player_id: int):
+    # own connection: before the first forecast run the table doesn't exist, and a failed
+    # statement would abort the transaction the predictions were read in
+    try:
+        with engine.connect() as conn:
+            return fetch_player_forecasts(conn, player_id)
+    except Exception as e:
+        print(f"forecasts unavailable: {e}")
+        return []
+
+
+# Per-player SHAP explanations, one matrix per stat/model kept in memory
+# uri -> {"etag", "checked_at", "index" (IDfg -> row), "values", "features", "predicted", "base"}
+_explanations = {}
+EXPLAIN_REFRESH_SECONDS = 300  # how often a cached matrix checks for a newer publish
+
+
+def load_explanations(stat: str, model: str):
+    uri = f"{MODELS_URI}/explain/{PIPELINE_STATS[stat]}_{PIPELINE_MODELS[model]}.parquet"
+    cached = _explanations.get(uri)
+    if cached and time.time() - cached["checked_at"] < EXPLAIN_REFRESH_SECONDS:
+        return cached
+
+    etag = get_backend(uri).etag(uri)
+    if cached and cached["etag"] == etag:
+        cached["checked_at"] = time.time()
+        return cached
+
+    df = load_dataframe(uri)
+    features = [c for c in df.columns if c not in ("IDfg", "Predicted", "Base_Value")]
+    cached = {
+        "etag": etag,
+        "checked_at": time.time(),
+        "index": {int(player_id): i for i, player_id in enumerate(df["IDfg"].to_numpy())},
+        "values": df[features].to_numpy(dtype=np.float32),
+        "features": features,
+        "predicted": df["Predicted"].to_numpy(dtype=np.float32),
+        "base": df["Base_Value"].to_numpy(dtype=np.float32),
+    }
+    _explanations[uri] = cached
+    return cached
+
+
+# The published manifest, reread at most every EXPLAIN_REFRESH_SECONDS (artifacts themselves are cached by load_artifact)
+_manifest = None
+
+
+def published_manifest():
+    global _manifest
+    current = _manifest
+    if current and time.time() - current["checked_at"] < EXPLAIN_REFRESH_SECONDS:
+        return current["entries"]
+    _manifest = {"entries": read_manifest(MODELS_URI), "checked_at": time.time()}
+    return _manifest["entries"]
+
+
+# Similar players: ball tree over every standardized player-season (built by training.similarity on each publish)
+# the loaded index is swapped whole when the manifest points at a new version, so requests never see half of one
+SIMILARITY_ARTIFACT = "Similarity_Index"
+SIMILAR_MAX_K = 50
+_similarity = None
+
+
+def load_similarity_index():
+    global _similarity
+    current = _similarity
+    entry = published_manifest().get(SIMILARITY_ARTIFACT)
+    if entry is None:
+        raise FileNotFoundError("No similarity index has been published")
+    if current and current["version"] == entry["version"]:
+        return current
+
+    index = load_artifact(entry)
+    ids, seasons = index["ids"], index["seasons"]
+    rows, latest, counts = {}, {}, {}
+    for i, (player_id, season) in enumerate(zip(ids.tolist(), seasons.tolist())):
+        rows[(player_id, season)] = i
+        latest[player_id] = max(season, latest.get(player_id, season))
+        counts[player_id] = counts.get(player_id, 0) + 1
+
+    _similarity = {
+        "version": entry["version"],
+        "index": index,
+        "X": np.asarray(index["tree"].data),
+        "rows": rows,  # (IDfg, Season) -> row
+        "latest": latest,  # IDfg -> newest season
+        "counts": counts,  # IDfg -> seasons in the index
+        "metrics": [c.replace("Current_", "", 1) for c in index["features"]],
+    }
+    return _similarity
+
+
+def similarity_row(similarity, row, distance=None):
+    index = similarity["index"]
+    result = {
+        "IDfg": int(index["ids"][row]),
+        "Player": str(index["names"][row]),
+        "Season": int(index["seasons"][row]),
+        "Team": str(index["teams"][row]),
+        "Stats": {
+            metric: (None if np.isnan(value) else round(float(value), 4))
+            for metric, value in zip(similarity["metrics"], index["values"][row])
+        },
+    }
+    if distance is not None:
+        result["Distance"] = round(float(distance), 4)
+    return result
+
+
+# What-if projections: a player's feature row with a grid of overrides, scored in one predict per pipeline
+# the limits bound the matrix (and the per-tree interval matrices) a single request can ask for
+SIMULATE_MAX_FEATURES = 3
+SIMULATE_MAX_VALUES = 25  # per feature
+SIMULATE_MAX_ROWS = 2000  # scenarios after expanding the grid
+
+
+class SimulationRequest(BaseModel):
+    player_id: int
+    stat: str
+    models: Optional[List[str]] = None  # default: every published model
+    season: Optional[int] = None  # season the projection starts from, default: the player's latest
+    grid: Dict[str, List[float]]  # metric (e.g. "Age" or "Current_Age") -> values to try
+
+
+def expand_grid(base_row, grid):
+    """
+    Scenario matrix: row 0 is the unmodified player, then every combination of the grid values
+    (itertools.product order, so the last feature varies fastest)
+    """
+    columns = list(grid)
+    mesh = np.meshgrid(*grid.values(), indexing="ij")
+    X = pd.DataFrame(np.repeat(base_row.to_numpy(dtype=np.float64)[None, :], mesh[0].size + 1, axis=0),
+                     columns=base_row.index)
+    for column, values in zip(columns, mesh):
+        X.loc[1:, column] = values.ravel()
+    return X
+
+
 @app.get("/")
 def root():
     return {"message": "MLB Prediction API is running."}
@@ -115,6 +358,7 @@ def get_predictions(stat: str, model: str, limit: int = 10000):
     
     """
         Retrieve the latest predictions for a specified model
+        Rows include Lower/Upper, the 80% prediction interval around Predicted
         Ex: /predictions?stat=HR&model=XGBoost
     """
     model = clean_model_name(model)
@@ -141,50 +385,224 @@ def get_predictions(stat: str, model: str, limit: int = 10000):
         raise HTTPException(status_code=400, detail=str(e))
     
 
-@app.get("/player/{player_name}")
-def get_player_prediction(player_name: str):
+@app.get("/forecast")
+def get_forecast(stat: str, model: str, limit: int = 10000):
     """
-        Retrieve all predictions for a specified player across all models
-        Ex: /player/Mike Trout
+        Projections for the upcoming season (no actuals yet), with Lower/Upper 80% intervals
+        Ex: /forecast?stat=HR&model=XGBoost
     """
+    stat = stat.lower()
+    model = clean_model_name(model).lower()
+    if stat not in PIPELINE_STATS or model not in PIPELINE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown stat/model: {stat}/{model}")
 
-    stats = ["hr", "avg", "ops", "wrc_plus"]
-    # stat_changed = stat.lower().replace("+", "plus")
-    models = ["linearregression", "ridge", "randomforest", "xgboost"]
-
-    results = []
+    q = text(f"""
+        SELECT *
+        FROM {FORECAST_TABLE}
+        WHERE "Stat" = :stat AND "Model" = :model
+        ORDER BY "Player"
+        LIMIT :limit
+             """)
 
-  
     try:
         with engine.connect() as conn:
-            for stat in stats:
-                for model in models:
-                    table_name = f'"{stat}_{model}_predictions"'
-                    q = text(f"""
-                        SELECT *, :stat AS stat, :model AS model 
-                        FROM {table_name}
-                        WHERE "Player" ILIKE :player
-                        ORDER BY "Next_Season" DESC
-                        LIMIT 1
-                             """)
-                    result = conn.execute(q, {
-                        "player": f"%{player_name}%",
-                        "stat": stat.upper(),
-                        "model": model
-                    })
-                    row = result.fetchone()
-                    if row:
-                        results.append(dict(row._mapping))
-        if not results:
-            raise HTTPException(status_code=404, detail="Player not found")
-        
+            result = conn.execute(q, {"stat": PIPELINE_STATS[stat], "model": PIPELINE_MODELS[model], "limit": limit})
+            rows = [dict(row._mapping) for row in result]
         return {
-            "player": player_name,
-            "count": len(results),
-            "predictions": results
+            "stat": stat,
+            "model": model,
+            "season": rows[0]["Next_Season"] if rows else None,
+            "count": len(rows),
+            "forecasts": rows
         }
-    
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/player/by-id/{player_id}")
+def get_player_prediction_by_id(player_id: int):
+    """
+        Retrieve all predictions for a player by FanGraphs id (no name matching)
+        plus their upcoming season forecasts
+        Ex: /player/by-id/10155
+    """
+    try:
+        return player_predictions_response(player_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/player/{player_id}/explain")
+def get_player_explanation(player_id: int, stat: str, model: str):
+    """
+        Why a player got their projection: per-feature SHAP contributions for one stat/model
+        Base_Value + sum of contributions = Predicted
+        Ex: /player/10155/explain?stat=OPS&model=XGBoost
+    """
+    stat = stat.lower()
+    model = clean_model_name(model).lower()
+    if stat not in PIPELINE_STATS or model not in PIPELINE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown stat/model: {stat}/{model}")
 
+    try:
+        explanations = load_explanations(stat, model)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not load explanations: {e}")
+
+    row = explanations["index"].get(player_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+
+    values = explanations["values"][row]
+    order = np.argsort(-np.abs(values))
+    contributions = [
+        {"Feature": explanations["features"][i], "Contribution": float(values[i])}
+        for i in order
+    ]
+
+    return {
+        "player_id": player_id,
+        "stat": stat.upper(),
+        "model": model,
+        "Predicted": float(explanations["predicted"][row]),
+        "Base_Value": float(explanations["base"][row]),
+        "contributions": contributions
+    }
+
+
+@app.get("/player/{player_id}/similar")
+def get_similar_players(player_id: int, k: int = 10, season: Optional[int] = None):
+    """
+        The k most similar player-seasons to a player's season (default: their latest), other players only
+        Distance is euclidean over the standardized input metrics of every target stat
+        Ex: /player/10155/similar?k=5&season=2023
+    """
+    if not 1 <= k <= SIMILAR_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {SIMILAR_MAX_K}")
+
+    try:
+        similarity = load_similarity_index()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not load similarity index: {e}")
+
+    season = season if season is not None else similarity["latest"].get(player_id)
+    row = similarity["rows"].get((player_id, season))
+    if row is None:
+        raise HTTPException(status_code=404, detail="Player season not found")
+
+    #the player's own seasons are nearest to each other, ask for enough extra rows to drop them all
+    n_rows = len(similarity["X"])
+    n_query = min(k + similarity["counts"][player_id], n_rows)
+    distances, rows = similarity["index"]["tree"].query(similarity["X"][row:row + 1], k=n_query)
+
+    similar = [
+        similarity_row(similarity, neighbor, distance)
+        for distance, neighbor in zip(distances[0], rows[0])
+        if similarity["index"]["ids"][neighbor] != player_id
+    ][:k]
+
+    return {
+        **similarity_row(similarity, row),
+        "player_id": player_id,
+        "k": len(similar),
+        "similar": similar,
+    }
+
+
+@app.post("/simulate")
+def simulate(request: SimulationRequest):
+    """
+        Projection response surface for a grid of feature overrides on one player
+        Body: {"player_id": 10155, "stat": "ops", "models": ["xgboost"], "grid": {"Age": [29, 30, 31], "ISO": [0.2, 0.25]}}
+        Predicted/Lower/Upper are flattened with the last grid feature varying fastest, Base is the unmodified player
+    """
+    stat = request.stat.lower()
+    models = [clean_model_name(m).lower() for m in request.models] if request.models else list(PIPELINE_MODELS)
+    if stat not in PIPELINE_STATS or any(m not in PIPELINE_MODELS for m in models):
+        raise HTTPException(status_code=400, detail=f"Unknown stat/model: {stat}/{models}")
+
+    grid = {name if name.startswith("Current_") else f"Current_{name}": values for name, values in request.grid.items()}
+    n_rows = int(np.prod([len(values) for values in grid.values()])) if grid else 0
+    if not 1 <= len(grid) <= SIMULATE_MAX_FEATURES:
+        raise HTTPException(status_code=400, detail=f"grid must vary 1 to {SIMULATE_MAX_FEATURES} features")
+    if any(not 1 <= len(values) <= SIMULATE_MAX_VALUES for values in grid.values()):
+        raise HTTPException(status_code=400, detail=f"Each grid feature takes 1 to {SIMULATE_MAX_VALUES} values")
+    if n_rows > SIMULATE_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"grid expands to {n_rows} scenarios, the limit is {SIMULATE_MAX_ROWS}")
+
+    try:
+        manifest = published_manifest()
+        #model name -> manifest entry, models that were never published are left out
+        entries = {
+            PIPELINE_MODELS[m]: manifest[f"{PIPELINE_STATS[stat]}_{PIPELINE_MODELS[m]}"]
+            for m in models if f"{PIPELINE_STATS[stat]}_{PIPELINE_MODELS[m]}" in manifest
+        }
+        if not entries:
+            raise FileNotFoundError(f"No published models for {stat}/{models}")
+        pipelines = {model: load_artifact(entry) for model, entry in entries.items()}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not load models: {e}")
+
+    #every model of a stat takes the same inputs
+    features = list(next(iter(pipelines.values())).feature_names_in_)
+    unknown = [c.replace("Current_", "", 1) for c in grid if c not in features]
+    if unknown:
+        valid = [c.replace("Current_", "", 1) for c in features]
+        raise HTTPException(status_code=400, detail=f"Not model inputs for {stat}: {unknown}, valid: {valid}")
+
+    inputs = get_input_metrics(PIPELINE_STATS[stat])
+    try:
+        df = load_batting_data(columns=raw_columns_for(inputs), filters=[("IDfg", "==", request.player_id)])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if df.empty:
+        raise HTTPException(status_code=404, detail="Player not found")
+    season = request.season if request.season is not None else int(df["Season"].max())
+    rows = prep_forecast_rows(df, inputs, forecast_season=season + 1)
+    if rows.empty:
+        raise HTTPException(status_code=404, detail="Player season not found")
+
+    X = expand_grid(rows.iloc[0][features], grid)
+    surface = {}
+    for model, pipeline in pipelines.items():
+        predictions = pipeline.predict(X)
+        result = {"Base": round(float(predictions[0]), 4), "Predicted": predictions[1:].round(4).tolist()}
+        if "interval" in entries[model]:
+            lower, upper = predict_interval(pipeline, load_artifact(entries[model]["interval"]), X, predictions)
+            result["Lower"] = np.asarray(lower[1:]).round(4).tolist()
+            result["Upper"] = np.asarray(upper[1:]).round(4).tolist()
+        surface[model] = result
+
+    return {
+        "player_id": request.player_id,
+        "player": str(rows["Name"].iloc[0]),
+        "stat": stat.upper(),
+        "season": season,
+        "next_season": season + 1,
+        "base": {c.replace("Current_", "", 1): float(X.at[0, c]) for c in grid},
+        "grid": {c.replace("Current_", "", 1): values for c, values in grid.items()},
+        "shape": [len(values) for values in grid.values()],
+        "surface": surface,
+    }
+
+
+@app.get("/player/{player_name}")
+def get_player_prediction(player_name: str):
+    """
+        Retrieve all predictions for a specified player across all models (with Lower/Upper intervals)
+        plus their upcoming season forecasts
+        Ex: /player/Mike Trout
+    """
+    try:
+        player_id = resolve_player_id(player_name)
+        if player_id is None:
+            raise HTTPException(status_code=404, detail="Player not found")
+        return player_predictions_response(player_id, player_name)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     
@@ -192,13 +610,10 @@ def get_player_prediction(player_name: str):
 @app.get("/meta")
 def get_metadata():
 
-    stats = ["hr", "avg", "ops", "wrc_plus"]
-    models = ["LinearRegression", "Ridge", "RandomForest", "XGBoost"]
-
     combos = [
         {"stat": s, "model": m}
-        for s in stats
-        for m in models
+        for s in STATS
+        for m in MODELS
     ]
 
     return {"available_predictions": combos}
@@ -218,7 +633,7 @@ def get_stats():
     
     # Try S3/local file first (training data is stored in parquet, not database)
     try:
-        df = load_batting_data()
+        df = load_batting_data(columns=["IDfg", "Season"])
         years = sorted(df["Season"].unique().tolist()) if "Season" in df.columns else []
         
         # Check if we have complete data (should include 2016)
@@ -229,7 +644,7 @@ def get_stats():
         
         return {
             "total_player_seasons": len(df),
-            "unique_players": df["Name"].nunique() if "Name" in df.columns else 0,
+            "unique_players": df["IDfg"].nunique() if "IDfg" in df.columns else 0,
             "years": years
         }
     except Exception as e:
@@ -303,7 +718,8 @@ def get_importance(stat: str, model: str):
         "xgboost": "XGBoost",
         "randomforest": "RandomForest", 
         "linearregression": "LinearRegression",
-        "ridge": "Ridge"
+        "ridge": "Ridge",
+        "ensemble": "Ensemble"
     }
     model_key = model_map.get(model.lower(), model)
     filename = f"importance_{stat.upper()}_{model_key}.parquet"
@@ -338,47 +754,41 @@ def get_players():
         Used for the player search dropdown
     """
     try:
-        # Get unique player names from predictions table
+        # Get unique players from predictions table
         q = text("""
-            SELECT DISTINCT "Player"
+            SELECT DISTINCT "IDfg", "Player"
             FROM ops_linearregression_predictions
             ORDER BY "Player"
         """)
         
         with engine.connect() as conn:
             result = conn.execute(q)
-            player_names = [row._mapping["Player"] for row in result]
+            player_rows = [dict(row._mapping) for row in result]
         
-        # Try to load raw batting data for enrichment (Team, Age, PA)
+        # Try to load raw batting data for enrichment (Team, Age, PA), indexed by IDfg
         latest_df = None
         try:
-            df = load_batting_data()
-            latest_df = df.sort_values("Season", ascending=False).drop_duplicates("Name", keep="first")
+            df = load_batting_data(columns=["IDfg", "Season", "Team", "Age", "PA"])
+            latest_df = df.sort_values("Season", ascending=False).drop_duplicates("IDfg", keep="first").set_index("IDfg")
         except Exception as batting_err:
             print(f"/players: Could not load batting data for enrichment: {batting_err}")
         
         players = []
-        for name in player_names:
-            if latest_df is not None:
-                player_data = latest_df[latest_df["Name"] == name]
-                if not player_data.empty:
-                    row = player_data.iloc[0]
-                    players.append({
-                        "Player": name,
-                        "Team": row.get("Team", "N/A"),
-                        "Age": int(row.get("Age", 0)) if pd.notna(row.get("Age")) else None,
-                        "PA": int(row.get("PA", 0)) if pd.notna(row.get("PA")) else None
-                    })
-                else:
-                    players.append({
-                        "Player": name,
-                        "Team": "N/A",
-                        "Age": None,
-                        "PA": None
-                    })
+        for player_row in player_rows:
+            player_id = int(player_row["IDfg"])
+            if latest_df is not None and player_id in latest_df.index:
+                row = latest_df.loc[player_id]
+                players.append({
+                    "IDfg": player_id,
+                    "Player": player_row["Player"],
+                    "Team": row.get("Team", "N/A"),
+                    "Age": int(row.get("Age", 0)) if pd.notna(row.get("Age")) else None,
+                    "PA": int(row.get("PA", 0)) if pd.notna(row.get("PA")) else None
+                })
             else:
                 players.append({
-                    "Player": name,
+                    "IDfg": player_id,
+                    "Player": player_row["Player"],
                     "Team": "N/A",
                     "Age": None,
                     "PA": None
@@ -392,6 +802,59 @@ def get_players():
         raise HTTPException(status_code=400, detail=str(e))
 
 
+HISTORY_COLUMNS = ["IDfg", "Name", "Season", "OPS"]
+
+
+# Helper: OPS history from raw batting data plus the OPS prediction, keyed on IDfg
+def build_player_history(df, player_id: int):
+    player_df = df[df["IDfg"] == player_id]
+    if player_df.empty:
+        return None
+
+    # Get OPS by season, sorted
+    history = player_df[["Season", "OPS"]].sort_values("Season")
+
+    # Get 2025 prediction for OPS from LinearRegression
+    pred_q = text("""
+        SELECT "Predicted"
+        FROM ops_linearregression_predictions
+        WHERE "IDfg" = :player_id
+        LIMIT 1
+    """)
+
+    predicted_2025 = None
+    with engine.connect() as conn:
+        result = conn.execute(pred_q, {"player_id": player_id})
+        row = result.fetchone()
+        if row:
+            predicted_2025 = row._mapping["Predicted"]
+
+    return {
+        "player": str(player_df["Name"].iloc[0]),
+        "player_id": player_id,
+        "history": history.to_dict(orient="records"),
+        "predicted_2025_ops": predicted_2025
+    }
+
+
+@app.get("/player-history/by-id/{player_id}")
+def get_player_history_by_id(player_id: int):
+    """
+        Retrieve historical OPS data for a player by FanGraphs id
+        Ex: /player-history/by-id/10155
+    """
+    try:
+        df = load_batting_data(columns=HISTORY_COLUMNS, filters=[("IDfg", "==", player_id)])
+        response = build_player_history(df, player_id)
+        if response is None:
+            raise HTTPException(status_code=404, detail="Player not found")
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/player-history/{player_name}")
 def get_player_history(player_name: str):
     """
@@ -399,39 +862,15 @@ def get_player_history(player_name: str):
         Returns actual OPS from raw batting data for the chart
     """
     try:
-        # Load raw batting data using helper with S3 + local fallbacks
-        df = load_batting_data()
-        
-        # Filter for the player (case-insensitive partial match)
-        player_df = df[df["Name"].str.lower().str.contains(player_name.lower())]
-        
-        if player_df.empty:
+        # Same name resolution as /player/{name}, then only that player's rows are read
+        player_id = resolve_player_id(player_name)
+        if player_id is None:
             raise HTTPException(status_code=404, detail="Player not found")
-        
-        # Get OPS by season, sorted
-        history = player_df[["Season", "OPS"]].sort_values("Season")
-        
-        # Get 2025 prediction for OPS from LinearRegression
-        pred_q = text("""
-            SELECT "Predicted"
-            FROM ops_linearregression_predictions
-            WHERE "Player" ILIKE :player
-            LIMIT 1
-        """)
-        
-        predicted_2025 = None
-        with engine.connect() as conn:
-            result = conn.execute(pred_q, {"player": f"%{player_name}%"})
-            row = result.fetchone()
-            if row:
-                predicted_2025 = row._mapping["Predicted"]
-        
-        return {
-            "player": player_name,
-            "history": history.to_dict(orient="records"),
-            "predicted_2025_ops": predicted_2025
-        }
+
+        response = get_player_history_by_id(player_id)
+        response["player"] = player_name
+        return response
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,114 @@
+import os
+import platform
+import time
+
+from storage.model_io import read_json, write_json
+
+
+#json baselines shared by the stage benchmarks (bench.suite) and the api load test (bench.load_test)
+#
+#a result file is {"kind", "created_at", "machine", "config", "results": {case: {metric: value}}}
+#compare_results flags every case whose metric moved the wrong way by more than the threshold;
+#numbers are only comparable between runs on the same machine, which is why the machine is recorded;
+#for the same reason no baseline is committed, each machine records its own with --save-baseline
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+REGRESSION_THRESHOLD = 0.2  # 20% worse than the baseline
+
+
+def machine_info():
+    return {
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def results_file(kind, results, config):
+    return {
+        "kind": kind,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "machine": machine_info(),
+        "config": config,
+        "results": results,
+    }
+
+
+def save_results(path, kind, results, config):
+    write_json(path, results_file(kind, results, config))
+    print(f"Results saved to {path}")
+
+
+def load_results(path):
+    data = read_json(path)
+    if not data:
+        raise FileNotFoundError(f"No benchmark results at {path}")
+    return data
+
+
+def load_baseline(path):
+    """
+    The saved baseline, None (with a hint) if this machine hasn't recorded one yet
+    """
+    data = read_json(path)
+    if not data:
+        print(f"No baseline at {path}: baselines are per machine, record one here with --save-baseline first")
+        return None
+    return data
+
+
+def compare_results(baseline, current, directions, threshold=REGRESSION_THRESHOLD, floors=None):
+    """
+    Cases that regressed against the baseline
+
+    directions: {metric: 1 if higher is worse (seconds, MB, latency), -1 if lower is worse (throughput)}
+    floors: {metric: smallest absolute change that counts}, so millisecond cases don't flag on timer noise
+    Returns [(case, metric, baseline value, current value, change)], change is the relative move in the bad direction
+    """
+    if baseline.get("kind") != current.get("kind"):
+        raise ValueError(f"Can't compare {baseline.get('kind')} results with {current.get('kind')} results")
+    if baseline.get("machine", {}).get("host") != current.get("machine", {}).get("host"):
+        print("Warning: baseline was recorded on a different machine, differences may not be regressions")
+
+    regressions = []
+    for case, metrics in current["results"].items():
+        base = baseline["results"].get(case)
+        if base is None:
+            continue
+        for metric, direction in directions.items():
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * direction
+            if change > threshold and abs(new - old) >= (floors or {}).get(metric, 0):
+                regressions.append((case, metric, old, new, change))
+    return regressions
+
+
+def print_comparison(baseline, current, directions, threshold=REGRESSION_THRESHOLD, floors=None):
+    """
+    Baseline vs current table for every shared case, regressions marked; returns the regressions
+    """
+    regressions = compare_results(baseline, current, directions, threshold, floors)
+    flagged = {(case, metric) for case, metric, *_ in regressions}
+
+    print(f"Baseline {baseline['created_at']} vs current {current['created_at']} (threshold {threshold:.0%})")
+    for case, metrics in current["results"].items():
+        base = baseline["results"].get(case)
+        if base is None:
+            print(f"  {case}: new, no baseline")
+            continue
+        parts = []
+        for metric in directions:
+            old, new = base.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            mark = " REGRESSED" if (case, metric) in flagged else ""
+            parts.append(f"{metric} {old:.4g} -> {new:.4g}{mark}")
+        print(f"  {case}: " + ", ".join(parts))
+
+    print(f"{len(regressions)} regression(s)" if regressions else "No regressions")
+    return regressions
@@ -0,0 +1,425 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+#api load test: python -m bench.load_test (from backend/)
+#
+#seeds a database (sqlite file by default, or --database-url for a local postgres) with synthetic
+#*_predictions / *_metrics / *_importance / forecast tables written through the pipeline's own writers,
+#plus the batting parquet and explanation matrices under a local storage root, then drives every route
+#of api/main.py from --concurrency threads with a weighted request mix
+#the api runs under uvicorn in a subprocess against the fixture (--in-process calls the app directly,
+#--url targets a server that is already running) and every route gets throughput and p50/p95/p99 latency
+#
+#the fixture is configured through the same environment the api reads (DATABASE_URL, INNINGAI_STORAGE*),
+#which has to be in place before storage.db or api.main are imported, hence the imports inside functions
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+FIXTURE_STATS = ["HR", "AVG", "OPS", "wRC_PLUS"]
+FIXTURE_SEASON = 2025
+
+#route -> weight in the default mix, roughly what the frontend sends (player pages dominate)
+DEFAULT_MIX = {
+    "root": 1,
+    "meta": 1,
+    "stats": 1,
+    "players": 1,
+    "predictions": 4,
+    "forecast": 2,
+    "metrics": 3,
+    "importance": 3,
+    "player_by_id": 6,
+    "player_by_name": 2,
+    "player_explain": 4,
+    "player_similar": 2,
+    "player_history_by_id": 3,
+    "player_history_by_name": 1,
+}
+
+#metric -> 1 if higher is worse, -1 if lower is worse
+LOAD_DIRECTIONS = {"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "throughput_rps": -1, "error_rate": 1}
+LOAD_FLOORS = {"p50_ms": 1, "p95_ms": 2, "p99_ms": 5, "throughput_rps": 1, "error_rate": 0.01}
+
+
+def route_path(route, fixture, rng):
+    """
+    A request path for a route with a random player / stat / model from the fixture
+    """
+    stat = rng.choice(fixture["stats"])
+    model = rng.choice(fixture["models"])
+    player_id = int(rng.choice(fixture["player_ids"]))
+    name = fixture["names"][player_id]
+
+    paths = {
+        "root": "/",
+        "meta": "/meta",
+        "stats": "/stats",
+        "players": "/players",
+        "predictions": f"/predictions?stat={stat}&model={model}",
+        "forecast": f"/forecast?stat={stat}&model={model}",
+        "metrics": f"/metrics?stat={stat}&model={model}",
+        "importance": f"/importance?stat={stat}&model={model}",
+        "player_by_id": f"/player/by-id/{player_id}",
+        "player_by_name": f"/player/{name}",
+        "player_explain": f"/player/{player_id}/explain?stat={stat}&model={model}",
+        "player_similar": f"/player/{player_id}/similar?k=10",
+        "player_history_by_id": f"/player-history/by-id/{player_id}",
+        "player_history_by_name": f"/player-history/{name}",
+    }
+    return paths[route]
+
+
+def configure_fixture_env(fixture_dir, database_url=None):
+    """
+    Point storage and the database at the fixture (this process and any server it starts)
+    """
+    fixture_dir = Path(fixture_dir)
+    os.environ["INNINGAI_STORAGE"] = "local"
+    os.environ["INNINGAI_STORAGE_ROOT"] = str(fixture_dir / "store")
+    os.environ["INNINGAI_CACHE_DIR"] = str(fixture_dir / "cache")
+    os.environ["INNINGAI_ARTIFACT_DIR"] = str(fixture_dir / "artifacts")
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{fixture_dir / 'fixture.db'}"
+
+
+def seed_fixture(players, seed=0):
+    """
+    Write the synthetic tables and files the api reads, returns what the request mix needs
+    (player ids -> names, stat and model names as the api takes them)
+    """
+    import pandas as pd
+
+    from bench.synthetic import BASE_SEASONS, synthetic_batting
+    from evalution.evaluate_models import score_predictions, write_eval_outputs
+    from evalution.forecast import FORECAST_TABLE
+    from ingestion.schema import compact_dtypes, compact_raw_frame
+    from preprocessing.build_features import get_input_metrics, prep_data, prep_forecast_rows
+    from storage.db import write_df_to_db
+    from storage.io import save_dataframe
+    from training.importance import LINEAR_MODELS
+    from training.similarity import publish_similarity_index
+    from training.train_models import PUBLISHED_MODELS, explanations_uri, feature_columns
+
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+
+    raw = compact_raw_frame(synthetic_batting(players, BASE_SEASONS, seed=seed))
+    save_dataframe(raw, "s3://mlb-ml-data/raw/batting", partition_cols=["Season"])
+
+    forecast_rows = []
+    for stat in FIXTURE_STATS:
+        inputs = get_input_metrics(stat)
+        features_df = compact_dtypes(prep_data(raw, inputs))
+        test_df = features_df[features_df["Next_Season"] == FIXTURE_SEASON]
+        upcoming = prep_forecast_rows(raw, inputs)
+        features = feature_columns(stat)
+        actual = test_df[f"Target_{stat}"].to_numpy(dtype=np.float64)
+        spread = float(np.std(actual)) or 1.0
+
+        for model_name in PUBLISHED_MODELS:
+            predictions = actual + rng.normal(0, 0.5 * spread, len(actual))
+            metrics, result_df = score_predictions(test_df, stat, predictions,
+                                                   predictions - 0.6 * spread, predictions + 0.6 * spread)
+            write_eval_outputs(stat, model_name, metrics, result_df)
+
+            #same layouts compute_importance writes (coefficients for the linear models)
+            weights = rng.normal(0, 1, len(features))
+            if model_name in LINEAR_MODELS:
+                importance_df = pd.DataFrame({"Feature": features, "Coefficient": weights})
+            else:
+                importance_df = pd.DataFrame({
+                    "Feature": features,
+                    "Importance": np.abs(weights),
+                    "Direction": np.sign(weights),
+                    "Effect": np.where(weights > 0, "Increases prediction", "Decreases prediction"),
+                })
+            write_df_to_db(importance_df, f"{stat.lower()}_{model_name.lower()}_importance")
+
+            contributions = rng.normal(0, spread / len(features), (len(test_df), len(features))).astype(np.float32)
+            explanations = pd.DataFrame(contributions, columns=features)
+            explanations.insert(0, "IDfg", test_df["IDfg"].to_numpy())
+            explanations["Predicted"] = predictions.astype(np.float32)
+            explanations["Base_Value"] = (explanations["Predicted"] - contributions.sum(axis=1)).astype(np.float32)
+            save_dataframe(explanations, explanations_uri("s3://mlb-ml-data/models", stat, model_name))
+
+            current = upcoming[f"Current_{stat}"].to_numpy(dtype=np.float64)
+            projected = current + rng.normal(0, 0.5 * spread, len(current))
+            forecast_rows.append(pd.DataFrame({
+                "IDfg": upcoming["IDfg"],
+                "Player": upcoming["Name"],
+                "Stat": stat,
+                "Model": model_name,
+                "Model_Version": "fixture",
+                "Current_Season": upcoming["Current_Season"],
+                "Next_Season": upcoming["Next_Season"],
+                "Predicted": projected,
+                "Lower": projected - 0.6 * spread,
+                "Upper": projected + 0.6 * spread,
+            }))
+
+    write_df_to_db(pd.concat(forecast_rows, ignore_index=True), FORECAST_TABLE, index_cols=["IDfg"])
+    #no published pipelines in the fixture, so the index standardizes on the data
+    publish_similarity_index(raw, "s3://mlb-ml-data/models", FIXTURE_STATS)
+
+    #players with a prediction in every table (played both of the last two seasons)
+    test_players = test_df.drop_duplicates("IDfg")
+    print(f"Fixture seeded in {time.perf_counter() - start:.1f}s: {len(raw)} player-seasons, "
+          f"{len(FIXTURE_STATS) * len(PUBLISHED_MODELS)} stat x model tables")
+    return {
+        "player_ids": test_players["IDfg"].astype(int).tolist(),
+        "names": dict(zip(test_players["IDfg"].astype(int), test_players["Name"].astype(str))),
+        "stats": [stat.lower() for stat in FIXTURE_STATS],
+        "models": [model_name.lower() for model_name in PUBLISHED_MODELS],
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers=1, port=None, timeout=60):
+    """
+    uvicorn serving api.main against the fixture environment, returns (process, base url)
+    """
+    port = port or _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=os.environ.copy(),
+    )
+    url = f"http://127.0.0.1:{port}"
+
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited before it was ready (is it installed?)")
+        try:
+            requests.get(url + "/", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.25)
+    process.terminate()
+    raise TimeoutError(f"API not ready at {url} after {timeout}s")
+
+
+def http_client(url):
+    """
+    Per thread sender for a running server: path -> status code
+    """
+    import requests
+
+    local = threading.local()
+
+    def send(path):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session.get(url + path, timeout=60).status_code
+
+    return send
+
+
+def in_process_client():
+    """
+    Per thread sender calling the app without a server (no network or worker overhead in the numbers)
+    """
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    local = threading.local()
+
+    def send(path):
+        if not hasattr(local, "client"):
+            local.client = TestClient(app)
+        return local.client.get(path).status_code
+
+    return send
+
+
+def drive(send, fixture, mix, concurrency, total_requests=None, duration=None, warmup=1, seed=0):
+    """
+    Send the mix from concurrency threads until total_requests are done (or duration seconds pass)
+
+    Returns (samples [(route, seconds, status)], wall seconds)
+    """
+    routes = [route for route, weight in mix.items() if weight > 0]
+    weights = np.array([mix[route] for route in routes], dtype=np.float64)
+    weights /= weights.sum()
+
+    #first hits load caches (explanations, connection pools), not what steady state looks like
+    warm_rng = np.random.default_rng(seed)
+    for route in routes:
+        for _ in range(warmup):
+            send(route_path(route, fixture, warm_rng))
+
+    samples = []
+    lock = threading.Lock()
+    sent = [0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(index):
+        rng = np.random.default_rng(seed + index + 1)
+        local = []
+        while True:
+            with lock:
+                if total_requests is not None and sent[0] >= total_requests:
+                    break
+                sent[0] += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            route = routes[rng.choice(len(routes), p=weights)]
+            path = route_path(route, fixture, rng)
+            start = time.perf_counter()
+            try:
+                status = send(path)
+            except Exception:
+                status = 0
+            local.append((route, time.perf_counter() - start, status))
+        with lock:
+            samples.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, wall):
+    """
+    {route: {requests, errors, error_rate, throughput_rps, p50_ms, p95_ms, p99_ms}} plus an "all" row
+    """
+    by_route = {}
+    for route, seconds, status in samples:
+        by_route.setdefault(route, []).append((seconds, status))
+    by_route["all"] = [(seconds, status) for _, seconds, status in samples]
+
+    results = {}
+    for route, rows in by_route.items():
+        latencies = np.array([seconds for seconds, _ in rows]) * 1000
+        errors = sum(1 for _, status in rows if not 200 <= status < 300)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        results[route] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4),
+            "throughput_rps": round(len(rows) / wall, 2),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+        }
+    return results
+
+
+def print_summary(results):
+    print(f"\n{'route':<24}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, r in sorted(results.items(), key=lambda item: item[0] == "all"):
+        print(f"{route:<24}{r['requests']:>9}{r['errors']:>8}{r['throughput_rps']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+
+
+def parse_mix(values):
+    """
+    ["predictions=5", "players=0"] -> DEFAULT_MIX with those weights replaced
+    """
+    mix = dict(DEFAULT_MIX)
+    for value in values or []:
+        route, weight = value.split("=", 1)
+        if route not in DEFAULT_MIX:
+            raise ValueError(f"Unknown route {route}, routes are: {', '.join(DEFAULT_MIX)}")
+        mix[route] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    from bench.baselines import BASELINE_DIR, REGRESSION_THRESHOLD, RESULTS_DIR
+
+    parser = argparse.ArgumentParser(description="API load test against a synthetic fixture")
+    parser.add_argument("--concurrency", type=int, default=8, help="threads sending requests")
+    parser.add_argument("--requests", type=int, default=2000, help="total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, help="seconds to run instead of a request count")
+    parser.add_argument("--mix", nargs="*", metavar="ROUTE=WEIGHT", help="override route weights (0 drops a route)")
+    parser.add_argument("--players", type=int, default=750, help="synthetic players in the fixture")
+    parser.add_argument("--database-url", help="seed this database instead of a sqlite file (e.g. a local postgres)")
+    parser.add_argument("--fixture-dir", help="where the fixture lives (default: a new temp dir)")
+    parser.add_argument("--no-seed", action="store_true", help="reuse an already seeded --fixture-dir")
+    parser.add_argument("--url", help="load test a server that is already running instead of starting one")
+    parser.add_argument("--in-process", action="store_true", help="call the app directly, no server")
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "load.json"))
+    parser.add_argument("--baseline", default=os.path.join(BASELINE_DIR, "load.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="also make these results the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare against the baseline afterwards")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    fixture_dir = args.fixture_dir or tempfile.mkdtemp(prefix="inningai_load_")
+    configure_fixture_env(fixture_dir, args.database_url)
+    from bench.baselines import load_baseline, load_results, print_comparison, save_results
+    from storage.model_io import read_json, write_json
+
+    fixture_uri = str(Path(fixture_dir) / "fixture.json")
+    if args.no_seed:
+        fixture = read_json(fixture_uri)
+        if not fixture:
+            raise FileNotFoundError(f"No seeded fixture in {fixture_dir}")
+        fixture["names"] = {int(k): v for k, v in fixture["names"].items()}
+    else:
+        fixture = seed_fixture(args.players)
+        write_json(fixture_uri, fixture)
+
+    mix = parse_mix(args.mix)
+    server = None
+    if args.in_process:
+        send, target = in_process_client(), "in-process"
+    else:
+        url = args.url
+        if url is None:
+            server, url = start_server(workers=args.server_workers)
+        send, target = http_client(url), url
+
+    try:
+        print(f"Load testing {target}: {args.concurrency} threads, "
+              + (f"{args.duration:.0f}s" if args.duration else f"{args.requests} requests"))
+        samples, wall = drive(send, fixture, mix, args.concurrency,
+                              total_requests=None if args.duration else args.requests, duration=args.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = summarize(samples, wall)
+    print_summary(results)
+
+    config = {
+        "concurrency": args.concurrency, "requests": args.requests, "duration": args.duration, "mix": mix,
+        "players": args.players, "target": "in-process" if args.in_process else ("url" if args.url else "uvicorn"),
+        "server_workers": args.server_workers, "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+    }
+    save_results(args.out, "load", results, config)
+    if args.save_baseline:
+        save_results(args.baseline, "load", results, config)
+    if args.compare:
+        baseline = load_baseline(args.baseline)
+        if baseline is None:
+            return 2
+        regressions = print_comparison(baseline, load_results(args.out), LOAD_DIRECTIONS, args.threshold, LOAD_FLOORS)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+#a cold shap cache for every run, otherwise a repeated run times a cache read instead of SHAP
+os.environ.setdefault("INNINGAI_SHAP_CACHE_DIR", tempfile.mkdtemp(prefix="inningai_bench_shap_"))
+
+from bench.baselines import (
+    BASELINE_DIR, REGRESSION_THRESHOLD, RESULTS_DIR, load_baseline, load_results, print_comparison, save_results
+)
+from bench.synthetic import BASE_PLAYERS, BASE_SEASONS, FANGRAPHS_COLUMNS, synthetic_batting
+from evalution.compiled_trees import compile_with_parity
+from evalution.evaluate_models import evaluate_model
+from ingestion.schema import compact_dtypes, compact_raw_frame
+from pipeline.profiling import TRACEMALLOC_ENV, drain, profile
+from preprocessing.build_features import get_input_metrics, prep_data
+from training.train_models import MODELS, feature_columns, fit_and_score, prepare_matrices
+
+
+#stage benchmarks at synthetic scale: python -m bench.suite run / python -m bench.suite compare (from backend/)
+#
+#the feature, training and evaluation steps run in memory on generated fangraphs shaped data at 1x, 10x
+#and 100x the players of a real pull, the same functions the pipeline calls:
+#   compact_raw_frame            raw pull -> compact schema (ingestion)
+#   prep_data:{stat}             season pairs (run_build_features)
+#   prepare_matrices:{stat}      standardized train/test matrices (train_all_models / the scheduler)
+#   fit_and_score:{stat}:{model} fit + metrics + SHAP + interval, one model of train_all_models
+#   evaluate_model:{stat}:{model} predict + interval + scoring over every season pair (run_eval)
+#each case records wall/cpu seconds and peak RSS, then reruns once under tracemalloc for its allocation peak
+#(timings never include tracing overhead)
+
+STAGE_RESULTS = os.path.join(RESULTS_DIR, "stages.json")
+STAGE_BASELINE = os.path.join(BASELINE_DIR, "stages.json")
+
+DEFAULT_SCALES = [1, 10, 100]
+DEFAULT_STATS = ["OPS"]
+
+#metric -> 1 if higher is worse
+STAGE_DIRECTIONS = {"wall_seconds": 1, "peak_rss_mb": 1, "tracemalloc_peak_mb": 1}
+STAGE_FLOORS = {"wall_seconds": 0.05, "peak_rss_mb": 20, "tracemalloc_peak_mb": 1}
+
+
+def measure(name, func, rows_in=None, repeat=1, trace=True):
+    """
+    Run func repeat times (fastest run kept) plus once under tracemalloc if trace
+
+    Returns (func's output, {wall_seconds, cpu_seconds, peak_rss_mb, tracemalloc_peak_mb, rows_in, rows_out, rows_per_second})
+    """
+    runs = []
+    for _ in range(repeat):
+        with profile(name) as record:
+            output = func()
+        runs.append(record)
+    best = min(runs, key=lambda record: record["wall_seconds"])
+
+    result = {
+        "wall_seconds": best["wall_seconds"],
+        "cpu_seconds": best["cpu_seconds"],
+        "peak_rss_mb": max(record["peak_rss_mb"] for record in runs),
+        "tracemalloc_peak_mb": None,
+        "rows_in": rows_in,
+        "rows_out": len(output) if hasattr(output, "__len__") and not isinstance(output, dict) else None,
+    }
+    if rows_in and best["wall_seconds"] > 0:
+        result["rows_per_second"] = round(rows_in / best["wall_seconds"], 1)
+
+    if trace:
+        tracemalloc.start()
+        try:
+            with profile(name) as record:
+                func()
+        finally:
+            tracemalloc.stop()
+        result["tracemalloc_peak_mb"] = record["tracemalloc_peak_mb"]
+
+    #the suite keeps its own results, the profiler's records aren't needed
+    drain()
+    print(f"  {name}: {result['wall_seconds']:.3f}s wall, {result['peak_rss_mb']:.0f}MB rss"
+          + (f", {result['tracemalloc_peak_mb']:.1f}MB allocated" if result["tracemalloc_peak_mb"] is not None else ""))
+    return output, result
+
+
+def run_suite(scales=DEFAULT_SCALES, players=BASE_PLAYERS, seasons=len(BASE_SEASONS), columns=FANGRAPHS_COLUMNS,
+              stats=DEFAULT_STATS, model_names=None, repeat=1, trace=True, seed=0):
+    """
+    Every stage at every scale, returns {"{stage}@{scale}x": metrics}
+    """
+    model_names = model_names or list(MODELS)
+    season_range = list(range(BASE_SEASONS[-1] - seasons + 1, BASE_SEASONS[-1] + 1))
+    test_season = season_range[-1]
+    results = {}
+
+    for scale in scales:
+        raw = synthetic_batting(players * scale, season_range, n_columns=columns, seed=seed)
+        print(f"\n{scale}x: {len(raw)} player-seasons x {raw.shape[1]} columns")
+
+        def case(name):
+            return f"{name}@{scale}x"
+
+        compact, results[case("compact_raw_frame")] = measure(
+            "compact_raw_frame", lambda: compact_raw_frame(raw), rows_in=len(raw), repeat=repeat, trace=trace)
+        del raw
+
+        for stat in stats:
+            inputs = get_input_metrics(stat)
+            features_df, results[case(f"prep_data:{stat}")] = measure(
+                f"prep_data:{stat}", lambda: compact_dtypes(prep_data(compact, inputs)),
+                rows_in=len(compact), repeat=repeat, trace=trace)
+
+            train_df = features_df[features_df["Next_Season"] != test_season]
+            test_df = features_df[features_df["Next_Season"] == test_season]
+            matrices, results[case(f"prepare_matrices:{stat}")] = measure(
+                f"prepare_matrices:{stat}", lambda: prepare_matrices(train_df, test_df, feature_columns(stat), stat),
+                rows_in=len(features_df), repeat=repeat, trace=trace)
+
+            for model_name in model_names:
+                fitted, results[case(f"fit_and_score:{stat}:{model_name}")] = measure(
+                    f"fit_and_score:{stat}:{model_name}",
+                    lambda: fit_and_score(model_name, matrices, n_jobs=os.cpu_count()),
+                    rows_in=len(train_df), repeat=repeat, trace=trace)
+
+                #scored the way run_eval scores it (compiled trees when parity holds)
+                pipeline = compile_with_parity(fitted["pipeline"], test_df)
+                _, results[case(f"evaluate_model:{stat}:{model_name}")] = measure(
+                    f"evaluate_model:{stat}:{model_name}",
+                    lambda: evaluate_model(pipeline, features_df, stat, interval=fitted["interval"])[1],
+                    rows_in=len(features_df), repeat=repeat, trace=trace)
+
+        del compact
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stage benchmarks on synthetic data")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="benchmark every stage and save the results")
+    run.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="multiples of --players")
+    run.add_argument("--players", type=int, default=BASE_PLAYERS, help="players at 1x")
+    run.add_argument("--seasons", type=int, default=len(BASE_SEASONS), help="seasons per dataset (ending 2025)")
+    run.add_argument("--columns", type=int, default=FANGRAPHS_COLUMNS, help="raw frame width")
+    run.add_argument("--stats", nargs="+", default=DEFAULT_STATS)
+    run.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    run.add_argument("--repeat", type=int, default=1, help="timed runs per case, the fastest is kept")
+    run.add_argument("--no-tracemalloc", action="store_true", help="skip the allocation peak rerun")
+    run.add_argument("--out", default=STAGE_RESULTS)
+    run.add_argument("--save-baseline", action="store_true", help="also make these results the baseline")
+    run.add_argument("--compare", action="store_true", help="compare against the baseline afterwards")
+    run.add_argument("--baseline", default=STAGE_BASELINE)
+    run.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+    compare = commands.add_parser("compare", help="flag regressions of saved results against the baseline")
+    compare.add_argument("--baseline", default=STAGE_BASELINE)
+    compare.add_argument("--current", default=STAGE_RESULTS)
+    compare.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        #tracemalloc only runs in the dedicated rerun of each case
+        os.environ[TRACEMALLOC_ENV] = "0"
+        config = {
+            "scales": args.scales, "players": args.players, "seasons": args.seasons, "columns": args.columns,
+            "stats": args.stats, "models": args.models, "repeat": args.repeat,
+        }
+        results = run_suite(args.scales, args.players, args.seasons, args.columns, args.stats, args.models,
+                            repeat=args.repeat, trace=not args.no_tracemalloc)
+        save_results(args.out, "stages", results, config)
+        if args.save_baseline:
+            save_results(args.baseline, "stages", results, config)
+        if not args.compare:
+            return 0
+        current_path = args.out
+    else:
+        current_path = args.current
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        return 2
+    regressions = print_comparison(baseline, load_results(current_path), STAGE_DIRECTIONS, args.threshold, STAGE_FLOORS)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
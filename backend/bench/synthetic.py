@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from ingestion.schema import required_raw_columns
+from training.train_models import PARK_FACTORS_2024
+
+
+#synthetic fangraphs shaped batting data for benchmarks and load tests
+#
+#every column the metric registry reads is generated from a few latent player skills (power, contact,
+#discipline) plus season noise, so the rate stats stay correlated the way the real ones are and the
+#models have something to learn; careers are contiguous runs of seasons so prep_data finds pairs
+#n_columns pads the frame with filler floats up to the width of a real pull (300+ columns)
+
+BASE_PLAYERS = 750  # ~3000 player-seasons over 10 seasons, about one real pull of 200+ PA hitters
+BASE_SEASONS = list(range(2016, 2026))
+FANGRAPHS_COLUMNS = 320
+
+TEAMS = [team for team in PARK_FACTORS_2024 if team != "MULTI"]
+
+
+def _careers(rng, n_players, seasons):
+    """
+    (player index, season) for every player-season, each player plays a contiguous run of >= 2 seasons
+    """
+    first, last = seasons[0], seasons[-1]
+    start = rng.integers(first - 4, last, size=n_players)
+    length = np.maximum(rng.geometric(0.2, size=n_players), 2)
+    start = np.clip(start, first, last - 1)
+    end = np.minimum(start + length, last + 1)
+
+    counts = end - start
+    player = np.repeat(np.arange(n_players), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return player, start[player] + offset, offset
+
+
+def synthetic_batting(n_players=BASE_PLAYERS, seasons=BASE_SEASONS, n_columns=None, seed=0):
+    """
+    Raw batting frame shaped like the pybaseball pull (one row per player-season)
+
+    n_columns: total width, padded with filler columns (defaults to just the registry + key columns)
+    """
+    rng = np.random.default_rng(seed)
+    seasons = list(seasons)
+    player, season, year = _careers(rng, n_players, seasons)
+    n = len(player)
+
+    power, contact, discipline = rng.standard_normal((3, n_players))
+    debut_age = rng.integers(21, 30, size=n_players)
+    #a player's rate stats move a little every season on top of their skill
+    power = power[player] + 0.3 * rng.standard_normal(n)
+    contact = contact[player] + 0.3 * rng.standard_normal(n)
+    discipline = discipline[player] + 0.3 * rng.standard_normal(n)
+    age = debut_age[player] + year
+    aging = -0.02 * (age - 28) ** 2 / 10
+
+    #most players stay put, a few change teams each season
+    home = rng.integers(0, len(TEAMS), size=n_players)
+    moves = np.cumsum(rng.random(n) < 0.15)
+    team = np.asarray(TEAMS)[(home[player] + moves) % len(TEAMS)]
+
+    pa = np.clip(rng.normal(480, 110, n) + 30 * contact, 200, 720).round()
+    iso = np.clip(0.160 + 0.045 * power + aging * 0.05, 0.03, 0.38)
+    avg = np.clip(0.250 + 0.018 * contact + 0.01 * rng.standard_normal(n), 0.17, 0.35)
+    bb_pct = np.clip(0.085 + 0.025 * discipline, 0.02, 0.2)
+    k_pct = np.clip(0.22 - 0.04 * contact + 0.02 * power, 0.06, 0.4)
+    babip = np.clip(0.295 + 0.02 * contact + 0.015 * rng.standard_normal(n), 0.2, 0.4)
+    obp = avg + 0.9 * bb_pct
+    slg = avg + iso
+    woba = 0.32 + 0.9 * (obp + slg - 0.72) / 2.2
+    fb_pct = np.clip(0.38 + 0.05 * power, 0.2, 0.55)
+    hr_fb = np.clip(0.12 + 0.05 * power, 0.01, 0.35)
+    hr = np.round(pa * 0.7 * fb_pct * hr_fb * (1 - k_pct)).clip(0)
+    ab = np.round(pa * (1 - bb_pct - 0.01))
+
+    df = pd.DataFrame({
+        "IDfg": (10000 + player).astype(np.int32),
+        "Name": [f"Player {p}" for p in 10000 + player],
+        "Team": team,
+        "Season": season,
+        "Age": age,
+        "G": np.round(pa / 4.1),
+        "AB": ab,
+        "PA": pa,
+        "H": np.round(ab * avg),
+        "HR": hr,
+        "SB": rng.poisson(5 + 4 * np.clip(contact, 0, None)),
+        "AVG": avg,
+        "OBP": obp,
+        "SLG": slg,
+        "OPS": obp + slg,
+        "ISO": iso,
+        "BABIP": babip,
+        "wOBA": woba,
+        "wRC+": np.round(100 + (woba - 0.32) / 0.0012),
+        "BB%": bb_pct,
+        "K%": k_pct,
+        "FB%": fb_pct,
+        "HR/FB": hr_fb,
+        "LD%": np.clip(0.21 + 0.01 * contact, 0.12, 0.3),
+        "Pull%": np.clip(0.40 + 0.05 * power, 0.25, 0.6),
+        "Hard%": np.clip(0.35 + 0.05 * power, 0.15, 0.55),
+        "Soft%": np.clip(0.16 - 0.02 * power, 0.05, 0.3),
+        "Contact%": np.clip(0.77 + 0.05 * contact, 0.6, 0.92),
+        "Barrel%": np.clip(0.08 + 0.04 * power, 0.0, 0.25),
+        "HardHit%": np.clip(0.40 + 0.06 * power, 0.2, 0.6),
+        "EV": 88.5 + 2.0 * power,
+        "xBA": avg + 0.01 * rng.standard_normal(n),
+        "xwOBA": woba + 0.01 * rng.standard_normal(n),
+    })
+
+    missing = [c for c in required_raw_columns() if c not in df.columns]
+    if missing:
+        raise ValueError(f"Synthetic generator is missing registry columns {missing}")
+
+    if n_columns and n_columns > df.shape[1]:
+        filler = rng.random((n, n_columns - df.shape[1]))
+        df = pd.concat([df, pd.DataFrame(filler, columns=[f"Extra_{i}" for i in range(filler.shape[1])])], axis=1)
+
+    return df.sort_values(["Season", "IDfg"]).reset_index(drop=True)
@@ -0,0 +1,130 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from storage.io import load_dataframe
+from storage.db import create_partitioned_table, read_sql_df, write_df_to_db
+from storage.model_io import load_artifact, read_manifest
+from evalution.compiled_trees import compile_with_parity
+from evalution.forecast import FORECAST_BATCH_ROWS, predict_batches
+from training.train_models import PUBLISHED_MODELS
+
+
+#projection history: every historical season pair scored by every model version that was ever published
+#
+#the *_predictions tables only hold the latest split from the latest models and are replaced each run;
+#this keeps one row per (player, season pair, stat, model, version) in a table partitioned by target season
+#so drift between versions and a player's projections over time stay queryable
+#a (stat, model, version) that is already in the table is never scored again
+
+HISTORY_TABLE = "prediction_history"
+
+HISTORY_COLUMNS = {
+    "IDfg": "INTEGER",
+    "Player": "TEXT",
+    "Stat": "TEXT",
+    "Model": "TEXT",
+    "Model_Version": "TEXT",
+    "Current_Season": "SMALLINT",
+    "Next_Season": "SMALLINT",
+    "Actual": "REAL",
+    "Predicted": "REAL",
+    "Lower": "REAL",
+    "Upper": "REAL",
+    "In_Sample": "BOOLEAN",  # the version was trained on this season pair (null for legacy artifacts)
+    "Scored_At": "TIMESTAMP",
+}
+
+#a player's projections over time is one range scan on the first index (per partition)
+HISTORY_INDEXES = [
+    ["IDfg", "Stat", "Model", "Next_Season"],
+    ["Stat", "Model", "Model_Version"],
+]
+
+
+def published_versions(manifest, name):
+    """
+    Every version ever published under an artifact name, oldest first
+    """
+    if name not in manifest:
+        return []
+    current = {k: v for k, v in manifest[name].items() if k != "history"}
+    return manifest[name].get("history", []) + [current]
+
+
+def backfilled_versions():
+    """
+    (stat, model, version) already in the history table
+    """
+    done = read_sql_df(f'SELECT DISTINCT "Stat", "Model", "Model_Version" FROM "{HISTORY_TABLE}"')
+    return set(done.itertuples(index=False, name=None))
+
+
+def score_version(entry, features_df, target_stat, model_name, batch_rows=FORECAST_BATCH_ROWS):
+    """
+    One published version's predictions for every season pair in features_df
+    """
+    pipeline = compile_with_parity(load_artifact(entry), features_df)
+    interval = load_artifact(entry["interval"]) if "interval" in entry else None
+
+    X = features_df[list(pipeline.feature_names_in_)]
+    predictions, lower, upper = predict_batches(pipeline, interval, X, batch_rows=batch_rows)
+
+    trained = entry.get("trained_seasons")
+    in_sample = features_df["Next_Season"].isin(trained).to_numpy() if trained is not None else None
+
+    return pd.DataFrame({
+        "IDfg": features_df["IDfg"].to_numpy(),
+        "Player": features_df["Name"].astype(str).to_numpy(),
+        "Stat": target_stat,
+        "Model": model_name,
+        "Model_Version": entry["version"],
+        "Current_Season": features_df["Current_Season"].to_numpy(),
+        "Next_Season": features_df["Next_Season"].to_numpy(),
+        "Actual": features_df[f"Target_{target_stat}"].to_numpy(),
+        "Predicted": predictions.astype(np.float32),
+        "Lower": lower.astype(np.float32) if lower is not None else np.nan,
+        "Upper": upper.astype(np.float32) if upper is not None else np.nan,
+        "In_Sample": in_sample,
+        "Scored_At": pd.Timestamp.now(tz="UTC").tz_localize(None),
+    })
+
+
+def run_backfill(feature_uris, models_uri, model_names=None, batch_rows=FORECAST_BATCH_ROWS):
+    """
+    Score every historical season pair with every published version of every (stat, model)
+
+    feature_uris: {stat: features parquet uri}
+    Returns the number of rows added
+    """
+    model_names = model_names or PUBLISHED_MODELS
+    manifest = read_manifest(models_uri)
+
+    features = {stat: load_dataframe(uri) for stat, uri in feature_uris.items()}
+    seasons = sorted({int(s) for df in features.values() for s in df["Next_Season"].unique()})
+    create_partitioned_table(HISTORY_TABLE, HISTORY_COLUMNS, "Next_Season", seasons,
+                             btree_indexes=HISTORY_INDEXES, brin_cols=["Scored_At"])
+    done = backfilled_versions()
+
+    added = 0
+    for stat, features_df in features.items():
+        for model_name in model_names:
+            for entry in published_versions(manifest, f"{stat}_{model_name}"):
+                if (stat, model_name, entry["version"]) in done:
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    history_df = score_version(entry, features_df, stat, model_name, batch_rows=batch_rows)
+                except Exception as e:
+                    #pruned artifacts and pickles from older library versions
+                    print(f"{stat} {model_name} {entry['version']}: could not score ({e}), skipped")
+                    continue
+                write_df_to_db(history_df, HISTORY_TABLE, if_exists="append")
+                added += len(history_df)
+                print(f"{stat} {model_name} {entry['version']}: {len(history_df)} rows over "
+                      f"{len(seasons)} seasons in {time.perf_counter() - start:.2f}s")
+
+    print(f"Backfill added {added} rows to {HISTORY_TABLE}")
+    return added
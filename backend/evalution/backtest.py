@@ -0,0 +1,216 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from threadpoolctl import threadpool_limits
+
+from storage.io import load_dataframe, save_dataframe
+from storage.db import write_df_to_db
+from storage.model_io import write_json
+from training.scheduler import MODEL_COST, THREADED_MODELS, load_shared_matrices, plan_core_budget
+from training.train_models import MODELS, feature_columns, fit_predict, prepare_matrices
+
+
+#rolling-origin backtest: fold k tests on one target season and trains on every earlier one
+#the last N_FOLDS target seasons are tested, newest first, so a run cut short still has the recent folds
+#the holdout season the published models are scored on is never a fold, backtest metrics stay out of sample of it
+N_FOLDS = 8
+TEST_SEASON = 2025
+
+#seconds a nightly run may spend fitting; jobs not started by then are dropped and reported
+TIME_BUDGET_SECONDS = float(os.getenv("INNINGAI_BACKTEST_BUDGET", "3600"))
+
+BACKTEST_TABLE = "backtest_metrics"
+
+
+def season_folds(df, n_folds=N_FOLDS):
+    """
+    Test seasons (Next_Season values) for the walk-forward folds, newest first
+
+    A season only becomes a fold if at least one earlier season is left to train on
+    """
+    seasons = sorted(df["Next_Season"].unique())[1:]
+    return [int(s) for s in seasons[-n_folds:]][::-1]
+
+
+def score(y_true, y_pred):
+    return {
+        "MAE": mean_absolute_error(y_true, y_pred),
+        "R2": r2_score(y_true, y_pred) if len(y_true) > 1 else np.nan,
+        "RMSE": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+    }
+
+
+def _run_fold_job(job):
+    """
+    Worker entry point: fit one model on one (stat, fold) and predict its test season
+    """
+    threads = job["n_threads"]
+    n_jobs = threads if job["model_name"] in THREADED_MODELS else None
+
+    start = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        _, predictions = fit_predict(job["model_name"], load_shared_matrices(job["matrices_path"]), n_jobs=n_jobs,
+                                     params=job["params"])
+
+    return {
+        "stat": job["stat"],
+        "model_name": job["model_name"],
+        "test_season": job["test_season"],
+        "predictions": np.asarray(predictions, dtype=np.float32),
+        "fit_seconds": time.perf_counter() - start,
+    }
+
+
+def run_backtest(feature_uris, output_uri=None, model_names=None, n_folds=N_FOLDS,
+                 max_workers=None, n_cores=None, time_budget=TIME_BUDGET_SECONDS, tuned_params=None):
+    """
+    Walk-forward backtest of every (stat, model) across season folds
+
+    feature_uris: {stat: features parquet uri}
+    output_uri: where the out-of-fold predictions are saved (skipped if None), with the params each
+                model was fit with next to them (oof_params.json) so the ensemble can tell what it blends
+    tuned_params: {"{stat}_{model}": params}, the same ones training publishes with (registry defaults if absent)
+    Returns (fold_metrics, summary); both go to the database in a single write
+    """
+    model_names = model_names or list(MODELS)
+    tuned_params = tuned_params or {}
+    start = time.perf_counter()
+
+    #each (stat, fold) is standardized once and memory mapped by every model that fits it
+    matrices_dir = tempfile.mkdtemp(prefix="inningai_backtest_")
+    jobs = []
+    folds = {}
+    for stat, input_uri in feature_uris.items():
+        df = load_dataframe(input_uri)
+        df = df[df["Next_Season"] != TEST_SEASON]
+        feature_cols = feature_columns(stat)
+
+        for test_season in season_folds(df, n_folds):
+            train_df = df[df["Next_Season"] < test_season]
+            test_df = df[df["Next_Season"] == test_season]
+
+            matrices = prepare_matrices(train_df, test_df, feature_cols, stat)
+            matrices_path = os.path.join(matrices_dir, f"{stat}_{test_season}.joblib")
+            joblib.dump(matrices, matrices_path)
+
+            folds[(stat, test_season)] = {
+                "train_rows": len(train_df),
+                "y_test": matrices["y_test"],
+                "ids": matrices["test_ids"],
+                "current_season": test_df["Current_Season"].to_numpy(),
+            }
+            for model_name in model_names:
+                jobs.append({
+                    "stat": stat,
+                    "model_name": model_name,
+                    "test_season": test_season,
+                    "matrices_path": matrices_path,
+                    "params": tuned_params.get(f"{stat}_{model_name}"),
+                })
+
+    workers, inner_threads = plan_core_budget(len(jobs), n_cores=n_cores, max_workers=max_workers)
+    for job in jobs:
+        job["n_threads"] = inner_threads
+    #recent folds first, heavy models first within a fold
+    jobs.sort(key=lambda job: (-job["test_season"], -MODEL_COST.get(job["model_name"], 1)))
+
+    print(f"Backtesting {len(jobs)} fits ({len(folds)} stat folds) with {workers} processes x {inner_threads} threads")
+
+    fold_rows = []
+    oof_frames = []
+    skipped = 0
+    failed = 0
+    fit_start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = {pool.submit(_run_fold_job, job) for job in jobs}
+        over_budget = False
+        while pending:
+            #wakes up at the deadline even if no fit finishes by then, so the queued ones are dropped on time
+            remaining = None if over_budget else max(0.0, time_budget - (time.perf_counter() - fit_start))
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.cancelled():
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    #one broken fit shouldn't cost the rest of the nightly run
+                    failed += 1
+                    print(f"Backtest fit failed: {e!r}")
+                    continue
+                fold = folds[(result["stat"], result["test_season"])]
+
+                fold_rows.append({
+                    "Stat": result["stat"],
+                    "Model": result["model_name"],
+                    "Test_Season": result["test_season"],
+                    "Train_Rows": fold["train_rows"],
+                    "Test_Rows": len(fold["y_test"]),
+                    **score(fold["y_test"], result["predictions"]),
+                    "Fit_Seconds": result["fit_seconds"],
+                })
+                oof_frames.append(pd.DataFrame({
+                    "IDfg": fold["ids"],
+                    "Stat": result["stat"],
+                    "Model": result["model_name"],
+                    "Current_Season": fold["current_season"],
+                    "Next_Season": result["test_season"],
+                    "Actual": fold["y_test"],
+                    "Predicted": result["predictions"],
+                }))
+
+            if not over_budget and time.perf_counter() - fit_start >= time_budget:
+                #running fits finish, queued ones are dropped
+                over_budget = True
+                skipped = sum(f.cancel() for f in pending)
+                pending = {f for f in pending if not f.cancelled()}
+                if skipped:
+                    print(f"Backtest time budget ({time_budget:.0f}s) reached, {skipped} fits dropped")
+
+    fit_wall = time.perf_counter() - fit_start
+    shutil.rmtree(matrices_dir, ignore_errors=True)
+
+    if not fold_rows:
+        print(f"Backtest: none of the {len(jobs)} fits finished ({skipped} dropped by the {time_budget:.0f}s budget, "
+              f"{failed} failed), nothing written")
+        return pd.DataFrame(), pd.DataFrame()
+
+    fold_metrics = pd.DataFrame(fold_rows).sort_values(["Stat", "Model", "Test_Season"]).reset_index(drop=True)
+    summary = fold_metrics.groupby(["Stat", "Model"], as_index=False).agg(
+        Folds=("Test_Season", "size"),
+        MAE=("MAE", "mean"),
+        MAE_Std=("MAE", "std"),
+        R2=("R2", "mean"),
+        RMSE=("RMSE", "mean"),
+        Fit_Seconds=("Fit_Seconds", "sum"),
+    )
+
+    #per fold and aggregated rows in one table, one bulk write
+    table = pd.concat([
+        fold_metrics.assign(Scope="fold"),
+        summary.assign(Scope="overall"),
+    ], ignore_index=True)
+    write_df_to_db(table, BACKTEST_TABLE, index_cols=["Stat"])
+
+    if output_uri and oof_frames:
+        write_json(f"{output_uri}/oof_params.json", {
+            f"{stat}_{model_name}": tuned_params.get(f"{stat}_{model_name}")
+            for stat in feature_uris for model_name in model_names
+        })
+        save_dataframe(pd.concat(oof_frames, ignore_index=True), f"{output_uri}/oof_predictions.parquet")
+
+    print(f"\nBacktest: {len(fold_rows)}/{len(jobs)} fits ({failed} failed) in {fit_wall:.1f}s wall "
+          f"({time.perf_counter() - start:.1f}s total including io), budget {time_budget:.0f}s")
+    print(summary.to_string(index=False))
+
+    return fold_metrics, summary
@@ -0,0 +1,338 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:  # optional, the numpy evaluator is used without it
+    numba = None
+
+
+#compiled inference for the tree models
+#
+#a fitted RandomForest / XGBoost is flattened into one set of node arrays covering every tree
+#(feature, threshold, left, right, leaf value), the fitted scaler in front of it is reused as is,
+#so scoring a batch is a handful of numpy gathers instead of sklearn/xgboost dispatch per call
+#leaves point at themselves (left = right = own index), so walking extra steps past a leaf is a no-op
+
+PARITY_TOLERANCE = 1e-4
+
+#above this many rows the native predict wins again (sklearn/xgboost amortize their overhead and use
+#their own threads), so big batches are handed back to the original pipeline
+COMPILED_MAX_ROWS = 2048
+BENCHMARK_BATCH_SIZES = [1, 32, 10_000]
+
+
+def _flatten_trees(trees):
+    """
+    [(feature, threshold, left, right, value, default_left)] per tree -> one set of arrays + tree roots
+    """
+    offsets = np.cumsum([0] + [len(t[0]) for t in trees])
+    feature, threshold, left, right, value, default_left = (np.concatenate(parts) for parts in zip(*trees))
+
+    is_leaf = left < 0
+    node_ids = np.arange(len(feature), dtype=np.int32)
+    tree_of_node = np.repeat(np.arange(len(trees)), np.diff(offsets))
+
+    left = np.where(is_leaf, node_ids, left + offsets[tree_of_node]).astype(np.int32)
+    right = np.where(is_leaf, node_ids, right + offsets[tree_of_node]).astype(np.int32)
+    feature = np.where(is_leaf, 0, feature).astype(np.int32)
+
+    return {
+        "feature": feature,
+        "threshold": threshold,
+        "left": left,
+        "right": right,
+        "value": value.astype(np.float64),
+        "default_left": default_left.astype(bool),
+        "roots": offsets[:-1].astype(np.int32),
+    }
+
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int32)
+    #children always have larger ids than their parent in both sklearn and xgboost trees
+    for node in range(len(left)):
+        if left[node] >= 0:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def compile_random_forest(model):
+    """
+    RandomForestRegressor -> node arrays (x <= threshold goes left, prediction = mean of the trees)
+    """
+    trees = []
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        missing_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8))
+        trees.append((
+            tree.feature.astype(np.int32),
+            tree.threshold.astype(np.float64),
+            tree.children_left.astype(np.int32),
+            tree.children_right.astype(np.int32),
+            tree.value[:, 0, 0],
+            np.asarray(missing_left, dtype=bool),
+        ))
+        max_depth = max(max_depth, tree.max_depth)
+
+    compiled = _flatten_trees(trees)
+    compiled.update({
+        "kind": "RandomForest",
+        "strict": False,
+        "max_depth": max_depth,
+        "scale": 1.0 / len(trees),
+        "base": 0.0,
+    })
+    return compiled
+
+
+def compile_xgboost(model):
+    """
+    XGBRegressor -> node arrays (x < threshold goes left, prediction = base_score + sum of the trees)
+    """
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    gbtree = learner["gradient_booster"]["model"]
+
+    n_trees = len(gbtree["trees"])
+    #an early stopped model predicts with its best iteration only
+    if getattr(model, "early_stopping_rounds", None) and hasattr(model, "best_iteration"):
+        n_trees = gbtree["iteration_indptr"][model.best_iteration + 1]
+
+    trees = []
+    max_depth = 0
+    for tree in gbtree["trees"][:n_trees]:
+        left = np.asarray(tree["left_children"], dtype=np.int32)
+        right = np.asarray(tree["right_children"], dtype=np.int32)
+        trees.append((
+            np.asarray(tree["split_indices"], dtype=np.int32),
+            #split values and leaf weights share this array, leaves are picked by left < 0
+            np.asarray(tree["split_conditions"], dtype=np.float32),
+            left,
+            right,
+            np.asarray(tree["split_conditions"], dtype=np.float32),
+            np.asarray(tree["default_left"], dtype=bool),
+        ))
+        max_depth = max(max_depth, _tree_depth(left, right))
+
+    compiled = _flatten_trees(trees)
+    compiled.update({
+        "kind": "XGBoost",
+        "strict": True,
+        "max_depth": max_depth,
+        "scale": 1.0,
+        "base": float(learner["learner_model_param"]["base_score"].strip("[]")),
+    })
+    return compiled
+
+
+def leaf_values(compiled, X):
+    """
+    Leaf value each tree gives each row (rows x trees), walking every (row, tree) pair one level per step
+    """
+    n_rows = X.shape[0]
+    rows = np.arange(n_rows)[:, None]
+    idx = np.broadcast_to(compiled["roots"], (n_rows, len(compiled["roots"]))).copy()
+
+    feature, threshold = compiled["feature"], compiled["threshold"]
+    left, right, default_left = compiled["left"], compiled["right"], compiled["default_left"]
+
+    for _ in range(compiled["max_depth"]):
+        x = X[rows, feature[idx]]
+        if compiled["strict"]:
+            go_left = x < threshold[idx]
+        else:
+            go_left = x <= threshold[idx]
+        go_left = np.where(np.isnan(x), default_left[idx], go_left)
+        idx = np.where(go_left, left[idx], right[idx])
+
+    return compiled["value"][idx]
+
+
+def evaluate_numpy(compiled, X):
+    return leaf_values(compiled, X).sum(axis=1) * compiled["scale"] + compiled["base"]
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _evaluate_numba(X, roots, feature, threshold, left, right, value, default_left, strict, scale, base):
+        n_rows = X.shape[0]
+        out = np.zeros(n_rows, dtype=np.float64)
+        #blocks of rows in parallel, tree-major inside a block so one tree's nodes stay in cache
+        n_blocks = (n_rows + 63) // 64
+        for block in numba.prange(n_blocks):
+            start = block * 64
+            stop = min(start + 64, n_rows)
+            for root in roots:
+                for i in range(start, stop):
+                    node = root
+                    while left[node] != node:
+                        x = X[i, feature[node]]
+                        if np.isnan(x):
+                            go_left = default_left[node]
+                        elif strict:
+                            go_left = x < threshold[node]
+                        else:
+                            go_left = x <= threshold[node]
+                        node = left[node] if go_left else right[node]
+                    out[i] += value[node]
+            for i in range(start, stop):
+                out[i] = out[i] * scale + base
+        return out
+
+
+def evaluate(compiled, X, engine="auto"):
+    """
+    Predictions for a standardized float32 matrix
+
+    engine: "numpy", "numba" or "auto" (numba when it is installed)
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if engine == "numba" or (engine == "auto" and numba is not None):
+        if numba is None:
+            raise ImportError("numba is not installed")
+        return _evaluate_numba(
+            X, compiled["roots"], compiled["feature"], compiled["threshold"], compiled["left"],
+            compiled["right"], compiled["value"], compiled["default_left"], compiled["strict"],
+            compiled["scale"], compiled["base"]
+        )
+    return evaluate_numpy(compiled, X)
+
+
+class CompiledPipeline:
+    """
+    Drop-in for a trained (preprocessor, tree model) pipeline in evaluate_model: feature_names_in_ + predict
+    """
+
+    def __init__(self, feature_names, scaler, compiled, engine="auto", native=None, max_rows=COMPILED_MAX_ROWS):
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.scaler = scaler
+        self.compiled = compiled
+        self.engine = engine
+        self.native = native
+        self.max_rows = max_rows
+
+    def transform(self, X):
+        columns = list(self.feature_names_in_)
+        X = X[columns] if isinstance(X, pd.DataFrame) else pd.DataFrame(X, columns=columns)
+        #the fitted scaler itself: how sklearn rounds (float32 vs float64 arithmetic) depends on its version and the
+        #input dtype, and a value right on a split threshold has to land on the same side as in the native pipeline
+        return np.asarray(self.scaler.transform(X), dtype=np.float32)
+
+    def predict(self, X):
+        if self.native is not None and len(X) > self.max_rows:
+            return self.native.predict(X)
+        return evaluate(self.compiled, self.transform(X), engine=self.engine)
+
+
+def compile_pipeline(pipeline, engine="auto"):
+    """
+    Compile a saved (preprocessor, model) pipeline, None if it isn't a scaled tree model
+    """
+    if not hasattr(pipeline, "named_steps"):
+        return None
+
+    model = pipeline.named_steps["model"]
+    preprocessor = pipeline.named_steps["preprocessor"]
+
+    model_type = type(model).__name__
+    if model_type == "RandomForestRegressor":
+        compiled = compile_random_forest(model)
+    elif model_type == "XGBRegressor":
+        compiled = compile_xgboost(model)
+    else:
+        return None
+
+    #only the single StandardScaler over every feature that prepare_matrices builds
+    transformers = [t for t in preprocessor.transformers_ if t[0] != "remainder"]
+    if len(transformers) != 1 or type(transformers[0][1]).__name__ != "StandardScaler":
+        return None
+    _, scaler, columns = transformers[0]
+
+    return CompiledPipeline(columns, scaler, compiled, engine=engine, native=pipeline)
+
+
+def check_parity(pipeline, compiled_pipeline, X, tolerance=PARITY_TOLERANCE):
+    """
+    Largest difference between the compiled and original predictions on X, raises above tolerance
+    """
+    expected = np.asarray(pipeline.predict(X), dtype=np.float64)
+    #always the compiled evaluator, even for batches predict would hand back to the native model
+    actual = evaluate(compiled_pipeline.compiled, compiled_pipeline.transform(X), engine=compiled_pipeline.engine)
+    max_diff = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+
+    #relative to the target's scale so HR and AVG share one tolerance
+    limit = tolerance * max(1.0, float(np.max(np.abs(expected))) if len(expected) else 1.0)
+    if max_diff > limit:
+        raise AssertionError(f"Compiled model differs from the original by {max_diff:.3g} (limit {limit:.3g})")
+    return max_diff
+
+
+def compile_with_parity(pipeline, features_df, engine="auto"):
+    """
+    Compiled pipeline if the model compiles and matches on features_df, otherwise the original pipeline
+    """
+    compiled_pipeline = compile_pipeline(pipeline, engine=engine)
+    if compiled_pipeline is None:
+        return pipeline
+
+    X = features_df[list(compiled_pipeline.feature_names_in_)]
+    try:
+        max_diff = check_parity(pipeline, compiled_pipeline, X)
+    except AssertionError as e:
+        print(f"Compiled inference disabled: {e}")
+        return pipeline
+
+    print(f"Compiled {compiled_pipeline.compiled['kind']} "
+          f"({len(compiled_pipeline.compiled['roots'])} trees, max parity diff {max_diff:.2e})")
+    return compiled_pipeline
+
+
+def microbenchmark(pipeline, features_df, batch_sizes=BENCHMARK_BATCH_SIZES, repeats=20, engines=("numpy", "numba")):
+    """
+    Time pipeline.predict against the compiled evaluators per batch size
+
+    Batches are drawn from features_df with replacement; returns one row per (batch size, engine)
+    (the engines here always run compiled, without the large batch hand-off)
+    """
+    compiled_pipeline = compile_pipeline(pipeline)
+    if compiled_pipeline is None:
+        raise ValueError("Pipeline does not hold a compilable tree model")
+
+    columns = list(compiled_pipeline.feature_names_in_)
+    rng = np.random.default_rng(42)
+    engines = [e for e in engines if e != "numba" or numba is not None]
+    rows = []
+
+    for batch_size in batch_sizes:
+        batch = features_df[columns].iloc[rng.integers(0, len(features_df), size=batch_size)]
+        n_repeats = max(1, repeats if batch_size < 1000 else repeats // 5)
+
+        candidates = {"original": pipeline}
+        for engine in engines:
+            candidates[engine] = CompiledPipeline(
+                columns, compiled_pipeline.scaler, compiled_pipeline.compiled, engine=engine
+            )
+
+        for name, candidate in candidates.items():
+            candidate.predict(batch)  # warm up (numba compiles on the first call)
+            start = time.perf_counter()
+            for _ in range(n_repeats):
+                candidate.predict(batch)
+            seconds = (time.perf_counter() - start) / n_repeats
+            rows.append({
+                "Batch_Size": batch_size,
+                "Engine": name,
+                "Ms_Per_Call": seconds * 1000,
+                "Rows_Per_Second": batch_size / seconds if seconds > 0 else np.inf,
+            })
+
+    results = pd.DataFrame(rows)
+    baseline = results[results["Engine"] == "original"].set_index("Batch_Size")["Ms_Per_Call"]
+    results["Speedup"] = baseline.loc[results["Batch_Size"]].to_numpy() / results["Ms_Per_Call"]
+    return results
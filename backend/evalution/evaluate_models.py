@@ -3,45 +3,52 @@ import numpy as np
 from sklearn.metrics import mean_absolute_error, r2_score
 from storage.io import load_dataframe, save_dataframe
 import joblib  # For loading saved model pipelines
-import boto3
-from urllib.parse import urlparse
-import os
+from storage.model_io import download_model, read_manifest, load_artifact
 from storage.db import write_df_to_db
+from evalution.compiled_trees import compile_with_parity
+from pipeline.profiling import profile
+from training.intervals import predict_interval
+from training.train_models import ENSEMBLE_MODEL
 
 results = {}
 
-def download_from_s3(s3_uri, local_path):
-    parsed = urlparse(s3_uri)
-    bucket = parsed.netloc
-    key = parsed.path.lstrip('/')
-
-    os.makedirs(os.path.dirname(local_path), exist_ok=True)
-
-    s3 = boto3.client('s3')
-    s3.download_file(bucket, key, local_path)
-
-def evaluate_model(model_pipeline, features_df, target_stat):
+def evaluate_model(model_pipeline, features_df, target_stat, interval=None):
     """
     Evaluate a single trained model on the feature df
 
     model_pipeline: sklearn Pipeline or a single trained model
     features_df: df containing features and target
     target_stat: a string representation of stat: HR, AVG, OPS, WRC_PLUS
+    interval: the model's interval spec (training.intervals), adds Lower/Upper columns
     """
 
     x_cols = list(model_pipeline.feature_names_in_)
-    y = features_df[f"Target_{target_stat}"]
-
     X = features_df[x_cols]
 
     #predict
     predictions = model_pipeline.predict(X)
 
+    lower = upper = None
+    if interval is not None:
+        lower, upper = predict_interval(model_pipeline, interval, X, predictions)
+
+    return score_predictions(features_df, target_stat, predictions, lower, upper)
+
+def score_predictions(features_df, target_stat, predictions, lower=None, upper=None):
+    """
+    Metrics and the per-player results table for predictions already made on features_df's rows
+
+    Shared by evaluate_model and the fused train + eval stage (training.scheduler), which has the
+    predictions in memory and never reloads the model
+    """
+    y = features_df[f"Target_{target_stat}"]
+
     mae = mean_absolute_error(y, predictions)
     r2 = r2_score(y, predictions)
 
     #make df of results
     result_df = pd.DataFrame({
+        "IDfg": features_df["IDfg"],
         "Player": features_df["Name"],
         "Current_Season": features_df["Current_Season"],
         "Next_Season": features_df["Next_Season"],
@@ -53,6 +60,9 @@ def evaluate_model(model_pipeline, features_df, target_stat):
         "Pct_Error": np.where(y != 0, (predictions - y) / y * 100, 0)
     })
 
+    if lower is not None:
+        result_df["Lower"], result_df["Upper"] = lower, upper
+
     metrics = {
         "MAE": mae,
         "R2": r2,
@@ -61,10 +71,26 @@ def evaluate_model(model_pipeline, features_df, target_stat):
 
     return metrics, result_df
 
+def write_eval_outputs(target_stat, model_name, metrics, result_df):
+    """
+    Predictions and metrics tables the API reads
+    """
+    print(f"Writing predictions to table: {target_stat.lower()}_{model_name.lower()}_predictions")
+
+    # Save predictions
+    write_df_to_db(result_df, f"{target_stat.lower()}_{model_name.lower()}_predictions", index_cols=["IDfg"])
+
+    # Save metrics
+    metrics_df = pd.DataFrame([metrics])
+    write_df_to_db(metrics_df, f"{target_stat.lower()}_{model_name.lower()}_metrics")
+
 def run_eval(models_uri, features_uri, output_uri, target_stat):
     """
     function used to eval models
 
+    Re-scores whatever is published in the manifest, training already writes the same tables
+    for the models it just fit (fused stage), so this is for re-scoring older artifacts
+
     models_uri: local path or s3 where trained pipelines are stored
     features_uri: local path or s3 where prepped features are stored
     output_uri: local path or s3 where eval results are stored
@@ -80,8 +106,9 @@ def run_eval(models_uri, features_uri, output_uri, target_stat):
     print(f"Filtered to {len(features_df)} players for 2025 predictions")
 
     print(f"Loading trained models from {models_uri}")
+    manifest = read_manifest(models_uri)
 
-    
+    #legacy pickles, only used for models that were never published to the manifest
     model_files = {
     "LinearRegression": f"{target_stat}_LinearRegression.pkl",
     "Ridge": f"{target_stat}_Ridge.pkl",
@@ -89,25 +116,35 @@ def run_eval(models_uri, features_uri, output_uri, target_stat):
     "XGBoost": f"{target_stat}_XGBoost.pkl"
     }   
 
+    #the ensemble never had a legacy pickle, it is scored once training.ensemble has published it
+    if f"{target_stat}_{ENSEMBLE_MODEL}" in manifest:
+        model_files[ENSEMBLE_MODEL] = None
+
     for model_name, model_file in model_files.items():
         print(f"Evaluating model: {model_name}")
 
-        s3_model_uri = f"{models_uri}/{model_file}"
-        local_model_path = f"/tmp/{model_file}"
-
-        download_from_s3(s3_model_uri, local_model_path)
-        model_pipeline = joblib.load(local_model_path)
+        artifact_name = f"{target_stat}_{model_name}"
+        interval = None
+        if artifact_name in manifest:
+            #memory mapped, and not downloaded again if this version is already on disk
+            model_pipeline = load_artifact(manifest[artifact_name])
+            if "interval" in manifest[artifact_name]:
+                interval = load_artifact(manifest[artifact_name]["interval"])
+        else:
+            s3_model_uri = f"{models_uri}/{model_file}"
+            local_model_path = f"/tmp/{model_file}"
 
-        metrics, result_df = evaluate_model(model_pipeline, features_df, target_stat)
+            download_model(s3_model_uri, local_model_path)
+            model_pipeline = joblib.load(local_model_path)
 
-        print(f"Writing predictions to table: {target_stat.lower()}_{model_name.lower()}_predictions")
+        #tree models are scored through the flattened node arrays (falls back to the pipeline if parity fails)
+        model_pipeline = compile_with_parity(model_pipeline, features_df)
 
-        # Save predictions
-        write_df_to_db(result_df, f"{target_stat.lower()}_{model_name.lower()}_predictions")
+        with profile("eval", rows_in=len(features_df), stat=target_stat, model=model_name) as record:
+            metrics, result_df = evaluate_model(model_pipeline, features_df, target_stat, interval=interval)
 
-        # Save metrics
-        metrics_df = pd.DataFrame([metrics])
-        write_df_to_db(metrics_df, f"{target_stat.lower()}_{model_name.lower()}_metrics")
+            write_eval_outputs(target_stat, model_name, metrics, result_df)
+            record["rows_out"] = len(result_df)
 
         results[model_name] = metrics
 
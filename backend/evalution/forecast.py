@@ -0,0 +1,108 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingestion.schema import compact_dtypes
+from preprocessing.build_features import prep_forecast_rows, raw_columns_for, shared_input_metrics
+from storage.io import load_dataframe
+from storage.db import write_df_to_db
+from storage.model_io import load_artifact, read_manifest
+from evalution.compiled_trees import compile_with_parity
+from pipeline.profiling import profile, set_rows
+from training.intervals import predict_interval
+from training.train_models import PUBLISHED_MODELS
+
+
+#forward projections for the season that hasn't been played yet
+#
+#evaluate_model needs a Target_ column, so it can only score seasons that already happened;
+#this stage builds one feature row per active player from their latest season and runs every
+#published stat x model pipeline over all of them, each pipeline's rows are appended to the
+#forecast table as soon as they are scored
+
+FORECAST_TABLE = "forecast_predictions"
+FORECAST_BATCH_ROWS = 50_000  # rows per predict call, bounds memory for the per-tree interval matrices
+
+
+def predict_batches(pipeline, interval, X, batch_rows=FORECAST_BATCH_ROWS):
+    """
+    Predictions (and Lower/Upper if the model has an interval) in batch_rows sized chunks
+
+    Returns (predictions, lower, upper), lower/upper are None without an interval
+    """
+    predictions = np.empty(len(X), dtype=np.float64)
+    lower = np.empty(len(X), dtype=np.float64) if interval is not None else None
+    upper = np.empty(len(X), dtype=np.float64) if interval is not None else None
+
+    for start in range(0, len(X), batch_rows):
+        batch = X.iloc[start:start + batch_rows]
+        end = start + len(batch)
+        predictions[start:end] = pipeline.predict(batch)
+        if interval is not None:
+            lower[start:end], upper[start:end] = predict_interval(pipeline, interval, batch, predictions[start:end])
+
+    return predictions, lower, upper
+
+
+def run_forecast(raw_uri, models_uri, stats, model_names=None, forecast_season=None, batch_rows=FORECAST_BATCH_ROWS):
+    """
+    Score every published (stat, model) pipeline on the upcoming season and write the forecast table
+
+    raw_uri: raw batting dataset (the forecast rows are built straight from it, there are no pairs yet)
+    forecast_season: season to project, defaults to the one after the newest season in the data
+    Returns the number of rows written
+    """
+    model_names = model_names or PUBLISHED_MODELS
+    inputs = shared_input_metrics(stats)
+
+    print(f"Loading raw data from {raw_uri}...")
+    data = load_dataframe(raw_uri, columns=raw_columns_for(inputs))
+    rows = compact_dtypes(prep_forecast_rows(data, inputs, forecast_season=forecast_season))
+    if rows.empty:
+        raise ValueError(f"No players to forecast for season {forecast_season}")
+
+    season = int(rows["Next_Season"].iloc[0])
+    print(f"Forecasting {season} for {len(rows)} players")
+
+    manifest = read_manifest(models_uri)
+    written = 0
+    for stat in stats:
+        for model_name in model_names:
+            name = f"{stat}_{model_name}"
+            if name not in manifest:
+                print(f"{name}: not published, skipped")
+                continue
+
+            start = time.perf_counter()
+            entry = manifest[name]
+            with profile("forecast_model", rows_in=len(rows), stat=stat, model=model_name) as record:
+                pipeline = compile_with_parity(load_artifact(entry), rows)
+                interval = load_artifact(entry["interval"]) if "interval" in entry else None
+
+                X = rows[list(pipeline.feature_names_in_)]
+                predictions, lower, upper = predict_batches(pipeline, interval, X, batch_rows=batch_rows)
+                record["rows_out"] = len(predictions)
+
+            forecast_df = pd.DataFrame({
+                "IDfg": rows["IDfg"],
+                "Player": rows["Name"],
+                "Stat": stat,
+                "Model": model_name,
+                "Model_Version": entry["version"],
+                "Current_Season": rows["Current_Season"],
+                "Next_Season": rows["Next_Season"],
+                "Predicted": predictions,
+                #legacy artifacts have no interval, the columns stay so appends line up
+                "Lower": lower if lower is not None else np.nan,
+                "Upper": upper if upper is not None else np.nan,
+            })
+
+            #the first pipeline replaces last run's table, the rest are appended as they finish
+            write_df_to_db(forecast_df, FORECAST_TABLE, index_cols=["IDfg"],
+                           if_exists="replace" if written == 0 else "append")
+            written += len(forecast_df)
+            print(f"{name}: {len(forecast_df)} {season} forecasts in {time.perf_counter() - start:.2f}s")
+
+    set_rows(rows_in=len(data), rows_out=written)
+    return written
@@ -1,42 +1,144 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
 import pandas as pd
 from pybaseball import batting_stats
 from storage.io import save_dataframe 
+from ingestion.schema import compact_raw_frame, memory_report
+from pipeline.profiling import set_rows
+
+#on-disk cache of raw season pulls, content-addressed:
+#   refs/<request hash>      -> content hash of the parquet for that (source, season, qual) request
+#   objects/<content hash>.parquet
+CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "cache" / "ingestion"
+
+#fangraphs rate-limits aggressive clients, so keep the pool small
+MAX_FETCH_WORKERS = 4
+
+
+def default_mutable_seasons():
+    """
+    Seasons whose stats can still change (only the current one), these are always refetched
+    """
+    return {date.today().year}
+
+
+def _request_key(fetch_fn, year, min_pa):
+    source = f"{getattr(fetch_fn, '__module__', '')}.{getattr(fetch_fn, '__qualname__', repr(fetch_fn))}"
+    payload = json.dumps({"source": source, "season": year, "qual": min_pa}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def read_cached_season(cache_dir, request_key):
+    ref_path = Path(cache_dir) / "refs" / request_key
+    if not ref_path.exists():
+        return None
+
+    object_path = Path(cache_dir) / "objects" / f"{ref_path.read_text().strip()}.parquet"
+    if not object_path.exists():
+        return None
+    return pd.read_parquet(object_path)
+
+
+def write_cached_season(cache_dir, request_key, df):
+    cache_dir = Path(cache_dir)
+    (cache_dir / "refs").mkdir(parents=True, exist_ok=True)
+    (cache_dir / "objects").mkdir(parents=True, exist_ok=True)
+
+    tmp_path = cache_dir / "objects" / f".{request_key}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    content_hash = hashlib.sha256(tmp_path.read_bytes()).hexdigest()
+    os.replace(tmp_path, cache_dir / "objects" / f"{content_hash}.parquet")
 
-def fetch_batting_data(start_year, end_year, min_pa):
-    data = []
+    (cache_dir / "refs" / request_key).write_text(content_hash)
+    return content_hash
 
-    for year in range(start_year, end_year + 1):
-        print(f"Fetching {year} data...")
+
+def fetch_season(year, min_pa, fetch_fn=batting_stats, cache_dir=CACHE_DIR, mutable=False):
+    """
+    Fetch one season, served from the cache unless the season is mutable
+    """
+    request_key = _request_key(fetch_fn, year, min_pa)
+
+    if not mutable:
+        cached = read_cached_season(cache_dir, request_key)
+        if cached is not None:
+            print(f"  ✓ {year}: {len(cached)} players (cached)")
+            return cached
+
+    year_data = fetch_fn(year, qual=min_pa)
+    year_data['Season'] = year  # add year
+    print(f"  ✓ {year}: found {len(year_data)} players")
+
+    #cache is best effort, a season that can't be written just gets refetched next run
+    try:
+        write_cached_season(cache_dir, request_key, year_data)
+    except Exception as e:
+        print(f"  ! Could not cache {year}: {e}")
+
+    return year_data
+
+
+def fetch_batting_data(start_year, end_year, min_pa, fetch_fn=batting_stats, max_workers=MAX_FETCH_WORKERS,
+                       cache_dir=CACHE_DIR, mutable_seasons=None):
+    """
+    Fetch every season in [start_year, end_year] concurrently
+
+    fetch_fn: called as fetch_fn(year, qual=min_pa), defaults to pybaseball.batting_stats
+              (pass a function returning fixture frames to run offline)
+    mutable_seasons: seasons to always refetch, defaults to the current season
+    """
+    if mutable_seasons is None:
+        mutable_seasons = default_mutable_seasons()
+
+    years = list(range(start_year, end_year + 1))
+    print(f"Fetching {len(years)} seasons ({start_year}-{end_year}) with {max_workers} workers...")
+
+    def fetch(year):
         try:
-            year_data = batting_stats(year, qual=min_pa)
-            year_data['Season'] = year  # add year
-            data.append(year_data)
-            print(f"  ✓ Found {len(year_data)} players")
+            return fetch_season(year, min_pa, fetch_fn, cache_dir, mutable=year in mutable_seasons)
         except Exception as e:
             print(f"  ✗ Error fetching {year}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(years)))) as pool:
+        data = [year_data for year_data in pool.map(fetch, years) if year_data is not None]
 
     all_years_data = pd.concat(data, ignore_index=True)
     all_years_data['Team'] = all_years_data['Team'].replace("- - -", "MULTI")
+    all_years_data['IDfg'] = all_years_data['IDfg'].astype("int64")  # fangraphs player id, used as the player key
     return all_years_data
 
 def filter_multi_year_players(df, min_seasons=2):
-    player_count = df['Name'].value_counts()
+    player_count = df['IDfg'].value_counts()
     multi_year_players = player_count[player_count >= min_seasons]
-    filtered_df = df[df['Name'].isin(multi_year_players.index)]
+    filtered_df = df[df['IDfg'].isin(multi_year_players.index)]
     return filtered_df
 
-def run_ingestion(start_year: int, end_year: int, min_pa: int, output_uri: str):
+def run_ingestion(start_year: int, end_year: int, min_pa: int, output_uri: str, fetch_fn=batting_stats,
+                  max_workers: int = MAX_FETCH_WORKERS, mutable_seasons=None):
 
     print("Starting batting data ingestion...")
 
-    raw_df = fetch_batting_data(start_year, end_year, min_pa)
+    raw_df = fetch_batting_data(start_year, end_year, min_pa, fetch_fn=fetch_fn, max_workers=max_workers,
+                                mutable_seasons=mutable_seasons)
     filtered_df = filter_multi_year_players(raw_df)
 
+    #drop unused columns and shrink dtypes before anything holds on to the frame
+    compact_df = compact_raw_frame(filtered_df)
+    memory_report(filtered_df, compact_df, label="raw batting")
+    filtered_df = compact_df
+
+    set_rows(rows_in=len(raw_df), rows_out=len(filtered_df))
     print(f"\nTotal records after filtering: {len(filtered_df)}")
-    print(f"Total unique players after filtering: {filtered_df['Name'].nunique()}")
+    print(f"Total unique players after filtering: {filtered_df['IDfg'].nunique()}")
 
-    save_dataframe(filtered_df, output_uri)
-    filtered_df.to_csv("raw.csv", index=False)
+    #one partition per season so readers only pull the seasons they need
+    save_dataframe(filtered_df, output_uri, partition_cols=["Season"])
 
     print(f"Data saved to {output_uri}")
     return output_uri
\ No newline at end of file
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+
+#compact dtypes for the raw fangraphs frame and the feature frames built from it
+#the raw pull has 300+ float64 columns, most of which no model ever reads
+
+#columns every consumer (features, api) needs regardless of target stat
+KEY_COLUMNS = ["IDfg", "Name", "Team", "Season", "Age", "PA"]
+
+#string columns stored as categoricals
+CATEGORICAL_COLUMNS = ["Name", "Team", "Current_Team", "Next_Team"]
+
+#keys with a fixed width so every partition/frame agrees (fangraphs ids pass 32767)
+KEY_DTYPES = {"IDfg": "int32"}
+
+#whole-number stats that fit in small ints
+COUNTING_STATS = [
+    "Season", "Age", "G", "AB", "PA", "H", "1B", "2B", "3B", "HR",
+    "R", "RBI", "BB", "IBB", "SO", "HBP", "SF", "SH", "GDP", "SB", "CS",
+    "Current_Season", "Next_Season",
+]
+
+
+def required_raw_columns():
+    """
+    Raw columns used by at least one target stat in the metric registry
+    plus the key columns
+    """
+    #imported here since build_features also uses this module
+    from preprocessing.build_features import INPUT_METRICS, RAW_COLUMN_NAMES
+
+    columns = list(KEY_COLUMNS)
+    for metrics in INPUT_METRICS.values():
+        for metric in metrics:
+            raw_name = RAW_COLUMN_NAMES.get(metric, metric)
+            if raw_name not in columns:
+                columns.append(raw_name)
+    return columns
+
+
+def _downcast_int(series):
+    #only downcast when the column is whole numbers with no gaps, otherwise keep it as a rate
+    values = pd.to_numeric(series, errors="coerce")
+    if values.isna().any() or not np.all(np.mod(values, 1) == 0):
+        return values.astype("float32")
+    return pd.to_numeric(values.astype("int64"), downcast="integer")
+
+
+def compact_dtypes(df):
+    """
+    Apply the compact schema to a frame:
+    - string columns -> categoricals
+    - counting stats -> smallest int that fits
+    - everything else numeric -> float32
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col in KEY_DTYPES:
+            df[col] = df[col].astype(KEY_DTYPES[col])
+        elif col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype("category")
+        elif col in COUNTING_STATS:
+            df[col] = _downcast_int(df[col])
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype("float32")
+    return df
+
+
+def compact_raw_frame(df):
+    """
+    Drop raw columns no target uses and compact the rest
+    """
+    keep = [c for c in required_raw_columns() if c in df.columns]
+    missing = [c for c in required_raw_columns() if c not in df.columns]
+    if missing:
+        print(f"Raw data is missing registry columns: {missing}")
+    return compact_dtypes(df[keep])
+
+
+def memory_report(before, after, label="raw"):
+    """
+    Print and return the before/after memory footprint of a compacted frame
+    """
+    bytes_before = int(before.memory_usage(deep=True).sum())
+    bytes_after = int(after.memory_usage(deep=True).sum())
+    report = {
+        "frame": label,
+        "rows": len(after),
+        "columns_before": before.shape[1],
+        "columns_after": after.shape[1],
+        "mb_before": round(bytes_before / 1024**2, 3),
+        "mb_after": round(bytes_after / 1024**2, 3),
+        "reduction_pct": round(100 * (1 - bytes_after / bytes_before), 1) if bytes_before else 0.0,
+    }
+    print(
+        f"Memory ({label}): {report['mb_before']} MB -> {report['mb_after']} MB "
+        f"({report['reduction_pct']}% smaller, {report['columns_before']} -> {report['columns_after']} columns)"
+    )
+    return report
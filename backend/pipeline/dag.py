@@ -0,0 +1,311 @@
+import hashlib
+import importlib.util
+import inspect
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from storage.backends import get_backend
+from storage.model_io import read_json, write_json
+from pipeline.profiling import drain, profile, start_tracing, write_run_report
+
+
+#content-hash DAG runner for the pipeline stages
+#
+#every stage declares the uris it reads and writes; a stage that reads another stage's output depends on it
+#a stage's fingerprint is a hash of its code (source files), its params and its inputs:
+#   input written by another stage   -> that stage's recorded output hash (what it produced, not the live file,
+#                                       later stages may legitimately update e.g. the manifest)
+#   external input                   -> the object's etag (every file's etag under a prefix)
+#a stage whose fingerprint matches the last successful run and whose outputs still exist is skipped,
+#so rerunning after a failure resumes where it stopped; stages whose dependencies are done run concurrently,
+#except stages ordered with after= (ones that each size their pools to every core, so they'd oversubscribe)
+#
+#every stage runs in its own spawned process: a crash can't take the runner down, memory is returned
+#when the stage ends, and numba's thread pool is never started off the main thread (it hangs at exit)
+#
+#each stage process profiles itself (pipeline.profiling), the records come back with its result and
+#make up the run report
+
+DAG_MAX_PARALLEL = 4
+MISSING = "missing"
+
+
+class Stage:
+    """
+    One pipeline step, func(**params) is called when it is out of date
+
+    code: extra module names whose source is part of the fingerprint (func's own file always is)
+    watch: extra values in the fingerprint that aren't passed to func, for stages reading something
+           no uri describes (e.g. today's date for a stage that pulls a season still being played)
+    after: stage names this one only waits for (ordering, not data: not in the fingerprint, never blocks it,
+           and not pulled in by --only)
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), params=None, code=(), watch=(), after=()):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.code = list(code)
+        self.watch = list(watch)
+        self.after = list(after)
+
+    def run(self):
+        return self.func(**self.params)
+
+
+def _sha256(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def uri_fingerprint(uri):
+    """
+    Etag of an object, or of every object under a prefix (partitioned datasets); "missing" if neither exists
+    """
+    backend = get_backend(uri)
+    files = backend.list_files(uri)
+    if files:
+        base = uri.rstrip("/")
+        return _sha256(*(f"{f}={backend.etag(f'{base}/{f}')}" for f in files))
+    if backend.exists(uri):
+        return backend.etag(uri)
+    return MISSING
+
+
+#source file -> sha256, files are only read once per process
+_code_hashes = {}
+
+
+def code_version(stage):
+    """
+    Hash of the source files a stage runs
+    """
+    files = [inspect.getsourcefile(stage.func)]
+    for module in stage.code:
+        files.append(importlib.util.find_spec(module).origin)
+
+    digests = []
+    for path in sorted(set(files)):
+        if path not in _code_hashes:
+            with open(path, "rb") as f:
+                _code_hashes[path] = hashlib.sha256(f.read()).hexdigest()
+        digests.append(_code_hashes[path])
+    return _sha256(*digests)
+
+
+def build_graph(stages):
+    """
+    {stage name: names of the stages it depends on}, from the declared inputs/outputs
+    """
+    producers = {}
+    for stage in stages:
+        for uri in stage.outputs:
+            if uri in producers:
+                raise ValueError(f"{uri} is an output of both {producers[uri]} and {stage.name}")
+            producers[uri] = stage.name
+
+    deps = {stage.name: {producers[uri] for uri in stage.inputs if uri in producers} for stage in stages}
+    unknown = [name for stage in stages for name in stage.after if name not in deps]
+    if unknown:
+        raise ValueError(f"Unknown stage(s) in after: {unknown}")
+
+    #fail on cycles up front instead of waiting forever (ordering edges count too)
+    edges = {stage.name: deps[stage.name] | set(stage.after) for stage in stages}
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage dependency cycle through {name}")
+        visiting.add(name)
+        for dep in edges[name]:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in deps:
+        visit(name)
+    return deps, producers
+
+
+def upstream_of(name, deps):
+    """
+    name and every stage it (transitively) depends on
+    """
+    selected, stack = set(), [name]
+    while stack:
+        current = stack.pop()
+        if current not in selected:
+            selected.add(current)
+            stack.extend(deps[current])
+    return selected
+
+
+def fingerprint(stage, producers, state):
+    inputs = []
+    for uri in stage.inputs:
+        if uri in producers:
+            inputs.append(f"{uri}@{state.get(producers[uri], {}).get('output_hash', MISSING)}")
+        else:
+            inputs.append(f"{uri}={uri_fingerprint(uri)}")
+    return _sha256(stage.name, code_version(stage), json.dumps(stage.params, sort_keys=True, default=str),
+                   *inputs, *stage.watch)
+
+
+def is_up_to_date(stage, key, state):
+    recorded = state.get(stage.name)
+    if not recorded or recorded.get("fingerprint") != key:
+        return False
+    return all(uri_fingerprint(uri) != MISSING for uri in stage.outputs)
+
+
+def run_dag(stages, state_uri, force=(), force_all=False, only=None, max_parallel=DAG_MAX_PARALLEL, dry_run=False,
+            reports_uri=None):
+    """
+    Run every out of date stage, independent ones concurrently
+
+    state_uri: json holding each stage's last successful fingerprint and output hash
+    force: stage names to rerun even if up to date (their dependents rerun if the outputs changed)
+    only: run just this stage, plus whatever upstream of it is out of date
+    dry_run: print what would run and stop
+    reports_uri: where the run's profile report goes ({reports_uri}/{run_id}.json + history table), None to skip it
+    Returns {stage name: "ran" | "skipped" | "failed" | "blocked" | "would run"}
+    """
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [name for name in list(force) + ([only] if only else []) if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stage(s) {unknown}, stages are: {', '.join(by_name)}")
+
+    deps, producers = build_graph(stages)
+    selected = upstream_of(only, deps) if only else set(by_name)
+    state = read_json(state_uri)
+    status = {}
+
+    def ready(name):
+        return (all(status.get(dep) in ("ran", "skipped") for dep in deps[name] if dep in selected)
+                and all(dep in status for dep in by_name[name].after if dep in selected))
+
+    def check(name):
+        stage = by_name[name]
+        key = fingerprint(stage, producers, state)
+        forced = force_all or name in force
+        return key, not forced and is_up_to_date(stage, key, state)
+
+    if dry_run:
+        for name in _topological(selected, deps):
+            if any(status.get(dep) == "would run" for dep in deps[name]):
+                status[name] = "would run"
+            else:
+                status[name] = "skipped" if check(name)[1] else "would run"
+            print(f"{name}: {status[name]}")
+        return status
+
+    pending = set(selected)
+    running = {}
+    start = time.perf_counter()
+    run_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()) + f"-{os.getpid()}"
+    steps = []
+    spawn = multiprocessing.get_context("spawn")
+
+    while pending or running:
+        for name in sorted(pending):
+            if len(running) >= max_parallel:
+                break
+            if any(status.get(dep) in ("failed", "blocked") for dep in deps[name]):
+                status[name] = "blocked"
+                pending.discard(name)
+                print(f"[{name}] not run, an upstream stage failed")
+            elif ready(name):
+                pending.discard(name)
+                key, up_to_date = check(name)
+                if up_to_date:
+                    status[name] = "skipped"
+                    print(f"[{name}] up to date, skipped")
+                else:
+                    print(f"[{name}] running")
+                    executor = ProcessPoolExecutor(max_workers=1, mp_context=spawn)
+                    running[executor.submit(_timed_run, by_name[name])] = (name, key, executor)
+
+        if not running:
+            continue
+
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+            name, key, executor = running.pop(future)
+            executor.shutdown()
+            try:
+                seconds, error, records = future.result()
+            except Exception as e:
+                #the stage process itself died (killed, out of memory)
+                seconds, error, records = 0.0, repr(e), []
+            steps.extend({**record, "run_id": run_id, "stage": name} for record in records)
+            if error:
+                status[name] = "failed"
+                print(f"[{name}] failed after {seconds:.1f}s:\n{error}")
+                continue
+
+            status[name] = "ran"
+            state[name] = {
+                "fingerprint": key,
+                "output_hash": _sha256(*(uri_fingerprint(uri) for uri in by_name[name].outputs), key),
+                "seconds": seconds,
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+            #saved after every stage so a later failure still resumes from here
+            write_json(state_uri, state)
+            print(f"[{name}] done in {seconds:.1f}s")
+
+    failed = [name for name, s in status.items() if s in ("failed", "blocked")]
+    print(f"\nPipeline {'failed' if failed else 'complete'} in {time.perf_counter() - start:.1f}s: "
+          + ", ".join(f"{name} {status[name]}" for name in _topological(selected, deps)))
+
+    if reports_uri:
+        write_run_report({
+            "run_id": run_id,
+            "wall_seconds": round(time.perf_counter() - start, 2),
+            "status": status,
+            "steps": steps,
+        }, reports_uri)
+    return status
+
+
+def _timed_run(stage):
+    """
+    Stage process entry point, returns (seconds, formatted traceback or None, profile records)
+    so one failure doesn't stop the others
+    """
+    start_tracing()
+    start = time.perf_counter()
+    error = None
+    try:
+        with profile(stage.name):
+            stage.run()
+    except Exception:
+        error = traceback.format_exc()
+    return time.perf_counter() - start, error, drain()
+
+
+def _topological(names, deps):
+    ordered, seen = [], set()
+
+    def visit(name):
+        if name in seen or name not in names:
+            return
+        seen.add(name)
+        for dep in sorted(deps[name]):
+            visit(dep)
+        ordered.append(name)
+
+    for name in sorted(names):
+        visit(name)
+    return ordered
@@ -0,0 +1,274 @@
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect
+
+from storage.db import engine, read_sql_df, set_write_hook, write_df_to_db
+from storage.model_io import write_json
+
+
+#stage level profiling: wall / cpu time, peak memory, rows and bytes for every pipeline step
+#
+#profile(step) frames nest (stage -> train_model -> fit/shap/interval, db_write inside anything), each closed
+#frame becomes one record in this process; run_dag collects every stage process's records into one run report
+#(json) and appends them to a history table so a slow run can be compared against the previous ones
+#
+#memory is measured per frame by resetting the high-water marks when a frame opens:
+#   peak rss        -> VmHWM, reset through /proc/self/clear_refs (linux), falls back to ru_maxrss (never reset)
+#   tracemalloc     -> python + numpy allocations, opt in with INNINGAI_TRACEMALLOC=1 (it slows every allocation down)
+#bytes are the process's read()/write() totals (files, s3 and database sockets alike) from /proc/self/io
+#cpu includes child processes reaped while the frame was open (the training pool)
+
+PROFILE_HISTORY_TABLE = "pipeline_profile"
+TRACEMALLOC_ENV = "INNINGAI_TRACEMALLOC"
+
+#a stage counts as regressed against the previous run above this ratio
+REGRESSION_RATIO = 1.25
+
+#record key -> history table column
+HISTORY_COLUMNS = {
+    "run_id": "Run_Id",
+    "stage": "Stage",
+    "step": "Step",
+    "parent": "Parent",
+    "stat": "Stat",
+    "model": "Model",
+    "table": "Table_Name",
+    "started_at": "Started_At",
+    "wall_seconds": "Wall_Seconds",
+    "cpu_seconds": "CPU_Seconds",
+    "peak_rss_mb": "Peak_RSS_MB",
+    "tracemalloc_peak_mb": "Tracemalloc_Peak_MB",
+    "rows_in": "Rows_In",
+    "rows_out": "Rows_Out",
+    "bytes_read": "Bytes_Read",
+    "bytes_written": "Bytes_Written",
+}
+
+MB = 1024 * 1024
+
+_records = []
+_frames = []  # open frames in this process, outermost first
+_lock = threading.Lock()
+
+
+def _read_proc(path, fields):
+    try:
+        with open(path) as f:
+            values = dict(line.split(":", 1) for line in f if ":" in line)
+        return [int(values[field].split()[0]) for field in fields]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _io_counters():
+    """
+    (bytes read, bytes written) by this process so far, None off linux
+    """
+    return _read_proc("/proc/self/io", ["rchar", "wchar"])
+
+
+def _rss_peak():
+    """
+    Peak RSS in bytes since the last reset
+    """
+    hwm = _read_proc("/proc/self/status", ["VmHWM"])
+    if hwm is not None:
+        return hwm[0] * 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _reset_peaks():
+    """
+    Carry the current peaks into every open frame, then restart the high-water marks
+    """
+    rss = _rss_peak()
+    traced = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+    for frame in _frames:
+        frame["_rss"] = max(frame["_rss"], rss)
+        if traced is not None:
+            frame["_traced"] = max(frame["_traced"], traced)
+
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+
+def _cpu_seconds():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def start_tracing():
+    """
+    Turn tracemalloc on for this process (and the processes it spawns) if INNINGAI_TRACEMALLOC=1
+
+    Off by default, the rss and io counters are always collected
+    """
+    if os.environ.get(TRACEMALLOC_ENV, "0") == "1" and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def profile(step, rows_in=None, **tags):
+    """
+    Measure a block, the yielded record can be filled in (record["rows_out"] = len(df)) before it closes
+
+    tags: stat / model / table, stored as columns of the history table (stat / model default to the enclosing frame's)
+    """
+    if os.environ.get(TRACEMALLOC_ENV) == "1" and not tracemalloc.is_tracing():
+        #spawned workers inherit the setting, not the tracer
+        tracemalloc.start()
+
+    with _lock:
+        parent = _frames[-1] if _frames else {}
+        inherited = {key: parent[key] for key in ("stat", "model") if key in parent}
+        _reset_peaks()
+        record = {"step": step, "parent": parent.get("step"), **inherited, **tags, "rows_in": rows_in, "rows_out": None,
+                  "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "_rss": 0, "_traced": 0}
+        _frames.append(record)
+
+    io_start = _io_counters()
+    cpu_start = _cpu_seconds()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        wall = time.perf_counter() - start
+        cpu = _cpu_seconds() - cpu_start
+        io_end = _io_counters()
+
+        with _lock:
+            _frames.remove(record)
+            tracing = tracemalloc.is_tracing()
+            rss = max(record.pop("_rss"), _rss_peak())
+            traced = max(record.pop("_traced"), tracemalloc.get_traced_memory()[1] if tracing else 0)
+            record.update({
+                "wall_seconds": round(wall, 4),
+                "cpu_seconds": round(cpu, 4),
+                "peak_rss_mb": round(rss / MB, 1),
+                "tracemalloc_peak_mb": round(traced / MB, 1) if tracing else None,
+                "bytes_read": io_end[0] - io_start[0] if io_start and io_end else None,
+                "bytes_written": io_end[1] - io_start[1] if io_start and io_end else None,
+            })
+            _records.append(record)
+
+
+def _db_write_frame(table_name, rows):
+    return profile("db_write", rows_in=rows, table=table_name)
+
+
+#every database write made by a process that profiles is a frame of its own
+set_write_hook(_db_write_frame)
+
+
+def set_rows(rows_in=None, rows_out=None):
+    """
+    Rows of the innermost open frame, for functions that are themselves a whole stage
+    """
+    with _lock:
+        if not _frames:
+            return
+        if rows_in is not None:
+            _frames[-1]["rows_in"] = int(rows_in)
+        if rows_out is not None:
+            _frames[-1]["rows_out"] = int(rows_out)
+
+
+def drain():
+    """
+    This process's closed records (clears them), e.g. to send back from a worker
+    """
+    with _lock:
+        records = list(_records)
+        _records.clear()
+    return records
+
+
+def add_records(records):
+    """
+    Records from a worker process, nested under the frame that is open here
+    """
+    with _lock:
+        parent = _frames[-1]["step"] if _frames else None
+        for record in records:
+            if record.get("parent") is None:
+                record["parent"] = parent
+            _records.append(record)
+
+
+def history_frame(report):
+    """
+    One history table row per record of a run report
+    """
+    rows = [{column: record.get(key) for key, column in HISTORY_COLUMNS.items()} for record in report["steps"]]
+    df = pd.DataFrame(rows, columns=list(HISTORY_COLUMNS.values()))
+    for column in ["Wall_Seconds", "CPU_Seconds", "Peak_RSS_MB", "Tracemalloc_Peak_MB"]:
+        df[column] = df[column].astype(np.float64)
+    for column in ["Rows_In", "Rows_Out", "Bytes_Read", "Bytes_Written"]:
+        df[column] = df[column].astype("Int64")
+    for column in ["Parent", "Stat", "Model", "Table_Name"]:
+        df[column] = df[column].astype(object)
+    df["Started_At"] = pd.to_datetime(df["Started_At"]).dt.tz_localize(None)
+    return df
+
+
+def previous_stage_totals(table=PROFILE_HISTORY_TABLE):
+    """
+    {stage: (wall seconds, peak rss mb)} of the last recorded run of each stage, {} before the first run
+    """
+    if not inspect(engine).has_table(table):
+        return {}
+    last = read_sql_df(
+        f'SELECT "Stage", "Wall_Seconds", "Peak_RSS_MB" FROM "{table}" t WHERE "Step" = "Stage" AND "Started_At" = '
+        f'(SELECT MAX("Started_At") FROM "{table}" WHERE "Stage" = t."Stage" AND "Step" = "Stage")'
+    )
+    return {row.Stage: (row.Wall_Seconds, row.Peak_RSS_MB) for row in last.itertuples(index=False)}
+
+
+def print_report(report, previous=None):
+    """
+    Per stage summary, stages slower or bigger than last time (REGRESSION_RATIO) are flagged
+    """
+    previous = previous or {}
+    print(f"\nRun {report['run_id']} profile:")
+    for record in report["steps"]:
+        if record["step"] != record["stage"]:
+            continue
+        line = (f"  {record['stage']:<16} {record['wall_seconds']:>8.1f}s wall {record['cpu_seconds']:>8.1f}s cpu "
+                f"{record['peak_rss_mb']:>8.1f}MB rss")
+        if record["stage"] in previous:
+            last_wall, last_rss = previous[record["stage"]]
+            flags = []
+            if last_wall and record["wall_seconds"] > last_wall * REGRESSION_RATIO:
+                flags.append(f"wall {record['wall_seconds'] / last_wall:.2f}x")
+            if last_rss and record["peak_rss_mb"] > last_rss * REGRESSION_RATIO:
+                flags.append(f"rss {record['peak_rss_mb'] / last_rss:.2f}x")
+            if flags:
+                line += "  REGRESSED vs last run: " + ", ".join(flags)
+        print(line)
+
+
+def write_run_report(report, reports_uri, table=PROFILE_HISTORY_TABLE):
+    """
+    Save the run report as {reports_uri}/{run_id}.json and append its records to the history table
+    """
+    previous = previous_stage_totals(table)
+    print_report(report, previous)
+
+    report_uri = f"{reports_uri}/{report['run_id']}.json"
+    write_json(report_uri, report)
+    if report["steps"]:
+        write_df_to_db(history_frame(report), table, if_exists="append")
+    print(f"Profile report saved to {report_uri}")
+    return report_uri
@@ -1,5 +1,7 @@
 import pandas as pd
 from storage.io import load_dataframe, save_dataframe
+from ingestion.schema import compact_dtypes
+from pipeline.profiling import set_rows
 
 
 #we need to prep the data so that the model can notice patterns to train off
@@ -53,159 +55,203 @@ team_name_id = {
 
 
 
+#input metrics used to predict each target stat (the metric registry)
+INPUT_METRICS = {
+    "HR": [
+        'Age',           # Players peak ~27-30, then decline
+        'PA',            # Playing time (more PAs = more HR opportunities)
+        'HR',            # Last year's HR (best predictor!)
+        'ISO',           # Isolated power (SLG - AVG)
+        'FB%',           # Flyball rate (more flyballs = more HR potential)
+        'HR/FB',         # HR per flyball rate
+        'Barrel%',       # Statcast: % of barrels (ideal contact)
+        'HardHit%',      # Statcast: hard-hit ball rate
+        'EV',            # Exit velocity (harder hit = more HR)
+        'Pull%',         # Pull hitters hit more HR
+    ],
+    "AVG": [
+        'Age',           # Context
+        'PA',            # Playing time
+        'AVG',           # Last year's AVG (best predictor!)
+        'K%',            # Strikeout rate (fewer K = higher AVG)
+        'Contact%',      # Contact rate on swings
+        'BABIP',         # Batting average on balls in play
+        'LD%',           # Line drive rate (line drives = hits)
+        'Hard%',         # Hard-hit ball % (harder = more hits)
+        'Soft%',         # Soft contact % (less = better)
+        'xBA',           # Expected batting average (Statcast)
+    ],
+    "OPS": [
+        'Age',           # Context
+        'PA',            # Playing time
+        'OPS',           # Last year's OPS (best predictor!)
+        'wRC_PLUS',          # Weighted runs created (overall value)
+        'BB%',           # Walk rate (boosts OBP)
+        'K%',            # Strikeout rate
+        'ISO',           # Power component
+        'BABIP',         # Luck/contact quality
+        'HardHit%',      # Quality of contact
+        'Barrel%',       # Elite contact
+        'xwOBA',         # Expected wOBA (similar to OPS)
+    ],
+    "wRC_PLUS": [
+        'Age',           # Context
+        'PA',            # Playing time
+        'wRC_PLUS',          # Last year's wRC_PLUS (best predictor!)
+        'wOBA',          # Foundation of wRC_PLUS
+        'BB%',           # Walks
+        'K%',            # Strikeouts
+        'ISO',           # Power
+        'AVG',           # Contact
+        'BABIP',         # Luck factor
+        'Barrel%',       # Quality contact
+        'HardHit%',      # Quality contact
+    ],
+    "WAR": [
+        "Age",
+        "PA",
+        "G",
+
+        "wOBA",
+        "wRC_PLUS",
+        "ISO",
+        "BB%",
+        "K%",
+        "Barrel%",
+        "HardHit%",
+        "SB",
+        
+
+    ],
+}
+
+#fangraphs names for metrics that are renamed in the feature frames
+RAW_COLUMN_NAMES = {
+    "wRC_PLUS": "wRC+",
+}
+
+
 def get_input_metrics(stat):
-    if stat == "HR":
-        return [
-            'Age',           # Players peak ~27-30, then decline
-            'PA',            # Playing time (more PAs = more HR opportunities)
-            'HR',            # Last year's HR (best predictor!)
-            'ISO',           # Isolated power (SLG - AVG)
-            'FB%',           # Flyball rate (more flyballs = more HR potential)
-            'HR/FB',         # HR per flyball rate
-            'Barrel%',       # Statcast: % of barrels (ideal contact)
-            'HardHit%',      # Statcast: hard-hit ball rate
-            'EV',            # Exit velocity (harder hit = more HR)
-            'Pull%',         # Pull hitters hit more HR
-        ]
-    elif stat == "AVG":
-        return [
-            'Age',           # Context
-            'PA',            # Playing time
-            'AVG',           # Last year's AVG (best predictor!)
-            'K%',            # Strikeout rate (fewer K = higher AVG)
-            'Contact%',      # Contact rate on swings
-            'BABIP',         # Batting average on balls in play
-            'LD%',           # Line drive rate (line drives = hits)
-            'Hard%',         # Hard-hit ball % (harder = more hits)
-            'Soft%',         # Soft contact % (less = better)
-            'xBA',           # Expected batting average (Statcast)
-        ]
-    elif stat == "OPS":
-        return [
-                'Age',           # Context
-                'PA',            # Playing time
-                'OPS',           # Last year's OPS (best predictor!)
-                'wRC_PLUS',          # Weighted runs created (overall value)
-                'BB%',           # Walk rate (boosts OBP)
-                'K%',            # Strikeout rate
-                'ISO',           # Power component
-                'BABIP',         # Luck/contact quality
-                'HardHit%',      # Quality of contact
-                'Barrel%',       # Elite contact
-                'xwOBA',         # Expected wOBA (similar to OPS)
-        ]
-    elif stat == "wRC_PLUS":
-        return [
-            'Age',           # Context
-            'PA',            # Playing time
-            'wRC_PLUS',          # Last year's wRC_PLUS (best predictor!)
-            'wOBA',          # Foundation of wRC_PLUS
-            'BB%',           # Walks
-            'K%',            # Strikeouts
-            'ISO',           # Power
-            'AVG',           # Contact
-            'BABIP',         # Luck factor
-            'Barrel%',       # Quality contact
-            'HardHit%',      # Quality contact
-        ]
-    elif stat == "WAR":
-        return [
-            "Age",
-            "PA",
-            "G",
-
-            "wOBA",
-            "wRC_PLUS",
-            "ISO",
-            "BB%",
-            "K%",
-            "Barrel%",
-            "HardHit%",
-            "SB",
-            
-
-        ]
-    else:
-        return None
+    return INPUT_METRICS.get(stat)
+
+
+def shared_input_metrics(stats):
+    """
+    Union of the input metrics of several stats, in registry order (one feature frame serves all of them)
+    """
+    inputs = []
+    for stat in stats:
+        for metric in get_input_metrics(stat):
+            if metric not in inputs:
+                inputs.append(metric)
+    return inputs
+
+
+def raw_columns_for(inputs):
+    """
+    Raw columns prep_data reads for a list of input metrics
+    """
+    columns = ["IDfg", "Name", "Season", "Team"]
+    for metric in inputs:
+        raw_name = RAW_COLUMN_NAMES.get(metric, metric)
+        if raw_name not in columns:
+            columns.append(raw_name)
+    return columns
 
 
 def prep_data(dataset, inputs):
 
     
     #current year (input metrics) -> following year (output metric)
-    
-    #step 1: sort by player name and season so we can locate the next year quickly
-    dataset = dataset.sort_values(['Name', "Season"])
+
+    #Conservative approach: we must only get players who have consecutive years played to account for facotrs like injury recover
+    #players are keyed on their fangraphs id (IDfg) so two players sharing a name never get paired together
+    seasons = dataset[raw_columns_for(inputs)]
+
+    #get pairs consecutive seasons for each player (2021->2022, 2022->2023, etc)
+    #shifting the season back by one lets a single integer-keyed merge find the following year
+    following = seasons.drop(columns="Name").assign(Season=seasons["Season"] - 1)
+    pairs = seasons.merge(following, on=["IDfg", "Season"], suffixes=("_curr", "_next"))
+
+    new_df = pd.DataFrame({
+        "IDfg": pairs["IDfg"],
+        "Name": pairs["Name"],
+        "Current_Season": pairs["Season"],
+        "Next_Season": pairs["Season"] + 1,
+        "Current_Team": pairs["Team_curr"],
+        "Next_Team": pairs["Team_next"],
+    })
+
+    #add input metrics to row
+    for metric in inputs:
+        raw_name = RAW_COLUMN_NAMES.get(metric, metric)
+        new_df[f"Current_{metric}"] = pairs[f"{raw_name}_curr"]
+        new_df[f"Target_{metric}"] = pairs[f"{raw_name}_next"]
+
+    new_df = new_df.sort_values(["Name", "IDfg", "Current_Season"]).reset_index(drop=True)
+    return new_df
 
 
-    machine_learning_dataset = []
 
-    for player, player_data in dataset.groupby("Name"):
-        player_data = player_data = player_data.sort_values("Season")
 
 
-        #Conservative approach: we must only get players who have consecutive years played to account for facotrs like injury recover
-        
-        #get pairs consecutive seasons for each player (2021->2022, 2022->2025, etc)
-        if (len(player_data) >= 2):
-            for i in range(len(player_data)-1):
-                curr_season = player_data.iloc[i]
-                following_season = player_data.iloc[i+1]
-
-                #only include if seasons were back-to-back
-                if following_season["Season"] == curr_season["Season"] + 1: 
-
-
-                    # Handle MULTI-team seasons
-                    if curr_season["Team"] == "MULTI":
-                       
-                       pass
-
-
-                    row = {
-                        "Name": player,
-                        "Current_Season": curr_season["Season"],
-                        "Next_Season": following_season["Season"],
-                        "Current_Team": curr_season["Team"], 
-                        "Next_Team": following_season["Team"],
-                    }
-
-                    #add input metrics to row
-                    for metric in inputs:
-                        if metric == "wRC_PLUS":
-                            row[f"Current_{metric}"] = curr_season["wRC+"]
-                            row[f"Target_{metric}"] = following_season["wRC+"]
-                        else:
-                            row[f"Current_{metric}"] = curr_season[metric]
-                            row[f"Target_{metric}"] = following_season[metric]
-
-                    machine_learning_dataset.append(row)
-    new_df = pd.DataFrame(machine_learning_dataset)
-    return new_df
 
+def prep_forecast_rows(dataset, inputs, forecast_season=None):
+    """
+    Feature rows for a season that hasn't been played yet (no Target_ columns)
+
+    One row per player from the season before forecast_season (default: the newest season in the data),
+    so only players active in that season are projected, like the consecutive pairs the models learned from
+    """
+    seasons = dataset[raw_columns_for(inputs)]
+    if forecast_season is None:
+        forecast_season = int(seasons["Season"].max()) + 1
 
+    latest = seasons[seasons["Season"] == forecast_season - 1]
+    #traded players can have more than one row for a season in some pulls, keep the last
+    latest = latest.drop_duplicates("IDfg", keep="last")
 
+    new_df = pd.DataFrame({
+        "IDfg": latest["IDfg"],
+        "Name": latest["Name"],
+        "Current_Season": latest["Season"],
+        "Next_Season": latest["Season"] + 1,
+        "Current_Team": latest["Team"],
+    })
 
+    for metric in inputs:
+        new_df[f"Current_{metric}"] = latest[RAW_COLUMN_NAMES.get(metric, metric)]
 
+    return new_df.sort_values(["Name", "IDfg"]).reset_index(drop=True)
 
-def run_build_features(target_stat: str, input_uri: str, output_uri: str):
+
+
+
+
+
+def run_build_features(target_stat: str, input_uri: str, output_uri: str, min_season: int = None):
     
     """
     Load raw batting data and build ML features and save to parquet
     Works locally or directly to S3
+
+    Features are stored with the compact schema (float32 metrics, categorical names/teams)
+    min_season: skip raw seasons before this one (pruned at the partition level)
     """
     
-    
-    
-    print("Loading raw data from {input_uri}...")
-    data = load_dataframe(input_uri)
-
-    print("Prepping features for target stat: {target_stat}...")
     inputs = get_input_metrics(target_stat)
     if not inputs:
         raise ValueError(f"Unsupported target stat: {target_stat}")
     
-    features_df = prep_data(data, inputs)
+    #only read the columns this stat uses (and seasons, if limited)
+    print(f"Loading raw data from {input_uri}...")
+    filters = [("Season", ">=", min_season)] if min_season is not None else None
+    data = load_dataframe(input_uri, columns=raw_columns_for(inputs), filters=filters)
+
+    print(f"Prepping features for target stat: {target_stat}...")
+    
+    features_df = compact_dtypes(prep_data(data, inputs))
+    set_rows(rows_in=len(data), rows_out=len(features_df))
     print(f"Feature data shape: {features_df.shape}")
     print(f"Number of player-season pairs: {len(features_df)}")
 
@@ -216,3 +262,26 @@ def run_build_features(target_stat: str, input_uri: str, output_uri: str):
     return features_df
 
 
+
+
+def run_build_shared_features(stats, input_uri: str, output_uri: str, min_season: int = None):
+    """
+    One feature frame for several target stats (the shared feature store)
+
+    Same player-season pairs as the per stat frames, with the union of their metrics,
+    so every stat's Current_/Target_ columns are in one file
+    """
+    inputs = shared_input_metrics(stats)
+
+    print(f"Loading raw data from {input_uri}...")
+    filters = [("Season", ">=", min_season)] if min_season is not None else None
+    data = load_dataframe(input_uri, columns=raw_columns_for(inputs), filters=filters)
+
+    print(f"Prepping shared features for: {', '.join(stats)}...")
+    features_df = compact_dtypes(prep_data(data, inputs))
+    set_rows(rows_in=len(data), rows_out=len(features_df))
+    print(f"Feature data shape: {features_df.shape}")
+
+    save_dataframe(features_df, output_uri)
+    print(f"Shared features saved to {output_uri}")
+    return features_df
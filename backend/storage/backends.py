@@ -0,0 +1,262 @@
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+#storage backends behind storage.io / storage.model_io
+#
+#pipeline code keeps using s3:// uris everywhere, the backend that serves them is picked by:
+#   INNINGAI_STORAGE=s3      (default) real S3
+#   INNINGAI_STORAGE=local   s3://bucket/key -> $INNINGAI_STORAGE_ROOT/bucket/key on disk
+#   INNINGAI_STORAGE=memory  in-process dict (tests / benchmarks)
+#memory:// uris always use the in-memory backend and plain paths are always local files
+
+DEFAULT_LOCAL_ROOT = Path(__file__).resolve().parent.parent / "data" / "store"
+
+#objects above this size are moved in concurrent multipart chunks
+MULTIPART_THRESHOLD = 16 * 1024**2
+MULTIPART_CHUNKSIZE = 16 * 1024**2
+MAX_TRANSFER_CONCURRENCY = 8
+
+
+def split_uri(uri):
+    """
+    "s3://bucket/raw/batting" -> ("bucket", "raw/batting")
+    """
+    parsed = urlparse(uri)
+    return parsed.netloc, parsed.path.lstrip("/")
+
+
+class StorageBackend:
+    """
+    Interface every backend implements. uris are always full uris (s3://..., memory://..., or paths)
+
+    is_local: objects are plain files, readers can open local_path(uri) directly
+    cacheable: reads are remote and worth keeping in the local object cache
+    """
+    is_local = False
+    cacheable = False
+
+    def etag(self, uri):
+        raise NotImplementedError
+
+    def upload_file(self, local_path, uri):
+        raise NotImplementedError
+
+    def download_file(self, uri, local_path):
+        raise NotImplementedError
+
+    def read_bytes(self, uri):
+        raise NotImplementedError
+
+    def list_files(self, uri):
+        """
+        Keys under a prefix uri, relative to it
+        """
+        raise NotImplementedError
+
+    def delete_prefix(self, uri):
+        raise NotImplementedError
+
+    def exists(self, uri):
+        try:
+            self.etag(uri)
+            return True
+        except (FileNotFoundError, KeyError):
+            return False
+
+
+class LocalBackend(StorageBackend):
+    """
+    Local filesystem, s3://bucket/key uris are mapped under root
+    """
+    is_local = True
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root else None
+
+    def local_path(self, uri):
+        parsed = urlparse(uri)
+        if parsed.scheme == "file":
+            return parsed.path
+        if parsed.scheme and len(parsed.scheme) > 1:
+            bucket, key = split_uri(uri)
+            return str((self.root or DEFAULT_LOCAL_ROOT) / bucket / key)
+        return uri
+
+    def etag(self, uri):
+        stat = os.stat(self.local_path(uri))
+        return hashlib.md5(f"{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest()
+
+    def upload_file(self, local_path, uri):
+        target = self.local_path(uri)
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        shutil.copyfile(local_path, target)
+
+    def download_file(self, uri, local_path):
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        shutil.copyfile(self.local_path(uri), local_path)
+
+    def read_bytes(self, uri):
+        return Path(self.local_path(uri)).read_bytes()
+
+    def list_files(self, uri):
+        base = self.local_path(uri)
+        files = []
+        for root, _, names in os.walk(base):
+            for name in names:
+                files.append(os.path.relpath(os.path.join(root, name), base).replace(os.sep, "/"))
+        return sorted(files)
+
+    def delete_prefix(self, uri):
+        path = self.local_path(uri)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+class MemoryBackend(StorageBackend):
+    """
+    In-process object store, lets perf tests time compute without any disk or network io
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def _key(self, uri):
+        bucket, key = split_uri(uri)
+        return f"{bucket}/{key}"
+
+    def put_bytes(self, uri, data):
+        with self._lock:
+            self.objects[self._key(uri)] = bytes(data)
+
+    def etag(self, uri):
+        return hashlib.md5(self.objects[self._key(uri)]).hexdigest()
+
+    def upload_file(self, local_path, uri):
+        self.put_bytes(uri, Path(local_path).read_bytes())
+
+    def download_file(self, uri, local_path):
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        Path(local_path).write_bytes(self.objects[self._key(uri)])
+
+    def read_bytes(self, uri):
+        return self.objects[self._key(uri)]
+
+    def list_files(self, uri):
+        prefix = self._key(uri).rstrip("/") + "/"
+        return sorted(k[len(prefix):] for k in list(self.objects) if k.startswith(prefix))
+
+    def delete_prefix(self, uri):
+        prefix = self._key(uri).rstrip("/") + "/"
+        with self._lock:
+            for k in [k for k in self.objects if k.startswith(prefix)]:
+                del self.objects[k]
+
+
+class S3Backend(StorageBackend):
+    """
+    AWS S3, the boto3 client is only built on first use
+    """
+    cacheable = True
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    #client reads credentials from the env file by itself
+                    self._client = boto3.client("s3")
+        return self._client
+
+    @property
+    def transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+        return TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNKSIZE,
+            max_concurrency=MAX_TRANSFER_CONCURRENCY,
+            use_threads=True,
+        )
+
+    def etag(self, uri):
+        from botocore.exceptions import ClientError
+
+        bucket, key = split_uri(uri)
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                raise FileNotFoundError(uri) from e
+            raise
+
+    def upload_file(self, local_path, uri):
+        bucket, key = split_uri(uri)
+        self.client.upload_file(local_path, bucket, key, Config=self.transfer_config)
+
+    def download_file(self, uri, local_path):
+        bucket, key = split_uri(uri)
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        self.client.download_file(bucket, key, local_path, Config=self.transfer_config)
+
+    def read_bytes(self, uri):
+        bucket, key = split_uri(uri)
+        return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    def _list_keys(self, uri):
+        bucket, prefix = split_uri(uri.rstrip("/") + "/")
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield bucket, prefix, obj["Key"]
+
+    def list_files(self, uri):
+        return sorted(key[len(prefix):] for _, prefix, key in self._list_keys(uri))
+
+    def delete_prefix(self, uri):
+        keys = [(bucket, key) for bucket, _, key in self._list_keys(uri)]
+        #delete_objects takes at most 1000 keys per call
+        for i in range(0, len(keys), 1000):
+            batch = keys[i:i + 1000]
+            self.client.delete_objects(Bucket=batch[0][0], Delete={"Objects": [{"Key": k} for _, k in batch]})
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def _shared(name, factory):
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = factory()
+        return _backends[name]
+
+
+def get_backend(uri):
+    """
+    Pick the backend for a uri by scheme, s3:// uris follow INNINGAI_STORAGE
+    """
+    scheme = urlparse(uri).scheme
+
+    if scheme == "memory":
+        return _shared("memory", MemoryBackend)
+
+    #single letter schemes are windows drive letters
+    if scheme in ("", "file") or len(scheme) == 1:
+        return _shared("local", LocalBackend)
+
+    choice = os.getenv("INNINGAI_STORAGE", "s3").lower()
+    if choice == "local":
+        root = os.getenv("INNINGAI_STORAGE_ROOT", str(DEFAULT_LOCAL_ROOT))
+        return _shared(f"local:{root}", lambda: LocalBackend(root))
+    if choice == "memory":
+        return _shared("memory", MemoryBackend)
+    return _shared("s3", S3Backend)
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import pyarrow as pa
+
+
+#read-through disk cache for remote objects
+#entries are keyed by uri + etag, so a changed object is a new key and stale copies just age out
+CACHE_DIR = Path(os.getenv("INNINGAI_CACHE_DIR", Path(__file__).resolve().parent.parent / "data" / "cache" / "objects"))
+
+#size cap before least recently used entries are evicted (0 turns the cache off)
+CACHE_MAX_BYTES = int(float(os.getenv("INNINGAI_CACHE_MAX_MB", "2048")) * 1024**2)
+
+_evict_lock = threading.Lock()
+
+#cached path -> readers in this process that have it open, evict skips these
+#(another process can still unlink an open entry, the open map keeps its data readable)
+_in_use = {}
+_in_use_lock = threading.Lock()
+
+
+def cache_enabled():
+    return CACHE_MAX_BYTES > 0
+
+
+def _entry_path(uri, etag):
+    digest = hashlib.sha256(f"{uri}\n{etag}".encode()).hexdigest()
+    return CACHE_DIR / digest[:2] / digest
+
+
+def new_temp_path():
+    """
+    Temp file inside the cache dir, so finished downloads/writes can be renamed into place
+    """
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    return path
+
+
+def _hold(path):
+    with _in_use_lock:
+        _in_use[path] = _in_use.get(path, 0) + 1
+
+
+def _release(path):
+    with _in_use_lock:
+        _in_use[path] -= 1
+        if not _in_use[path]:
+            del _in_use[path]
+
+
+def _open_entry(path):
+    """
+    Memory map a cached entry, None on a miss (including one evicted by another process a moment ago)
+    """
+    try:
+        source = pa.memory_map(str(path))
+    except FileNotFoundError:
+        return None
+    try:
+        #bump mtime so eviction treats it as recently used
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return source
+
+
+def adopt(uri, etag, local_path):
+    """
+    Move a finished local file into the cache as uri@etag and return its cached path
+
+    A file bigger than the whole cache is deleted instead (returns None)
+    """
+    if os.path.getsize(local_path) > CACHE_MAX_BYTES:
+        os.remove(local_path)
+        return None
+
+    path = _entry_path(uri, etag)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(local_path, path)
+    evict(keep=(path,))
+    return path
+
+
+@contextmanager
+def open_cached(uri, etag, download_to):
+    """
+    Memory map of uri@etag for the duration of the with block, download_to(path) streams it to disk on a miss
+
+    The entry is held while open so eviction here never deletes it; an object bigger than the whole
+    cache is read from its temp file and deleted afterwards instead of being cached
+    """
+    path = _entry_path(uri, etag)
+    uncached = None
+    _hold(path)
+    try:
+        source = _open_entry(path)
+        if source is None:
+            tmp_path = new_temp_path()
+            try:
+                download_to(tmp_path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+
+            if os.path.getsize(tmp_path) > CACHE_MAX_BYTES:
+                uncached = tmp_path
+                source = pa.memory_map(tmp_path)
+            else:
+                adopt(uri, etag, tmp_path)
+                source = pa.memory_map(str(path))
+
+        with source:
+            yield source
+    finally:
+        _release(path)
+        if uncached is not None:
+            os.remove(uncached)
+
+
+def evict(max_bytes=None, keep=()):
+    """
+    Delete least recently used entries until the cache fits under max_bytes
+
+    keep: entries that must survive (just adopted); entries open in this process are skipped too
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _evict_lock:
+        with _in_use_lock:
+            skip = {Path(p) for p in keep} | set(_in_use)
+
+        entries = []
+        for entry in CACHE_DIR.glob("*/*"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= max_bytes:
+                break
+            if entry in skip:
+                continue
+            try:
+                entry.unlink()
+                total -= size
+            except FileNotFoundError:
+                pass
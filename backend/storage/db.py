@@ -1,7 +1,9 @@
-from sqlalchemy import create_engine
+import pandas as pd
+from sqlalchemy import create_engine, text
 import psycopg2
 from psycopg2.extras import execute_values
 from dotenv import load_dotenv
+from contextlib import nullcontext
 import os
 
 load_dotenv()
@@ -12,8 +14,68 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME")
 
-DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+#DATABASE_URL overrides the postgres settings (e.g. sqlite:///local.db to run the pipeline without a server)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine = create_engine(DATABASE_URL)
 
-def write_df_to_db(df, table_name):
-    df.to_sql(table_name, engine, if_exists="replace", index=False)
\ No newline at end of file
+#optional wrapper around every write, hook(table_name, rows) -> context manager yielding a dict
+#(pipeline.profiling installs one so writes show up in the run report, storage doesn't depend on the pipeline)
+_write_hook = None
+
+
+def set_write_hook(hook):
+    global _write_hook
+    _write_hook = hook
+
+
+def write_df_to_db(df, table_name, index_cols=None, if_exists="replace"):
+    """
+    Replace a table with the df (if_exists="append" adds the rows instead)
+    index_cols: columns to build a btree index on (e.g. ["IDfg"] for player lookups)
+    """
+    with _write_hook(table_name, len(df)) if _write_hook else nullcontext({}) as record:
+        df.to_sql(table_name, engine, if_exists=if_exists, index=False)
+
+        for col in index_cols or []:
+            with engine.begin() as conn:
+                conn.execute(text(f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{col}" ON "{table_name}" ("{col}")'))
+        record["rows_out"] = len(df)
+
+def create_partitioned_table(table_name, columns, partition_col, partition_values, btree_indexes=None, brin_cols=None):
+    """
+    Create (if missing) a table list-partitioned on partition_col with one partition per value
+
+    columns: {column: sql type}
+    btree_indexes: lists of columns, one composite btree index each
+    brin_cols: columns to build BRIN indexes on (cheap for append ordered columns)
+    On postgres indexes declared on the parent are created on every partition; other databases
+    (sqlite for local runs) get a plain table with the same btree indexes
+    """
+    postgres = engine.dialect.name == "postgresql"
+    column_sql = ", ".join(f'"{name}" {sql_type}' for name, sql_type in columns.items())
+    partition_sql = f' PARTITION BY LIST ("{partition_col}")' if postgres else ""
+
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{table_name}" ({column_sql}){partition_sql}'))
+
+        if postgres:
+            for value in partition_values:
+                conn.execute(text(
+                    f'CREATE TABLE IF NOT EXISTS "{table_name}_{value}" PARTITION OF "{table_name}" FOR VALUES IN ({int(value)})'
+                ))
+
+        for cols in btree_indexes or []:
+            col_sql = ", ".join(f'"{c}"' for c in cols)
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{"_".join(cols)}" ON "{table_name}" ({col_sql})'))
+
+        if postgres:
+            for col in brin_cols or []:
+                conn.execute(text(f'CREATE INDEX IF NOT EXISTS "brin_{table_name}_{col}" ON "{table_name}" USING BRIN ("{col}")'))
+
+
+def read_sql_df(query, params=None):
+    """
+    Run a select and return the rows as a df
+    """
+    with engine.connect() as conn:
+        return pd.read_sql(text(query), conn, params=params)
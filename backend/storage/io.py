@@ -1,53 +1,195 @@
+import os
+
 import pandas as pd
-import boto3
-from io import BytesIO
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from storage import cache
+from storage.backends import get_backend
+
+
+#rows per parquet row group, big enough that a full season scan is one read per file
+#while still letting min/max stats skip groups when filtering on sorted keys (IDfg)
+ROW_GROUP_SIZE = 100_000
+
+#filter operators understood for hive partition pruning (same tuples pyarrow takes)
+_PARTITION_OPS = {
+    "=": lambda a, b: a == b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not in": lambda a, b: a not in b,
+}
+
+
+def is_dataset_uri(uri):
+    """
+    URIs ending in .parquet are single files, anything else is a hive partitioned dataset directory
+    """
+    return not uri.rstrip("/").endswith(".parquet")
+
+
+def _parse_partition_value(value):
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def _partition_values(relative_path):
+    """
+    "Season=2021/part-0.parquet" -> {"Season": 2021}
+    """
+    values = {}
+    for part in relative_path.split("/")[:-1]:
+        if "=" in part:
+            col, value = part.split("=", 1)
+            values[col] = _parse_partition_value(value)
+    return values
+
+
+def _matches(values, partition_filters):
+    return all(_PARTITION_OPS[op](values[col], value) for col, op, value in partition_filters)
+
+
+def _list_dataset_files(uri):
+    """
+    List parquet files under a dataset, returned relative to the dataset root
+    """
+    return [f for f in get_backend(uri).list_files(uri) if f.endswith(".parquet")]
+
+
+def _upload_through_cache(local_path, uri):
+    """
+    Upload a finished local file and keep it in the cache under the new etag (write-through)
+    """
+    backend = get_backend(uri)
+    backend.upload_file(local_path, uri)
 
+    if backend.cacheable and cache.cache_enabled():
+        cache.adopt(uri, backend.etag(uri), local_path)
+    else:
+        os.remove(local_path)
+
+
+def _write_table(table, uri):
+    backend = get_backend(uri)
+    if backend.is_local:
+        path = backend.local_path(uri)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        pq.write_table(table, path, row_group_size=ROW_GROUP_SIZE)
+    else:
+        local_path = cache.new_temp_path()
+        pq.write_table(table, local_path, row_group_size=ROW_GROUP_SIZE)
+        _upload_through_cache(local_path, uri)
+
+
+def _read_table(uri, columns=None, filters=None):
+    backend = get_backend(uri)
+    if backend.is_local:
+        return pq.read_table(backend.local_path(uri), columns=columns, filters=filters or None)
+
+    #served from the cache when the etag still matches (a hit costs one HEAD request, a miss streams to disk)
+    if backend.cacheable and cache.cache_enabled():
+        with cache.open_cached(uri, backend.etag(uri), lambda path: backend.download_file(uri, path)) as source:
+            return pq.read_table(source, columns=columns, filters=filters or None)
 
-#create s3 client which will read env file by itself
-s3 = boto3.client('s3')
+    return pq.read_table(pa.BufferReader(backend.read_bytes(uri)), columns=columns, filters=filters or None)
 
-def save_dataframe(df, uri):
+
+def save_dataframe(df, uri, partition_cols=None):
     """
-    Save dataframe locally or to s3
-    
+    Save dataframe locally or to s3 (or whichever backend serves the uri, see storage.backends)
+
     uri examples:
         local: data/raw/batting.parquet
         s3: "s3://mlb-ml-data/raw/batting.parquet"
+
+    partition_cols: write a hive partitioned dataset instead (uri is then a directory,
+                    e.g. "s3://mlb-ml-data/raw/batting" -> raw/batting/Season=2021/part-0.parquet)
     """
-    if uri.startswith("s3://"):
-        
-        #parse bucket and key
-        path = uri[5:]
-        bucket, key = path.split("/", 1)
+    if partition_cols:
+        #overwrite the whole dataset so partitions that no longer exist don't linger
+        get_backend(uri).delete_prefix(uri)
+
+        sort_cols = [c for c in ["IDfg"] if c in df.columns]
+        for values, partition_df in df.groupby(partition_cols, observed=True):
+            values = values if isinstance(values, tuple) else (values,)
+            partition_path = "/".join(f"{col}={value}" for col, value in zip(partition_cols, values))
+
+            partition_df = partition_df.drop(columns=partition_cols)
+            if sort_cols:
+                partition_df = partition_df.sort_values(sort_cols)
+            table = pa.Table.from_pandas(partition_df, preserve_index=False)
+            _write_table(table, f"{uri.rstrip('/')}/{partition_path}/part-0.parquet")
+
+        print(f"Dataset saved at {uri} (partitioned by {partition_cols})")
+        return
 
-        buffer = BytesIO()
-        df.to_parquet(buffer, index=False)
-        buffer.seek(0)
-        s3.upload_fileobj(buffer, Bucket=bucket, Key=key)
-        print(f"Data saved to S3 at {uri}")
+    backend = get_backend(uri)
+    if backend.is_local:
+        path = backend.local_path(uri)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        df.to_parquet(path)
+        print(f"Data saved locally at {path}")
 
     else:
-        df.to_parquet(uri)
-        print(f"Data saved locally at {uri}")
+        #write to disk then upload, so the next read of this uri is a cache hit
+        local_path = cache.new_temp_path()
+        df.to_parquet(local_path, index=False)
+        _upload_through_cache(local_path, uri)
+        print(f"Data saved to {uri}")
 
-def load_dataframe(uri):
+
+def _load_dataset(uri, columns=None, filters=None):
+    files = _list_dataset_files(uri)
+    if not files:
+        raise FileNotFoundError(f"No parquet files found under {uri}")
+
+    partition_keys = set(_partition_values(files[0]))
+    partition_filters = [f for f in filters or [] if f[0] in partition_keys]
+    file_filters = [f for f in filters or [] if f[0] not in partition_keys]
+    file_columns = [c for c in columns if c not in partition_keys] if columns is not None else None
+
+    tables = []
+    for relative_path in files:
+        values = _partition_values(relative_path)
+
+        #skip whole partitions whose key fails the filter (e.g. Season >= 2023)
+        if not _matches(values, partition_filters):
+            continue
+
+        table = _read_table(f"{uri.rstrip('/')}/{relative_path}", columns=file_columns, filters=file_filters)
+        for col, value in values.items():
+            if columns is None or col in columns:
+                partition_array = pd.to_numeric(pd.Series([value] * table.num_rows), downcast="integer") \
+                    if isinstance(value, int) else pd.Series([value] * table.num_rows)
+                table = table.append_column(col, pa.array(partition_array))
+        tables.append(table.replace_schema_metadata(None))
+
+    if not tables:
+        return pd.DataFrame(columns=columns or [])
+
+    df = pa.concat_tables(tables, promote_options="permissive").to_pandas()
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+
+def load_dataframe(uri, columns=None, filters=None):
     """
     Load df locally or from s3
-    
-    """
-    if uri.startswith("s3://"):
-        
-        path = uri[5:]
-        bucket, key = path.split("/", 1)
-
-        buffer = BytesIO()
-        s3.download_fileobj(Bucket=bucket, Key=key, Fileobj=buffer)
-        buffer.seek(0)
-        df = pd.read_parquet(buffer)
-        print(f"Data loaded from S3 at {uri}")
+
+    columns: only read these columns
+    filters: pyarrow style [(col, op, value), ...] ANDed together; partition keys prune whole
+             partitions and the rest are pushed down to the parquet row groups
+    """
+    if is_dataset_uri(uri):
+        df = _load_dataset(uri, columns=columns, filters=filters)
+        print(f"Dataset loaded from {uri} ({len(df)} rows)")
         return df
 
-    else:
-        df = pd.read_parquet(uri)
-        print(f"Data loaded locally from {uri}")
-        return df
\ No newline at end of file
+    df = _read_table(uri, columns=columns, filters=filters).to_pandas()
+    print(f"Data loaded from {uri}")
+    return df
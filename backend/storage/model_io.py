@@ -1,25 +1,211 @@
-import boto3
-from urllib.parse import urlparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+
+from storage.backends import get_backend
+
+
+#model artifacts under a models uri:
+#   {models_uri}/manifest.json                  name -> current version (+ history)
+#   {models_uri}/{name}/{version}.joblib        version = content hash of the file
+#   {models_uri}/tuned_params.json              name -> winning hyperparameters from training.tuning
+#
+#artifacts are written uncompressed: joblib can then memory map the numpy arrays inside
+#(tree ensembles are mostly node arrays) so loading is a page-in and worker processes share the pages
+ARTIFACT_COMPRESS = 0
+
+#local copies of downloaded artifacts, keyed by version so an unchanged model is never downloaded twice
+LOCAL_ARTIFACT_DIR = Path(os.getenv(
+    "INNINGAI_ARTIFACT_DIR", Path(__file__).resolve().parent.parent / "data" / "cache" / "artifacts"
+))
+
+#artifacts already loaded in this process, keyed by (name, version)
+_loaded = {}
 
-s3 = boto3.client("s3")
 
 def upload_model(local_path: str, s3_uri: str):
     """
-    Upload a local model file (pkl) to S3
+    Upload a local model file (pkl) to S3 (or whichever backend serves the uri)
     """
-    parsed = urlparse(s3_uri)
-    bucket = parsed.netloc
-    key = parsed.path.lstrip("/")
-
-    s3.upload_file(local_path, bucket, key)
+    get_backend(s3_uri).upload_file(local_path, s3_uri)
 
 
 def download_model(s3_uri: str, local_path: str):
     """
-    Download a model file (pkl) from S3
+    Download a model file (pkl) from S3 (or whichever backend serves the uri)
     """
-    parsed = urlparse(s3_uri)
-    bucket = parsed.netloc
-    key = parsed.path.lstrip("/")
+    get_backend(s3_uri).download_file(s3_uri, local_path)
+
 
-    s3.download_file(bucket, key, local_path)
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _local_artifact_path(name, version):
+    return LOCAL_ARTIFACT_DIR / name / f"{version}.joblib"
+
+
+def save_artifact(obj, models_uri, name, metadata=None):
+    """
+    Dump an object as a versioned artifact and upload it
+
+    Returns the manifest entry; the caller records it with update_manifest
+    (kept separate so parallel trainers don't race on the manifest file)
+    metadata: extra json fields stored on the entry
+    """
+    LOCAL_ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=LOCAL_ARTIFACT_DIR, suffix=".tmp")
+    os.close(fd)
+
+    joblib.dump(obj, tmp_path, compress=ARTIFACT_COMPRESS)
+    sha256 = _file_sha256(tmp_path)
+    version = sha256[:16]
+
+    local_path = _local_artifact_path(name, version)
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, local_path)
+
+    uri = f"{models_uri.rstrip('/')}/{name}/{version}.joblib"
+    backend = get_backend(uri)
+
+    #content addressed, so an identical artifact is already uploaded
+    if not backend.exists(uri):
+        backend.upload_file(str(local_path), uri)
+
+    return {
+        "name": name,
+        "version": version,
+        "sha256": sha256,
+        "uri": uri,
+        "size": local_path.stat().st_size,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        **(metadata or {}),
+    }
+
+
+def read_json(uri, default=None):
+    """
+    Load a small json object from storage, default if it doesn't exist yet
+    """
+    backend = get_backend(uri)
+    if not backend.exists(uri):
+        return {} if default is None else default
+    return json.loads(backend.read_bytes(uri))
+
+
+def write_json(uri, obj):
+    LOCAL_ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=LOCAL_ARTIFACT_DIR, suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(obj, f, indent=2)
+    get_backend(uri).upload_file(tmp_path, uri)
+    os.remove(tmp_path)
+
+
+def read_manifest(models_uri):
+    """
+    Load the manifest (name -> entry), empty if nothing has been published yet
+    """
+    return read_json(f"{models_uri.rstrip('/')}/manifest.json")
+
+
+def update_manifest(models_uri, entries):
+    """
+    Point each entry's name at its new version, keeping earlier versions in "history"
+    """
+    manifest = read_manifest(models_uri)
+
+    for entry in entries:
+        previous = manifest.get(entry["name"])
+        history = previous.get("history", []) if previous else []
+        if previous and previous["version"] != entry["version"]:
+            history = history + [{k: v for k, v in previous.items() if k != "history"}]
+        manifest[entry["name"]] = {**entry, "history": history}
+
+    uri = f"{models_uri.rstrip('/')}/manifest.json"
+    write_json(uri, manifest)
+
+    print(f"Manifest updated at {uri} ({len(entries)} artifacts)")
+    return manifest
+
+
+def read_tuned_params(models_uri):
+    """
+    Winning hyperparameters per artifact name ("{stat}_{model}" -> params), empty if never tuned
+    """
+    tuned = read_json(f"{models_uri.rstrip('/')}/tuned_params.json")
+    return {name: entry["params"] for name, entry in tuned.items()}
+
+
+def publish_tuned_params(models_uri, name, params, score):
+    """
+    Record a tuning winner; the next training run picks it up through read_tuned_params
+    """
+    uri = f"{models_uri.rstrip('/')}/tuned_params.json"
+    tuned = read_json(uri)
+    tuned[name] = {
+        "params": params,
+        "score": score,
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    write_json(uri, tuned)
+    print(f"Tuned params for {name} published to {uri}")
+
+
+def load_artifact(entry, mmap_mode="r"):
+    """
+    Load an artifact from its manifest entry
+
+    Downloads only if this version isn't already on disk, and reuses the object
+    if this process has already loaded the same version
+    """
+    key = (entry["name"], entry["version"])
+    if key in _loaded:
+        return _loaded[key]
+
+    local_path = _local_artifact_path(entry["name"], entry["version"])
+    if not local_path.exists():
+        #download next to the final path and rename into place, so a crash or a second loader
+        #never leaves a truncated file at the versioned path
+        LOCAL_ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=LOCAL_ARTIFACT_DIR, suffix=".tmp")
+        os.close(fd)
+        try:
+            download_model(entry["uri"], tmp_path)
+            if "sha256" in entry and _file_sha256(tmp_path) != entry["sha256"]:
+                raise ValueError(f"Downloaded {entry['uri']} doesn't match its manifest sha256")
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, local_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    obj = joblib.load(local_path, mmap_mode=mmap_mode)
+    _loaded[key] = obj
+    return obj
+
+
+def load_changed_artifacts(models_uri, known_versions, names=None):
+    """
+    Load only the artifacts whose version differs from known_versions (name -> version)
+
+    Returns {name: (version, obj)} for the changed ones
+    """
+    manifest = read_manifest(models_uri)
+    changed = {}
+    for name, entry in manifest.items():
+        if names is not None and name not in names:
+            continue
+        if known_versions.get(name) == entry["version"]:
+            continue
+        changed[name] = (entry["version"], load_artifact(entry))
+    return changed
@@ -0,0 +1,234 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from storage.backends import get_backend
+from storage.io import load_dataframe, save_dataframe
+from storage.db import write_df_to_db
+from storage.model_io import load_artifact, read_json, read_manifest, read_tuned_params, save_artifact, update_manifest
+from evalution.evaluate_models import score_predictions, write_eval_outputs
+from training.scheduler import default_output_uris
+from training.importance import shap_direction
+from training.intervals import INTERVAL_ALPHA, conformal_quantile
+from training.train_models import ENSEMBLE_MODEL, MODELS, explanations_uri, feature_columns
+
+
+#stacked ensemble: a non-negative linear blend of the published models, one per stat
+#
+#the blend weights are fit on the out-of-fold predictions the backtest already caches
+#(every base model predicting seasons it was not trained on), so nothing is refit for it;
+#the published artifact only holds the weights and the base versions it blends, the base
+#pipelines themselves are loaded (and shared with everything else) through the manifest
+#
+#SHAP values are additive in the model output, so the ensemble's explanations are the same
+#blend of the base models' explanations
+#
+#the out-of-fold models are fit with the tuned params training publishes with, but a warm started base
+#(training.incremental) or params tuned after the backtest ran still differ from what produced the
+#weights; every difference is recorded on the artifact as "oof_mismatch"
+
+TEST_SEASON = 2025  # never used to fit the weights, it is what the ensemble is evaluated on
+
+
+class StackedEnsemble:
+    """
+    Weighted sum of base pipeline predictions plus an intercept
+
+    Behaves like a saved pipeline for predict (raw feature columns in), the base pipelines are
+    resolved from their manifest entries on first use and not pickled with the ensemble
+    """
+
+    def __init__(self, base_entries, weights, intercept, feature_names):
+        self.base_entries = base_entries  # {model_name: manifest entry}
+        self.weights = weights  # {model_name: weight}
+        self.intercept = float(intercept)
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self._pipelines = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pipelines"] = None
+        return state
+
+    def base_pipelines(self):
+        if self._pipelines is None:
+            self._pipelines = {name: load_artifact(entry) for name, entry in self.base_entries.items()}
+        return self._pipelines
+
+    def base_predictions(self, X):
+        """
+        rows x base models matrix, columns in self.weights order
+        """
+        pipelines = self.base_pipelines()
+        return np.column_stack([
+            pipelines[name].predict(X[list(pipelines[name].feature_names_in_)]) for name in self.weights
+        ])
+
+    def predict(self, X):
+        return self.base_predictions(X) @ np.array(list(self.weights.values())) + self.intercept
+
+
+def oof_matrix(oof_df, stat, model_names, exclude_season=TEST_SEASON):
+    """
+    Player-season x model matrix of out-of-fold predictions for one stat, plus the actuals
+
+    Rows missing any model (fits dropped by the backtest time budget) are left out
+    """
+    rows = oof_df[(oof_df["Stat"] == stat) & (oof_df["Next_Season"] != exclude_season)]
+    wide = rows.pivot_table(index=["IDfg", "Next_Season"], columns="Model", values="Predicted")
+    actual = rows.groupby(["IDfg", "Next_Season"])["Actual"].first()
+
+    missing = [m for m in model_names if m not in wide.columns]
+    if missing:
+        raise ValueError(f"No out-of-fold predictions for {stat} {missing}, run the backtest first")
+
+    wide = wide[model_names].dropna()
+    if wide.empty:
+        raise ValueError(f"No {stat} player-season has an out-of-fold prediction from every model {model_names}")
+    return wide.to_numpy(dtype=np.float64), actual.loc[wide.index].to_numpy(dtype=np.float64), wide.index
+
+
+def fit_meta_learner(P, y, alpha=INTERVAL_ALPHA):
+    """
+    Non-negative least squares blend of the base predictions P against y
+
+    Returns (weights, intercept, conformal half width); the residuals are out of sample for the
+    base models and the blend only has a handful of parameters, so they calibrate the interval
+    """
+    meta = LinearRegression(positive=True).fit(P, y)
+    residuals = np.abs(y - meta.predict(P))
+    return meta.coef_, float(meta.intercept_), conformal_quantile(residuals, alpha)
+
+
+def blend_explanations(models_uri, stat, weights, predictions_by_id):
+    """
+    The ensemble's per-player SHAP matrix from the base models' ones (same layout as build_explanations)
+    """
+    blended = None
+    for model_name, weight in weights.items():
+        base = load_dataframe(explanations_uri(models_uri, stat, model_name)).set_index("IDfg")
+        features = [c for c in base.columns if c not in ("Predicted", "Base_Value")]
+        blended = base[features] * weight if blended is None else blended.add(base[features] * weight, fill_value=0.0)
+
+    blended = blended.dropna().astype(np.float32)
+    explanations = blended.reset_index()
+    explanations["Predicted"] = predictions_by_id.reindex(blended.index).to_numpy(dtype=np.float32)
+    explanations["Base_Value"] = (explanations["Predicted"] - blended.sum(axis=1).to_numpy()).astype(np.float32)
+    return explanations
+
+
+def blended_importance(explanations, features_df):
+    """
+    Mean |SHAP| per feature of the blended explanations, in the tree models' importance layout
+    """
+    features = [c for c in explanations.columns if c not in ("IDfg", "Predicted", "Base_Value")]
+    values = explanations[features].to_numpy(dtype=np.float32)
+    X = features_df.set_index("IDfg").reindex(explanations["IDfg"])[features].to_numpy(dtype=np.float32)
+
+    importance_df = pd.DataFrame({
+        "Feature": features,
+        "Importance": np.abs(values).mean(axis=0),
+        "Direction": shap_direction(X, values),
+    }).sort_values(by="Importance", ascending=False)
+    importance_df["Effect"] = np.where(importance_df["Direction"] > 0, "Increases prediction", "Decreases prediction")
+    return importance_df
+
+
+def oof_mismatch(stat, model_names, base_entries, oof_params, published_params):
+    """
+    {model: why the published base model isn't the config its out-of-fold predictions came from}
+    """
+    mismatch = {}
+    for m in model_names:
+        name = f"{stat}_{m}"
+        reasons = []
+        if name not in oof_params:
+            reasons.append("out-of-fold params unknown (backtest predates oof_params.json)")
+        elif oof_params[name] != published_params.get(name):
+            reasons.append(f"out-of-fold fit with {oof_params[name]}, published with {published_params.get(name)}")
+        if base_entries[m].get("increments"):
+            reasons.append(f"published model is warm started ({base_entries[m]['increments']} increments)")
+        if reasons:
+            mismatch[m] = "; ".join(reasons)
+    return mismatch
+
+
+def run_ensemble(feature_uris, models_uri, oof_uri, model_names=None):
+    """
+    Fit each stat's blend on the cached out-of-fold predictions, publish it and write its tables
+
+    feature_uris: {stat: features parquet uri}
+    oof_uri: the backtest's oof_predictions.parquet
+    Returns {stat: {"weights", "mae", "r2"}}
+    """
+    model_names = model_names or list(MODELS)
+    if not get_backend(oof_uri).exists(oof_uri):
+        raise FileNotFoundError(f"No out-of-fold predictions at {oof_uri} (python Run.py backtest writes them)")
+    oof_df = load_dataframe(oof_uri)
+    #raise rather than publish nothing, so the pipeline marks the stage failed and retries it next run
+    if oof_df.empty:
+        raise ValueError(f"No out-of-fold predictions in {oof_uri}, the backtest finished no fits")
+    oof_params = read_json(f"{oof_uri.rsplit('/', 1)[0]}/oof_params.json")
+    published_params = read_tuned_params(models_uri)
+    manifest = read_manifest(models_uri)
+
+    entries = []
+    results = {}
+    for stat, features_uri in feature_uris.items():
+        start = time.perf_counter()
+        missing = [m for m in model_names if f"{stat}_{m}" not in manifest]
+        if missing:
+            print(f"{stat} ensemble skipped, {missing} not published")
+            continue
+
+        P, y, oof_index = oof_matrix(oof_df, stat, model_names)
+        coef, intercept, half_width = fit_meta_learner(P, y)
+        weights = {m: float(w) for m, w in zip(model_names, coef)}
+
+        base_entries = {m: {k: v for k, v in manifest[f"{stat}_{m}"].items() if k != "history"} for m in model_names}
+        mismatch = oof_mismatch(stat, model_names, base_entries, oof_params, published_params)
+        for m, reason in mismatch.items():
+            print(f"{stat} ensemble: {m} weight fit on a different config, {reason}")
+        ensemble = StackedEnsemble(base_entries, weights, intercept, feature_columns(stat))
+        interval = {"method": "conformal", "alpha": INTERVAL_ALPHA, "half_width": half_width}
+
+        #evaluated on the test season like every other model, through the same tables
+        features_df = load_dataframe(features_uri)
+        test_df = features_df[features_df["Next_Season"] == TEST_SEASON]
+        predictions = ensemble.predict(test_df)
+        metrics, result_df = score_predictions(test_df, stat, predictions,
+                                               predictions - half_width, predictions + half_width)
+        write_eval_outputs(stat, ENSEMBLE_MODEL, metrics, result_df)
+
+        explanations = blend_explanations(models_uri, stat, weights,
+                                          pd.Series(predictions, index=test_df["IDfg"].to_numpy()))
+        save_dataframe(explanations, explanations_uri(models_uri, stat, ENSEMBLE_MODEL))
+
+        importance_df = blended_importance(explanations, test_df)
+        metrics_uri, importance_uri = default_output_uris(models_uri, stat, ENSEMBLE_MODEL)
+        save_dataframe(pd.DataFrame([{"mae": metrics["MAE"], "r2": metrics["R2"], **weights}]), metrics_uri)
+        save_dataframe(importance_df, importance_uri)
+        write_df_to_db(importance_df, f"{stat.lower()}_{ENSEMBLE_MODEL.lower()}_importance")
+
+        interval_entry = save_artifact(interval, models_uri, f"{stat}_{ENSEMBLE_MODEL}_interval")
+        entries.append(save_artifact(ensemble, models_uri, f"{stat}_{ENSEMBLE_MODEL}", metadata={
+            "trained_seasons": base_entries[model_names[0]].get("trained_seasons"),
+            "weights": weights,
+            "base_versions": {m: entry["version"] for m, entry in base_entries.items()},
+            "meta_rows": len(oof_index),
+            "oof_params": {m: oof_params.get(f"{stat}_{m}") for m in model_names},
+            "oof_mismatch": mismatch,
+            "interval": interval_entry,
+        }))
+
+        results[stat] = {"weights": weights, "mae": metrics["MAE"], "r2": metrics["R2"]}
+        print(f"{stat} ensemble ({len(oof_index)} out-of-fold rows) in {time.perf_counter() - start:.2f}s: "
+              + ", ".join(f"{m} {w:.2f}" for m, w in weights.items())
+              + f", MAE {metrics['MAE']:.4f}, R² {metrics['R2']:.4f}")
+
+    if not entries:
+        raise ValueError(f"No ensemble fit for {list(feature_uris)}, every stat was skipped")
+    update_manifest(models_uri, entries)
+    return results
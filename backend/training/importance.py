@@ -0,0 +1,150 @@
+import hashlib
+import os
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+#feature importance for trained models
+#tree models: mean |SHAP| from tree-path SHAP over a row sample, linear models: coefficients
+
+#rows explained per model (None = every training row), SHAP cost is linear in this
+SHAP_SAMPLE_ROWS = int(os.getenv("INNINGAI_SHAP_SAMPLE_ROWS", "2000")) or None
+
+RANDOM_SEED = 42
+
+#importance results keyed by model hash + data hash, so an unchanged model never reruns SHAP
+SHAP_CACHE_DIR = Path(os.getenv(
+    "INNINGAI_SHAP_CACHE_DIR", Path(__file__).resolve().parent.parent / "data" / "cache" / "shap"
+))
+
+TREE_MODELS = ["RandomForest", "XGBoost"]
+LINEAR_MODELS = ["LinearRegression", "Ridge"]
+
+
+def shap_values(model_name, model, X):
+    """
+    Per-row SHAP matrix (rows x features) for a fitted model on standardized X
+
+    XGBoost uses its native tree-path SHAP (pred_contribs), RandomForest uses shap's TreeExplainer
+    in tree_path_dependent mode, linear models are exact: coef * (x - mean) and the mean is 0 after scaling
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+
+    if model_name == "XGBoost":
+        import xgboost as xgb
+        contribs = model.get_booster().predict(xgb.DMatrix(X), pred_contribs=True)
+        return contribs[:, :-1]  # last column is the bias term
+
+    if model_name in TREE_MODELS:
+        import shap
+        explainer = shap.TreeExplainer(model, feature_perturbation="tree_path_dependent")
+        return np.asarray(explainer.shap_values(X, check_additivity=False), dtype=np.float32)
+
+    if model_name in LINEAR_MODELS:
+        return (X * np.asarray(model.coef_, dtype=np.float32)).astype(np.float32)
+
+    raise ValueError(f"No SHAP method for model: {model_name}")
+
+
+def shap_direction(X, values):
+    """
+    Correlation between each feature and its SHAP values, all columns at once
+    (0 for constant columns)
+    """
+    X = np.asarray(X, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    x_centered = X - X.mean(axis=0)
+    s_centered = values - values.mean(axis=0)
+    numerator = (x_centered * s_centered).sum(axis=0)
+    denominator = np.sqrt((x_centered ** 2).sum(axis=0) * (s_centered ** 2).sum(axis=0))
+
+    direction = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+    return np.nan_to_num(direction, nan=0.0)
+
+
+def sample_rows(X, n_rows, seed=RANDOM_SEED):
+    """
+    Fixed-seed row subsample (same rows every run, so cached results stay valid)
+    """
+    if n_rows is None or len(X) <= n_rows:
+        return X
+    idx = np.sort(np.random.default_rng(seed).choice(len(X), size=n_rows, replace=False))
+    return X[idx]
+
+
+def _cache_key(model_name, model, X, n_rows):
+    model_hash = joblib.hash(model)
+    data_hash = joblib.hash(np.ascontiguousarray(X))
+    return hashlib.sha256(f"{model_name}|{model_hash}|{data_hash}|{n_rows}".encode()).hexdigest()
+
+
+def compute_importance(model_name, model, X_train, feature_cols, n_rows=SHAP_SAMPLE_ROWS, cache_dir=SHAP_CACHE_DIR):
+    """
+    Feature importance for a fitted model, X_train is the standardized matrix it was fit on
+
+    Returns (importance_df, timings) where timings has seconds per stage
+    """
+    feature_names = feature_cols
+    timings = {}
+
+    if model_name in LINEAR_MODELS:
+        start = time.perf_counter()
+        coefficients = model.coef_
+        importance_df = pd.DataFrame({
+            "Feature": feature_names,
+            "Coefficient": coefficients
+        }).sort_values("Coefficient", key=abs, ascending=False)
+        timings["coefficients"] = time.perf_counter() - start
+        return importance_df, timings
+
+    start = time.perf_counter()
+    cache_path = Path(cache_dir) / f"{_cache_key(model_name, model, X_train, n_rows)}.parquet"
+    timings["hash"] = time.perf_counter() - start
+
+    if cache_path.exists():
+        start = time.perf_counter()
+        importance_df = pd.read_parquet(cache_path)
+        timings["cache_read"] = time.perf_counter() - start
+        print(f"{model_name} importance: cache hit ({_format_timings(timings)})")
+        return importance_df, timings
+
+    start = time.perf_counter()
+    X_sample = sample_rows(X_train, n_rows)
+    timings["sample"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    values = shap_values(model_name, model, X_sample)
+    timings["explain"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shap_importance = np.abs(values).mean(axis=0)
+    #correlation is unaffected by the scaling, so the standardized columns give the same direction as raw ones
+    direction = shap_direction(X_sample, values)
+    timings["direction"] = time.perf_counter() - start
+
+    importance_df = pd.DataFrame({
+        "Feature": feature_names,
+        "Importance": shap_importance,
+        "Direction": direction
+    }).sort_values(by="Importance", ascending=False)
+
+    importance_df["Effect"] = np.where(importance_df["Direction"] > 0, "Increases prediction", "Decreases prediction")
+
+    #cache is best effort
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        importance_df.to_parquet(cache_path, index=False)
+    except OSError as e:
+        print(f"{model_name} importance: could not cache ({e})")
+
+    print(f"{model_name} importance: {len(X_sample)} rows explained ({_format_timings(timings)})")
+    return importance_df, timings
+
+
+def _format_timings(timings):
+    return ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in timings.items())
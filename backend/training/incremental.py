@@ -0,0 +1,212 @@
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+
+from storage.db import write_df_to_db
+from storage.model_io import load_artifact, read_manifest, read_tuned_params, save_artifact, update_manifest
+from training.scheduler import default_output_uris
+from training.train_models import (
+    MODELS, build_model, fit_and_score, load_training_split, prepare_matrices, save_model_outputs, score_fitted
+)
+
+
+#warm start retraining when a new season pair lands
+#
+#the previous pipeline is loaded from the manifest and only the new work is done:
+#   XGBoost         INCREMENTAL_XGB_ROUNDS more boosting rounds on top of the previous booster
+#   RandomForest    INCREMENTAL_RF_TREES more trees (warm_start), the existing trees are kept
+#   Linear / Ridge  re-solved from cached X^T X / X^T y, only the new rows are read into them
+#the previous scaler is kept so the old trees/coefficients still see the same inputs
+#
+#every FULL_RETRAIN_EVERY warm starts a full retrain is run as well, it replaces the warm started
+#model and the gap between the two is written to the guard table
+
+INCREMENTAL_XGB_ROUNDS = 100
+INCREMENTAL_RF_TREES = 50
+
+FULL_RETRAIN_EVERY = 4
+GUARD_TOLERANCE = 0.02  # relative MAE gap above which the guard warns
+GUARD_TABLE = "incremental_guard"
+
+LINEAR_MODELS = ["LinearRegression", "Ridge"]
+
+
+def sufficient_statistics(X, y):
+    """
+    X^T X and X^T y over raw (unscaled) features with an intercept column
+
+    Raw space so the cache stays valid whatever scaler the model uses
+    """
+    A = np.hstack([np.asarray(X, dtype=np.float64), np.ones((len(X), 1))])
+    y = np.asarray(y, dtype=np.float64)
+    return {"xtx": A.T @ A, "xty": A.T @ y, "rows": len(X)}
+
+
+def add_statistics(a, b):
+    return {"xtx": a["xtx"] + b["xtx"], "xty": a["xty"] + b["xty"], "rows": a["rows"] + b["rows"]}
+
+
+def solve_linear(previous_model, stats, mean, scale):
+    """
+    Refit a LinearRegression / Ridge from sufficient statistics, in the scaler's standardized space
+
+    [x, 1] -> [(x - mean) / scale, 1] is linear, so the standardized normal equations are M^T G M w = M^T b
+    The intercept is left out of the ridge penalty, like sklearn
+    """
+    n_features = len(mean)
+    M = np.zeros((n_features + 1, n_features + 1))
+    M[:n_features, :n_features] = np.diag(1.0 / scale)
+    M[n_features, :n_features] = -mean / scale
+    M[n_features, n_features] = 1.0
+
+    xtx = M.T @ stats["xtx"] @ M
+    xty = M.T @ stats["xty"]
+
+    alpha = getattr(previous_model, "alpha", 0.0)
+    penalty = np.diag(np.append(np.full(n_features, alpha), 0.0))
+    try:
+        w = np.linalg.solve(xtx + penalty, xty)
+    except np.linalg.LinAlgError:
+        w = np.linalg.lstsq(xtx + penalty, xty, rcond=None)[0]
+
+    model = copy.deepcopy(previous_model)
+    model.coef_ = w[:-1]
+    model.intercept_ = float(w[-1])
+    return model
+
+
+def warm_start(model_name, previous_model, matrices, n_jobs=None, linear_stats=None, scaler=None):
+    """
+    Continue a fitted model on the updated training matrix
+    """
+    X, y = matrices["X_train"], matrices["y_train"]
+
+    if model_name == "XGBoost":
+        model = build_model("XGBoost", n_jobs=n_jobs, params=previous_model.get_params())
+        model.set_params(n_estimators=INCREMENTAL_XGB_ROUNDS)
+        model.fit(X, y, xgb_model=previous_model.get_booster())
+        return model
+
+    if model_name == "RandomForest":
+        model = copy.deepcopy(previous_model)
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + INCREMENTAL_RF_TREES)
+        if n_jobs is not None:
+            model.set_params(n_jobs=n_jobs)
+        model.fit(X, y)
+        model.set_params(warm_start=False)
+        return model
+
+    if model_name in LINEAR_MODELS:
+        return solve_linear(previous_model, linear_stats, scaler.mean_, scaler.scale_)
+
+    raise ValueError(f"No warm start for model: {model_name}")
+
+
+def update_linear_stats(models_uri, target_stat, train_df, feature_cols, manifest):
+    """
+    Cached sufficient statistics for a stat, extended with the seasons they don't cover yet
+
+    Returns (stats, manifest entry to publish or None if nothing changed)
+    """
+    name = f"{target_stat}_linear_stats"
+    seasons = sorted(int(s) for s in train_df["Next_Season"].unique())
+
+    stats, covered = None, []
+    if name in manifest and set(manifest[name]["trained_seasons"]) <= set(seasons):
+        stats = load_artifact(manifest[name], mmap_mode=None)
+        covered = manifest[name]["trained_seasons"]
+
+    new_rows = train_df[~train_df["Next_Season"].isin(covered)]
+    if new_rows.empty:
+        return stats, None
+
+    new_stats = sufficient_statistics(new_rows[feature_cols], new_rows[f"Target_{target_stat}"])
+    stats = add_statistics(stats, new_stats) if stats else new_stats
+    print(f"{target_stat} linear stats: {len(new_rows)} new rows folded in ({stats['rows']} total)")
+
+    entry = save_artifact(stats, models_uri, name, metadata={"trained_seasons": seasons})
+    return stats, entry
+
+
+def incremental_retrain(input_uri, target_stat, models_uri, model_names=None, n_jobs=None):
+    """
+    Warm start every model of a stat on the seasons it hasn't seen, full retrain where it can't (or the guard is due)
+
+    Returns {model_name: result}
+    """
+    model_names = model_names or list(MODELS)
+    train_df, test_df, feature_cols = load_training_split(input_uri, target_stat)
+    seasons = sorted(int(s) for s in train_df["Next_Season"].unique())
+
+    manifest = read_manifest(models_uri)
+    tuned_params = read_tuned_params(models_uri)
+    full_matrices = None
+    linear_stats = None
+    entries = []
+    guard_rows = []
+    results = {}
+
+    for model_name in model_names:
+        name = f"{target_stat}_{model_name}"
+        entry = manifest.get(name)
+        trained = entry.get("trained_seasons") if entry else None
+
+        if trained is not None and set(trained) == set(seasons):
+            print(f"{name}: up to date (seasons through {max(seasons)})")
+            continue
+
+        result = None
+        if trained is not None and set(trained) < set(seasons):
+            start = time.perf_counter()
+            previous = load_artifact(entry, mmap_mode=None)
+            preprocessor = previous.named_steps["preprocessor"]
+            matrices = prepare_matrices(train_df, test_df, feature_cols, target_stat, preprocessor=preprocessor)
+
+            if model_name in LINEAR_MODELS and linear_stats is None:
+                linear_stats, stats_entry = update_linear_stats(models_uri, target_stat, train_df, feature_cols, manifest)
+                if stats_entry:
+                    entries.append(stats_entry)
+
+            model = warm_start(model_name, previous.named_steps["model"], matrices, n_jobs=n_jobs,
+                               linear_stats=linear_stats, scaler=preprocessor.transformers_[0][1])
+            result = score_fitted(model_name, model, model.predict(matrices["X_test"]), matrices, start, n_jobs=n_jobs)
+            result["increments"] = entry.get("increments", 0) + 1
+            print(f"{name}: warm started on seasons {sorted(set(seasons) - set(trained))} "
+                  f"in {result['fit_seconds']:.1f}s, MAE {result['mae']:.4f} (increment {result['increments']})")
+
+        if result is None or result["increments"] >= FULL_RETRAIN_EVERY:
+            if full_matrices is None:
+                full_matrices = prepare_matrices(train_df, test_df, feature_cols, target_stat)
+            full = fit_and_score(model_name, full_matrices, n_jobs=n_jobs, params=tuned_params.get(name))
+            print(f"{name}: full retrain in {full['fit_seconds']:.1f}s, MAE {full['mae']:.4f}")
+
+            if result is not None:
+                gap = (result["mae"] - full["mae"]) / full["mae"] if full["mae"] else 0.0
+                guard_rows.append({
+                    "Stat": target_stat,
+                    "Model": model_name,
+                    "Increments": result["increments"],
+                    "Incremental_MAE": result["mae"],
+                    "Full_MAE": full["mae"],
+                    "Gap_Pct": gap * 100,
+                    "Incremental_Seconds": result["fit_seconds"],
+                    "Full_Seconds": full["fit_seconds"],
+                    "Checked_At": pd.Timestamp.now(tz="UTC"),
+                })
+                if gap > GUARD_TOLERANCE:
+                    print(f"{name}: warm started model was {gap:.1%} worse than a full retrain "
+                          f"(tolerance {GUARD_TOLERANCE:.0%}), consider lowering FULL_RETRAIN_EVERY")
+            result = full
+
+        metrics_uri, importance_uri = default_output_uris(models_uri, target_stat, model_name)
+        entries.append(save_model_outputs(target_stat, model_name, result, models_uri, metrics_uri, importance_uri))
+        results[model_name] = result
+
+    if entries:
+        update_manifest(models_uri, entries)
+    if guard_rows:
+        write_df_to_db(pd.DataFrame(guard_rows), GUARD_TABLE, if_exists="append")
+
+    return results
@@ -0,0 +1,112 @@
+import numpy as np
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+
+#prediction intervals, each model's is computed from things it already has or one extra cheap fit:
+#   RandomForest      quantiles over the per-tree predictions (no extra fit)
+#   XGBoost           one extra booster with a quantile objective, both bounds in a single model
+#   Linear / Ridge    split conformal: |residual| quantile on the last training season of a refit without it
+#the interval spec is saved as its own artifact next to the model ("{stat}_{model}_interval")
+
+#80% intervals (10th to 90th percentile)
+INTERVAL_ALPHA = 0.2
+QUANTILES = [INTERVAL_ALPHA / 2, 1 - INTERVAL_ALPHA / 2]
+
+
+def conformal_half_width(model, matrices, alpha=INTERVAL_ALPHA):
+    """
+    Half width of a split conformal interval, calibrated on the newest training season
+
+    The model is refit (cheap for linear models) on the earlier seasons only, so the residuals are out of sample
+    """
+    seasons = matrices["train_row_seasons"]
+    calibration = seasons == seasons.max()
+    X, y = matrices["X_train"], matrices["y_train"]
+
+    if calibration.all():
+        #only one season to train on, fall back to in-sample residuals
+        residuals = np.abs(y - model.predict(X))
+    else:
+        refit = clone(model).fit(X[~calibration], y[~calibration])
+        residuals = np.abs(y[calibration] - refit.predict(X[calibration]))
+
+    return conformal_quantile(residuals, alpha)
+
+
+def conformal_quantile(residuals, alpha=INTERVAL_ALPHA):
+    """
+    Finite sample corrected (1 - alpha) quantile of out of sample |residuals|
+    """
+    n = len(residuals)
+    level = min(1.0, np.ceil((n + 1) * (1 - alpha)) / n)
+    return float(np.quantile(residuals, level))
+
+
+def fit_interval(model_name, model, matrices, n_jobs=None):
+    """
+    Interval spec for a fitted model, saved with it and used by predict_interval
+    """
+    if model_name == "RandomForest":
+        return {"method": "trees", "quantiles": QUANTILES}
+
+    if model_name == "XGBoost":
+        #as many rounds as the point model ended up with (warm started ones have more than n_estimators)
+        quantile_model = clone(model).set_params(
+            objective="reg:quantileerror",
+            quantile_alpha=np.array(QUANTILES),
+            n_estimators=model.get_booster().num_boosted_rounds(),
+        )
+        if n_jobs is not None:
+            quantile_model.set_params(n_jobs=n_jobs)
+        quantile_model.fit(matrices["X_train"], matrices["y_train"])
+        return {
+            "method": "quantile",
+            "quantiles": QUANTILES,
+            "pipeline": Pipeline([("preprocessor", matrices["preprocessor"]), ("model", quantile_model)]),
+        }
+
+    return {"method": "conformal", "alpha": INTERVAL_ALPHA, "half_width": conformal_half_width(model, matrices)}
+
+
+def interval_bounds(model, interval, X_scaled, predictions, per_tree=None):
+    """
+    (lower, upper) arrays for rows that are already standardized (the training matrices)
+
+    per_tree: rows x trees predictions if the caller already has them (compiled pipelines)
+    Bounds are widened to contain the point prediction, quantile models can otherwise cross it
+    """
+    predictions = np.asarray(predictions, dtype=np.float64)
+
+    if interval["method"] == "trees":
+        if per_tree is None:
+            per_tree = np.column_stack([tree.predict(X_scaled) for tree in model.estimators_])
+        lower, upper = np.quantile(per_tree, interval["quantiles"], axis=1)
+    elif interval["method"] == "quantile":
+        bounds = interval["pipeline"].named_steps["model"].predict(X_scaled)
+        bounds = np.sort(np.asarray(bounds).reshape(len(predictions), -1), axis=1)
+        lower, upper = bounds[:, 0], bounds[:, -1]
+    else:
+        lower = predictions - interval["half_width"]
+        upper = predictions + interval["half_width"]
+
+    return np.minimum(lower, predictions), np.maximum(upper, predictions)
+
+
+def predict_interval(pipeline, interval, X, predictions):
+    """
+    (lower, upper) arrays for the raw feature rows of X, pipeline is the saved (or compiled) one
+    """
+    #a fixed half width needs no features (and works for models that aren't a (preprocessor, model) pipeline)
+    if interval["method"] == "conformal":
+        return interval_bounds(None, interval, None, predictions)
+
+    #compiled pipelines already hold every tree's node arrays
+    if hasattr(pipeline, "compiled"):
+        from evalution.compiled_trees import leaf_values
+        X_scaled = pipeline.transform(X)
+        per_tree = leaf_values(pipeline.compiled, X_scaled) if interval["method"] == "trees" else None
+        return interval_bounds(pipeline.native.named_steps["model"], interval, X_scaled, predictions, per_tree)
+
+    X_scaled = np.asarray(pipeline.named_steps["preprocessor"].transform(X), dtype=np.float32)
+    return interval_bounds(pipeline.named_steps["model"], interval, X_scaled, predictions)
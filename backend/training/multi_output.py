@@ -0,0 +1,171 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer, TransformedTargetRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from storage.io import load_dataframe, save_dataframe
+from storage.db import write_df_to_db
+from storage.model_io import save_artifact, update_manifest
+from training.train_models import MODELS, build_model, feature_columns, fit_predict, prepare_matrices
+
+
+#multi-output mode: one model per algorithm predicts every target stat at once from the shared feature store
+#
+#   LinearRegression / Ridge   sklearn fits all target columns against one factorization of X
+#   RandomForest               native multi-output trees (one split search serves every target)
+#   XGBoost                    multi-target trees (multi_strategy="multi_output_tree", needs hist)
+#targets are standardized first, otherwise HR (tens) would drown out AVG (tenths) in the shared split criterion
+
+MULTI_OUTPUT_STATS = ["HR", "AVG", "OPS", "wRC_PLUS"]
+TEST_SEASON = 2025
+COMPARISON_TABLE = "multi_output_comparison"
+
+
+def shared_feature_columns(stats):
+    """
+    Union of every stat's model inputs, in order
+    """
+    columns = []
+    for stat in stats:
+        for column in feature_columns(stat):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def prepare_multi_matrices(df, stats, test_season=TEST_SEASON):
+    """
+    Standardized float32 matrices with one target column per stat
+    """
+    train_df = df[df["Next_Season"] != test_season]
+    test_df = df[df["Next_Season"] == test_season]
+    feature_cols = shared_feature_columns(stats)
+    target_cols = [f"Target_{stat}" for stat in stats]
+
+    preprocessor = ColumnTransformer([
+        ('num', StandardScaler(), feature_cols)
+    ])
+    preprocessor.fit(train_df[feature_cols])
+
+    return {
+        "stats": list(stats),
+        "feature_cols": feature_cols,
+        "preprocessor": preprocessor,
+        "X_train": np.ascontiguousarray(preprocessor.transform(train_df[feature_cols]), dtype=np.float32),
+        "Y_train": train_df[target_cols].to_numpy(dtype=np.float32),
+        "X_test": np.ascontiguousarray(preprocessor.transform(test_df[feature_cols]), dtype=np.float32),
+        "Y_test": test_df[target_cols].to_numpy(dtype=np.float32),
+    }
+
+
+def build_multi_output_model(model_name, n_jobs=None):
+    model = build_model(model_name, n_jobs=n_jobs)
+    if model_name == "XGBoost":
+        model.set_params(tree_method="hist", multi_strategy="multi_output_tree")
+    return TransformedTargetRegressor(regressor=model, transformer=StandardScaler())
+
+
+def fit_multi_output(model_name, matrices, n_jobs=None):
+    """
+    Fit one joint model, returns (model, predictions [rows x stats], fit seconds)
+    """
+    start = time.perf_counter()
+    model = build_multi_output_model(model_name, n_jobs=n_jobs)
+    model.fit(matrices["X_train"], matrices["Y_train"])
+    fit_seconds = time.perf_counter() - start
+    return model, model.predict(matrices["X_test"]), fit_seconds
+
+
+def score_columns(stats, Y_true, Y_pred):
+    scores = {}
+    for i, stat in enumerate(stats):
+        scores[f"{stat}_MAE"] = mean_absolute_error(Y_true[:, i], Y_pred[:, i])
+        scores[f"{stat}_R2"] = r2_score(Y_true[:, i], Y_pred[:, i])
+    return scores
+
+
+def run_multi_output_training(features_uri, models_uri, stats=MULTI_OUTPUT_STATS, model_names=None, n_jobs=None):
+    """
+    Train the joint models on the shared features and publish them as "MULTI_{model}" artifacts
+
+    Returns {model_name: scores per stat}
+    """
+    model_names = model_names or list(MODELS)
+    matrices = prepare_multi_matrices(load_dataframe(features_uri), stats)
+
+    entries = []
+    results = {}
+    for model_name in model_names:
+        model, predictions, fit_seconds = fit_multi_output(model_name, matrices, n_jobs=n_jobs)
+        scores = score_columns(stats, matrices["Y_test"], predictions)
+        print(f"MULTI {model_name} fit in {fit_seconds:.1f}s: "
+              + ", ".join(f"{stat} MAE {scores[f'{stat}_MAE']:.4f}" for stat in stats))
+
+        pipeline = Pipeline([
+            ('preprocessor', matrices["preprocessor"]),
+            ('model', model)
+        ])
+        entries.append(save_artifact(pipeline, models_uri, f"MULTI_{model_name}", metadata={"stats": list(stats)}))
+        save_dataframe(pd.DataFrame([{**scores, "fit_seconds": fit_seconds}]),
+                       f"{models_uri}/metrics_MULTI_{model_name}.json")
+        results[model_name] = scores
+
+    update_manifest(models_uri, entries)
+    return results
+
+
+def compare_multi_output(features_uri, stats=MULTI_OUTPUT_STATS, model_names=None, n_jobs=None):
+    """
+    Fit time and test accuracy of the joint models against one model per stat, on the same rows
+
+    The per stat path uses each stat's own inputs and scaler exactly like training.train_models
+    Returns one row per (model, mode), also written to the comparison table
+    """
+    model_names = model_names or list(MODELS)
+    df = load_dataframe(features_uri)
+    train_df = df[df["Next_Season"] != TEST_SEASON]
+    test_df = df[df["Next_Season"] == TEST_SEASON]
+
+    start = time.perf_counter()
+    multi_matrices = prepare_multi_matrices(df, stats)
+    multi_prep_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stat_matrices = {stat: prepare_matrices(train_df, test_df, feature_columns(stat), stat) for stat in stats}
+    per_stat_prep_seconds = time.perf_counter() - start
+
+    rows = []
+    for model_name in model_names:
+        per_stat_seconds = 0.0
+        per_stat_predictions = []
+        for stat in stats:
+            fit_start = time.perf_counter()
+            _, predictions = fit_predict(model_name, stat_matrices[stat], n_jobs=n_jobs)
+            per_stat_seconds += time.perf_counter() - fit_start
+            per_stat_predictions.append(predictions)
+
+        rows.append({
+            "Model": model_name,
+            "Mode": "per_stat",
+            "Prep_Seconds": per_stat_prep_seconds,
+            "Fit_Seconds": per_stat_seconds,
+            **score_columns(stats, multi_matrices["Y_test"], np.column_stack(per_stat_predictions)),
+        })
+
+        _, predictions, fit_seconds = fit_multi_output(model_name, multi_matrices, n_jobs=n_jobs)
+        rows.append({
+            "Model": model_name,
+            "Mode": "multi_output",
+            "Prep_Seconds": multi_prep_seconds,
+            "Fit_Seconds": fit_seconds,
+            **score_columns(stats, multi_matrices["Y_test"], predictions),
+        })
+
+    comparison = pd.DataFrame(rows)
+    write_df_to_db(comparison, COMPARISON_TABLE)
+    print(comparison.to_string(index=False))
+    return comparison
@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import joblib
+from threadpoolctl import threadpool_limits
+
+from evalution.evaluate_models import score_predictions, write_eval_outputs
+from pipeline.profiling import add_records, drain, profile
+from storage.model_io import read_tuned_params, update_manifest
+from training.train_models import (
+    MODELS, fit_and_score, load_training_split, prepare_matrices, upload_model_outputs, write_model_tables
+)
+
+
+#models that parallelize internally (n_jobs), everything else is single threaded
+THREADED_MODELS = ["RandomForest", "XGBoost"]
+
+#rough relative fit cost, heaviest jobs are submitted first so they don't end up running alone at the end
+MODEL_COST = {"XGBoost": 4, "RandomForest": 3, "Ridge": 1, "LinearRegression": 1}
+
+#background threads uploading artifacts while the remaining fits run
+UPLOAD_WORKERS = 4
+
+
+def plan_core_budget(n_jobs, n_cores=None, max_workers=None):
+    """
+    Split the cores between outer (process) and inner (n_jobs) parallelism
+
+    Processes come first since the 16 fits are independent; leftover cores become
+    threads for the models that can use them
+    Returns (workers, inner_threads)
+    """
+    n_cores = n_cores or os.cpu_count() or 1
+    workers = min(n_jobs, n_cores, max_workers or n_cores)
+    workers = max(1, workers)
+    inner_threads = max(1, n_cores // workers)
+    return workers, inner_threads
+
+
+def default_output_uris(models_uri, stat, model_name):
+    """
+    Metrics / importance uris Run.py has always used
+    """
+    return (
+        f"{models_uri}/metrics_{stat}_{model_name}.json",
+        f"{models_uri}/importance_{stat}_{model_name}.parquet",
+    )
+
+
+#matrices already loaded in this worker, keyed by file path
+_worker_matrices = {}
+
+
+def load_shared_matrices(path):
+    """
+    Matrices dumped by the parent process, loaded once per worker
+    """
+    #memory mapped, so every worker reading a stat's matrices shares the same pages
+    if path not in _worker_matrices:
+        _worker_matrices[path] = joblib.load(path, mmap_mode="r")
+    return _worker_matrices[path]
+
+
+def _run_job(job):
+    """
+    Worker entry point: fit one (stat, model) pair with its thread budget
+    """
+    threads = job["n_threads"]
+    n_jobs = threads if job["model_name"] in THREADED_MODELS else None
+
+    matrices = load_shared_matrices(job["matrices_path"])
+    with profile("train_model", rows_in=len(matrices["y_train"]), stat=job["stat"], model=job["model_name"]) as record:
+        #keep BLAS/OpenMP inside the budget too, otherwise every worker grabs every core
+        with threadpool_limits(limits=threads):
+            result = fit_and_score(job["model_name"], matrices, n_jobs=n_jobs, params=job.get("params"))
+        record["rows_out"] = len(result["predictions"])
+
+    result["stat"] = job["stat"]
+    result["model_name"] = job["model_name"]
+    #this worker's profile records go back with the result (the parent adds them to the run report)
+    result["profile"] = drain()
+    return result
+
+
+def run_training_jobs(feature_uris, models_uri, model_names=None, max_workers=None, n_cores=None, tuned_params=None,
+                      fused_eval=True):
+    """
+    Train every (stat, model) pair across a process pool and publish the results
+
+    feature_uris: {stat: features parquet uri}
+    tuned_params: {"{stat}_{model}": params}, defaults to the winners published by training.tuning
+    fused_eval: also write the predictions / metrics tables from the in-memory results (what run_eval writes),
+        so the models don't have to be downloaded and re-scored afterwards
+    Returns {stat: {model_name: result}} plus prints the wall-clock speedup over an estimated serial run
+    """
+    model_names = model_names or list(MODELS)
+    start = time.perf_counter()
+    if tuned_params is None:
+        tuned_params = read_tuned_params(models_uri)
+
+    #standardize each stat once and hand the workers a file to memory map instead of a copy per job
+    matrices_dir = tempfile.mkdtemp(prefix="inningai_matrices_")
+    jobs = []
+    test_frames = {}
+    for stat, input_uri in feature_uris.items():
+        train_df, test_df, feature_cols = load_training_split(input_uri, stat)
+        test_frames[stat] = test_df
+        matrices_path = os.path.join(matrices_dir, f"{stat}.joblib")
+        joblib.dump(prepare_matrices(train_df, test_df, feature_cols, stat), matrices_path)
+
+        for model_name in model_names:
+            jobs.append({
+                "stat": stat,
+                "model_name": model_name,
+                "matrices_path": matrices_path,
+                "params": tuned_params.get(f"{stat}_{model_name}"),
+            })
+
+    workers, inner_threads = plan_core_budget(len(jobs), n_cores=n_cores, max_workers=max_workers)
+    for job in jobs:
+        job["n_threads"] = inner_threads
+    jobs.sort(key=lambda job: MODEL_COST.get(job["model_name"], 1), reverse=True)
+
+    print(f"Training {len(jobs)} models with {workers} processes x {inner_threads} threads")
+
+    results = {stat: {} for stat in feature_uris}
+    fit_start = time.perf_counter()
+
+    #each result's tables are written here as soon as it arrives (one db writer), its uploads go to a
+    #thread pool so they overlap the fits still running; the manifest is only published once every upload is done
+    uploader = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+    uploads = []
+
+    #a failed fit or upload still shuts the uploader down and removes the shared matrices
+    try:
+        #spawn rather than fork, forking after xgboost/openmp has started threads can deadlock
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_run_job, job) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                add_records(result.pop("profile", []))
+                stat, model_name = result["stat"], result["model_name"]
+                results[stat][model_name] = result
+                print(f"{stat} {model_name} done in {result['total_seconds']:.1f}s "
+                      f"(fit {result['fit_seconds']:.1f}s). "
+                      f"MAE: {result['mae']:.4f}, R²: {result['r2']:.4f}")
+
+                metrics_uri, importance_uri = default_output_uris(models_uri, stat, model_name)
+                uploads.append(uploader.submit(
+                    upload_model_outputs, stat, model_name, result, models_uri, metrics_uri, importance_uri
+                ))
+                write_model_tables(stat, model_name, result)
+                if fused_eval:
+                    with profile("eval", rows_in=len(test_frames[stat]), stat=stat, model=model_name) as record:
+                        metrics, result_df = score_predictions(test_frames[stat], stat, result["predictions"],
+                                                               result["lower"], result["upper"])
+                        write_eval_outputs(stat, model_name, metrics, result_df)
+                        record["rows_out"] = len(result_df)
+
+        fit_wall = time.perf_counter() - fit_start
+        shutil.rmtree(matrices_dir, ignore_errors=True)
+
+        #result() re-raises a failed upload before anything is published
+        upload_start = time.perf_counter()
+        with profile("upload_wait"):
+            artifact_entries = [upload.result() for upload in uploads]
+            update_manifest(models_uri, artifact_entries)
+        print(f"Uploads finished {time.perf_counter() - upload_start:.1f}s after the last fit")
+    finally:
+        uploader.shutdown(cancel_futures=True)
+        shutil.rmtree(matrices_dir, ignore_errors=True)
+
+    #the per-fit times were measured with inner_threads threads each while other fits ran, so their sum only
+    #estimates a serial run (bench.suite times real serial fits)
+    serial_estimate = sum(r["total_seconds"] for stat_results in results.values() for r in stat_results.values())
+    speedup = serial_estimate / fit_wall if fit_wall > 0 else 0.0
+    print(f"\nFits: {fit_wall:.1f}s wall vs ~{serial_estimate:.1f}s estimated serial "
+          f"(sum of concurrent per-fit times, ~{speedup:.2f}x), {time.perf_counter() - start:.1f}s total including io")
+
+    return results
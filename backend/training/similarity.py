@@ -0,0 +1,107 @@
+import time
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from preprocessing.build_features import RAW_COLUMN_NAMES, raw_columns_for, shared_input_metrics
+from storage.io import load_dataframe
+from storage.model_io import load_artifact, read_manifest, save_artifact, update_manifest
+
+
+#"similar players" index: every player-season as a point in standardized feature space
+#
+#the columns are the union of every target stat's input metrics (the shared feature store's Current_ columns),
+#standardized with the means / scales of the published models' scalers so a distance means the same thing
+#the models see; metrics no published scaler covers (a stat's own previous value) are standardized on the data
+#a ball tree over those rows is published as one artifact next to the models, after every training publish,
+#and the api keeps it in memory and reloads it when the manifest points at a new version
+
+SIMILARITY_ARTIFACT = "Similarity_Index"
+LEAF_SIZE = 40
+
+
+def season_rows(dataset, inputs):
+    """
+    One row per player-season with the Current_{metric} columns (no pairs, every season counts)
+    """
+    seasons = dataset[raw_columns_for(inputs)].drop_duplicates(["IDfg", "Season"], keep="last")
+    rows = seasons[["IDfg", "Name", "Season", "Team"]].copy()
+    for metric in inputs:
+        rows[f"Current_{metric}"] = seasons[RAW_COLUMN_NAMES.get(metric, metric)]
+    return rows.reset_index(drop=True)
+
+
+def published_scaling(manifest, stats):
+    """
+    {column: (mean, scale)} from the scaler in each stat's published pipeline
+
+    Every model of a stat shares the preprocessor prepare_matrices fit, so one pipeline per stat is enough
+    """
+    scaling = {}
+    for stat in stats:
+        entry = manifest.get(f"{stat}_LinearRegression")
+        if entry is None:
+            continue
+        scaler = load_artifact(entry).named_steps["preprocessor"].named_transformers_["num"]
+        for column, mean, scale in zip(scaler.feature_names_in_, scaler.mean_, scaler.scale_):
+            scaling.setdefault(column, (float(mean), float(scale)))
+    return scaling
+
+
+def build_similarity_index(dataset, stats, scaling=None):
+    """
+    Ball tree over the standardized player-season matrix
+
+    Returns the artifact: {"tree", "features", "mean", "scale", "ids", "seasons", "names", "teams", "values"}
+    values are the unscaled metrics (returned with the neighbors); missing metrics sit at the mean
+    """
+    scaling = scaling or {}
+    rows = season_rows(dataset, shared_input_metrics(stats))
+    features = [c for c in rows.columns if c.startswith("Current_")]
+
+    values = rows[features].to_numpy(dtype=np.float64)
+    mean = np.array([scaling.get(c, (np.nanmean(values[:, i]), 0.0))[0] for i, c in enumerate(features)])
+    scale = np.array([scaling.get(c, (0.0, np.nanstd(values[:, i])))[1] for i, c in enumerate(features)])
+    scale[~(scale > 0)] = 1.0
+
+    X = np.nan_to_num((values - mean) / scale, nan=0.0)
+    return {
+        "tree": BallTree(X, leaf_size=LEAF_SIZE),
+        "features": features,
+        "mean": mean.astype(np.float32),
+        "scale": scale.astype(np.float32),
+        "ids": rows["IDfg"].to_numpy(dtype=np.int32),
+        "seasons": rows["Season"].to_numpy(dtype=np.int16),
+        "names": rows["Name"].astype(str).to_numpy(dtype=object),
+        "teams": rows["Team"].astype(str).to_numpy(dtype=object),
+        "values": values.astype(np.float32),
+    }
+
+
+def publish_similarity_index(dataset, models_uri, stats):
+    """
+    Build the index with the published scalers, save it and point the manifest at it
+    """
+    start = time.perf_counter()
+    manifest = read_manifest(models_uri)
+    scaling = published_scaling(manifest, stats)
+    index = build_similarity_index(dataset, stats, scaling)
+
+    entry = save_artifact(index, models_uri, SIMILARITY_ARTIFACT, metadata={
+        "rows": len(index["ids"]),
+        "features": index["features"],
+        "published_scalers": sorted(c for c in index["features"] if c in scaling),
+    })
+    update_manifest(models_uri, [entry])
+    print(f"Similarity index: {len(index['ids'])} player-seasons x {len(index['features'])} features "
+          f"({len(scaling)} scaled like the models) in {time.perf_counter() - start:.2f}s")
+    return entry
+
+
+def run_similarity_index(raw_uri, models_uri, stats):
+    """
+    Rebuild the similar players index from the raw batting data (runs after every publish)
+    """
+    print(f"Loading raw data from {raw_uri}...")
+    dataset = load_dataframe(raw_uri, columns=raw_columns_for(shared_input_metrics(stats)))
+    return publish_similarity_index(dataset, models_uri, stats)
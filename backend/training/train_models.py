@@ -1,8 +1,10 @@
 
+import time
+
 import pandas as pd
 import numpy as np
-import shap
 from sklearn import metrics
+from sklearn.base import clone
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
@@ -14,11 +16,15 @@ import joblib #save models
 
 
 from storage.io import load_dataframe, save_dataframe
-from storage.model_io import upload_model
+from storage.model_io import save_artifact, update_manifest
 from storage.db import write_df_to_db
+from pipeline.profiling import profile
 from preprocessing.build_features import run_build_features, get_input_metrics
+from training.importance import compute_importance, shap_values
+from training.intervals import fit_interval, interval_bounds
 
 #our models we will train and their args
+#these are templates, build_model clones them so every fit gets its own instance
 MODELS = {
     "LinearRegression": LinearRegression(),
     "Ridge": Ridge(alpha=10.0),
@@ -27,6 +33,11 @@ MODELS = {
     #can add more later
 }
 
+#stacked blend of the models above, fit by training.ensemble on their out-of-fold predictions
+#(no template, it is never fit like the others) - every published model name is MODELS + this one
+ENSEMBLE_MODEL = "Ensemble"
+PUBLISHED_MODELS = list(MODELS) + [ENSEMBLE_MODEL]
+
 #holds park factors for last year in range (year that we are predicting next year from)
 PARK_FACTORS_2024 = {
     'ARI': 101, 'ATL': 100, 'BAL': 99, 'BOS': 107, 'CHC': 97,
@@ -87,7 +98,7 @@ def train_model(input_uri, target_stat, chosen_model, model_uri, metrics_uri):
     pipeline = Pipeline(
         steps=[
             ('preprocessor', preprocessor),
-            ('model', MODELS[chosen_model])
+            ('model', build_model(chosen_model))
         ]
     )
 
@@ -117,111 +128,247 @@ def train_model(input_uri, target_stat, chosen_model, model_uri, metrics_uri):
     return mae, r2
 
 
-def train_all_models(input_uri, target_stat, model_uris, metrics_uris, importance_uris):
+def load_training_split(input_uri, target_stat):
     """
-    Train all models, save predictions, metrics, and feature importance to S3.
+    Load a stat's features and split off the 2025 season for testing
     """
-
     df = load_dataframe(input_uri)
 
     #split 2025 season (testing data)
     train_df = df[df["Next_Season"] != 2025].copy()
     test_df = df[df["Next_Season"] == 2025].copy()
 
+    return train_df, test_df, feature_columns(target_stat)
+
+
+def feature_columns(target_stat):
+    """
+    Model inputs for a stat: its registry metrics minus the stat itself
+    """
     all_metrics = get_input_metrics(target_stat)
     input_metrics = [m for m in all_metrics if m != target_stat]
-    feature_cols = [f"Current_{m}" for m in input_metrics]
+    return [f"Current_{m}" for m in input_metrics]
 
-    results = {}
 
-    for model_name, model in MODELS.items():
-        print(f"Training model: {model_name}")
+def build_model(model_name, n_jobs=None, params=None):
+    """
+    Fresh copy of a registry model, so jobs never share (and refit) the same instance
 
-        X_train, y_train = train_df[feature_cols], train_df[f"Target_{target_stat}"]
-        X_test, y_test = test_df[feature_cols], test_df[f"Target_{target_stat}"]
+    n_jobs: threads for models that can use them (RandomForest, XGBoost)
+    params: overrides for the registry hyperparameters (e.g. tuned ones from training.tuning)
+    """
+    model = clone(MODELS[model_name])
+    if params:
+        model.set_params(**params)
+    if n_jobs is not None and "n_jobs" in model.get_params():
+        model.set_params(n_jobs=n_jobs)
+    return model
 
+
+def prepare_matrices(train_df, test_df, feature_cols, target_stat, preprocessor=None):
+    """
+    Standardize a (stat, split) exactly once
+
+    Every model (and the explainers) trains on the same contiguous float32 matrices;
+    the fitted preprocessor is kept so it can be embedded in each saved pipeline for inference
+    preprocessor: an already fitted one to reuse as is (incremental retrains keep the previous scaler)
+    """
+    if preprocessor is None:
         preprocessor = ColumnTransformer([
             ('num', StandardScaler(), feature_cols)
         ])
+        preprocessor.fit(train_df[feature_cols])
+
+    X_train = np.ascontiguousarray(preprocessor.transform(train_df[feature_cols]), dtype=np.float32)
+    X_test = np.ascontiguousarray(preprocessor.transform(test_df[feature_cols]), dtype=np.float32)
+
+    return {
+        "feature_cols": feature_cols,
+        "preprocessor": preprocessor,
+        "X_train": X_train,
+        "y_train": train_df[f"Target_{target_stat}"].to_numpy(dtype=np.float32),
+        "X_test": X_test,
+        "y_test": test_df[f"Target_{target_stat}"].to_numpy(dtype=np.float32),
+        "test_ids": test_df["IDfg"].to_numpy(dtype=np.int32),
+        "train_row_seasons": train_df["Next_Season"].to_numpy(dtype=np.int16),
+        "train_seasons": sorted(int(season) for season in train_df["Next_Season"].unique()),
+    }
 
-        pipeline = Pipeline([
-            ('preprocessor', preprocessor),
-            ('model', model)
-        ])
 
-        # Train the model
-        pipeline.fit(X_train, y_train)
-        predictions = pipeline.predict(X_test)
-
-        # Calculate metrics
-        mae = mean_absolute_error(y_test, predictions)
-        r2 = r2_score(y_test, predictions)
-
-        feature_names = feature_cols
-        if model_name in ["RandomForest", "XGBoost"]:
-            explainer = shap.Explainer(pipeline.named_steps["model"])
-            x_transformed = pipeline.named_steps["preprocessor"].transform(X_train)
-            shap_values = explainer(x_transformed)
-            shap_importance = np.abs(shap_values.values).mean(axis=0)
-
-            shap_direction = np.array([
-                np.corrcoef(X_train.iloc[:, i].values, shap_values.values[:, i])[0, 1]
-                if X_train.iloc[:, i].std() > 0 else 0.0
-                for i in range(len(feature_cols))
-            ])
-            shap_direction = np.nan_to_num(shap_direction, nan=0.0)
-
-            importance_df = pd.DataFrame({
-                "Feature": feature_names,
-                "Importance": shap_importance,
-                "Direction": shap_direction
-            }).sort_values(by="Importance", ascending=False)
-
-            importance_df["Effect"] = importance_df["Direction"].apply(
-                lambda x: "Increases prediction" if x > 0 else "Decreases prediction")
-
-        elif model_name in ["LinearRegression", "Ridge"]:
-            coefficients = pipeline.named_steps['model'].coef_
-            importance_df = pd.DataFrame({
-                "Feature": feature_names,
-                "Coefficient": coefficients
-            }).sort_values("Coefficient", key=abs, ascending=False)
-
-        # Save model artifact
-        local_model_path = f"{model_name.replace(' ', '_')}.pkl"
-        joblib.dump(pipeline, local_model_path)
-        # save_dataframe(pd.DataFrame({"dummy": [0]}), model_uris[model_name])  # S3 placeholder
-        local_model_path = f"{model_name}.pkl"
-        joblib.dump(pipeline, local_model_path)
-
-        upload_model(local_model_path, model_uris[model_name])
-
-        # Save metrics
-        metrics = {"mae": mae, "r2": r2}
-       
-        local_metrics_path = f"{model_name}_metrics.json"
-        pd.DataFrame([metrics]).to_json(local_metrics_path, orient="records", lines=True)
-
-        save_dataframe(
-            pd.DataFrame([metrics]), 
-            metrics_uris[model_name]
-        )
-    
+def build_explanations(model_name, model, matrices, predictions):
+    """
+    Player id x feature SHAP matrix (float32) for the test season rows
 
-        # Save feature importance to S3 and database
-        save_dataframe(importance_df, importance_uris[model_name])
-        importance_table = f"{target_stat.lower()}_{model_name.lower()}_importance"
-        write_df_to_db(importance_df, importance_table)
+    Base_Value is what's left of the prediction after the feature contributions
+    (the model's expected value), so Base_Value + contributions = Predicted
+    """
+    values = shap_values(model_name, model, matrices["X_test"])
 
-        results[model_name] = {
-            "mae": mae,
-            "r2": r2,
-            "predictions": predictions,
-            "importance": importance_df
-        }
+    explanations = pd.DataFrame(values, columns=matrices["feature_cols"]).astype(np.float32)
+    explanations.insert(0, "IDfg", matrices["test_ids"])
+    explanations["Predicted"] = np.asarray(predictions, dtype=np.float32)
+    explanations["Base_Value"] = (explanations["Predicted"] - values.sum(axis=1)).astype(np.float32)
+    return explanations
 
-        print(f"{model_name} done. MAE: {mae:.4f}, R²: {r2:.4f}")
 
-    return results
+def explanations_uri(models_uri, target_stat, model_name):
+    return f"{models_uri}/explain/{target_stat}_{model_name}.parquet"
+
+
+def fit_predict(model_name, matrices, n_jobs=None, params=None):
+    """
+    Fit a fresh model on the train matrix and predict the test matrix
+
+    Returns (model, predictions)
+    """
+    model = build_model(model_name, n_jobs=n_jobs, params=params)
+    model.fit(matrices["X_train"], matrices["y_train"])
+    return model, model.predict(matrices["X_test"])
+
+
+def fit_and_score(model_name, matrices, n_jobs=None, params=None):
+    """
+    Fit one model on a stat's shared matrices, score it on the test season and compute its feature importance
+    """
+    start = time.perf_counter()
+
+    # Train the model
+    with profile("fit", rows_in=len(matrices["y_train"]), model=model_name) as record:
+        model, predictions = fit_predict(model_name, matrices, n_jobs=n_jobs, params=params)
+        record["rows_out"] = len(predictions)
+    return score_fitted(model_name, model, predictions, matrices, start, n_jobs=n_jobs)
+
+
+def score_fitted(model_name, model, predictions, matrices, start, n_jobs=None):
+    """
+    Metrics, importance, explanations, interval and the saved pipeline for a model that was just fit
 
+    start: perf_counter when the fit began
+    """
+    # Calculate metrics
+    mae = mean_absolute_error(matrices["y_test"], predictions)
+    r2 = r2_score(matrices["y_test"], predictions)
+
+    fit_seconds = time.perf_counter() - start
+    with profile("shap", rows_in=len(matrices["X_train"]) + len(matrices["X_test"]), model=model_name) as record:
+        importance_df, importance_timings = compute_importance(model_name, model, matrices["X_train"], matrices["feature_cols"])
+
+        #per-player explanations for the prediction season, served by /player/{id}/explain
+        explain_start = time.perf_counter()
+        explanations = build_explanations(model_name, model, matrices, predictions)
+        importance_timings["player_explain"] = time.perf_counter() - explain_start
+        record["rows_out"] = len(explanations)
+
+    #what run_eval needs for the Lower/Upper columns
+    with profile("interval", rows_in=len(matrices["X_test"]), model=model_name) as record:
+        interval_start = time.perf_counter()
+        interval = fit_interval(model_name, model, matrices, n_jobs=n_jobs)
+        lower, upper = interval_bounds(model, interval, matrices["X_test"], predictions)
+        importance_timings["interval"] = time.perf_counter() - interval_start
+        record["rows_out"] = len(lower)
+
+    #the already fitted scaler goes in front so the saved pipeline still takes raw features
+    pipeline = Pipeline([
+        ('preprocessor', matrices["preprocessor"]),
+        ('model', model)
+    ])
+
+    return {
+        "pipeline": pipeline,
+        "mae": mae,
+        "r2": r2,
+        "predictions": predictions,
+        "lower": lower,
+        "upper": upper,
+        "importance": importance_df,
+        "explanations": explanations,
+        "interval": interval,
+        "importance_timings": importance_timings,
+        "fit_seconds": fit_seconds,
+        "total_seconds": time.perf_counter() - start,
+        "train_seasons": list(matrices["train_seasons"]),
+        "increments": 0,
+    }
+
+
+def save_model_outputs(target_stat, model_name, result, models_uri, metrics_uri, importance_uri):
+    """
+    Save a trained model's artifact, metrics and importance (S3 + database)
+
+    Returns the artifact's manifest entry
+    """
+    entry = upload_model_outputs(target_stat, model_name, result, models_uri, metrics_uri, importance_uri)
+    write_model_tables(target_stat, model_name, result)
+    return entry
+
+
+def upload_model_outputs(target_stat, model_name, result, models_uri, metrics_uri, importance_uri):
+    """
+    Storage half of save_model_outputs: artifacts, metrics json, importance and explanations parquet
+
+    Touches no database and no local files, so it can run on a background thread
+    Returns the artifact's manifest entry
+    """
+    # Save model artifact (content hashed, skipped if this exact model was already uploaded)
+    # the seasons it saw and its warm start count let training.incremental pick up from it,
+    # its prediction interval spec is a separate artifact referenced from the entry
+    interval_entry = save_artifact(result["interval"], models_uri, f"{target_stat}_{model_name}_interval")
+    entry = save_artifact(result["pipeline"], models_uri, f"{target_stat}_{model_name}", metadata={
+        "trained_seasons": result["train_seasons"],
+        "increments": result["increments"],
+        "interval": interval_entry,
+    })
+
+    # Save metrics
+    save_dataframe(
+        pd.DataFrame([{"mae": result["mae"], "r2": result["r2"]}]), 
+        metrics_uri
+    )
+
+    # Save feature importance to S3
+    save_dataframe(result["importance"], importance_uri)
+
+    # Save per-player explanations (columnar, one row per player)
+    save_dataframe(result["explanations"], explanations_uri(models_uri, target_stat, model_name))
+
+    return entry
+
+
+def write_model_tables(target_stat, model_name, result):
+    """
+    Database half of save_model_outputs
+    """
+    importance_table = f"{target_stat.lower()}_{model_name.lower()}_importance"
+    write_df_to_db(result["importance"], importance_table)
+
+
+def train_all_models(input_uri, target_stat, models_uri, metrics_uris, importance_uris):
+    """
+    Train all models, save predictions, metrics, and feature importance to S3.
+
+    Pipelines are saved as versioned artifacts "{target_stat}_{model_name}" under models_uri
+    and published to its manifest once every model for the stat is done.
+    (training.scheduler runs the same steps for every stat in parallel)
+    """
+
+    train_df, test_df, feature_cols = load_training_split(input_uri, target_stat)
+    matrices = prepare_matrices(train_df, test_df, feature_cols, target_stat)
 
+    results = {}
+    artifact_entries = []
+
+    for model_name in MODELS:
+        print(f"Training model: {model_name}")
+
+        result = fit_and_score(model_name, matrices)
+        artifact_entries.append(save_model_outputs(
+            target_stat, model_name, result, models_uri, metrics_uris[model_name], importance_uris[model_name]
+        ))
+
+        results[model_name] = result
+
+        print(f"{model_name} done. MAE: {result['mae']:.4f}, R²: {result['r2']:.4f}")
+
+    update_manifest(models_uri, artifact_entries)
+
+    return results
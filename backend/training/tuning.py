@@ -0,0 +1,263 @@
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+from threadpoolctl import threadpool_limits
+
+from evalution.backtest import season_folds
+from storage.model_io import publish_tuned_params, read_json, write_json
+from training.scheduler import THREADED_MODELS, load_shared_matrices, plan_core_budget
+from training.train_models import build_model, fit_predict, load_training_split, prepare_matrices
+
+
+#hyperparameter search per (stat, model) with successive halving over season folds
+#
+#every config is first scored on the most recent validation season only, the best 1/ETA
+#move on to ETA times as many seasons, and so on until one config is left or the folds run out
+#the 2025 test season is never used here, and a validation season is only ever scored: xgboost picks its
+#round count on the fold's newest training season, then refits on the whole fold with that count
+
+SEARCH_SPACES = {
+    "Ridge": {"alpha": [0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0, 300.0]},
+    "RandomForest": {
+        "n_estimators": [200, 300, 500],
+        "max_depth": [6, 8, 10, 14, None],
+        "min_samples_leaf": [1, 3, 5, 10],
+        "max_features": [1.0, 0.5, "sqrt"],
+    },
+    "XGBoost": {
+        "learning_rate": [0.02, 0.05, 0.1],
+        "max_depth": [3, 4, 6, 8],
+        "min_child_weight": [1, 3, 5],
+        "subsample": [0.7, 0.8, 1.0],
+        "colsample_bytree": [0.6, 0.8, 1.0],
+        "reg_lambda": [0.1, 1.0, 10.0],
+    },
+    #LinearRegression has nothing to tune
+}
+
+#xgboost trains with the histogram method and a high round cap, early stopping on the fold's newest
+#training season picks the count
+XGB_FIXED_PARAMS = {"tree_method": "hist", "n_estimators": 2000}
+EARLY_STOPPING_ROUNDS = 50
+
+N_CONFIGS = 27
+ETA = 3
+MAX_FOLDS = 4
+RANDOM_SEED = 42
+
+
+def _config_key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def matrices_fingerprint(matrices):
+    """
+    Hash of a fold's standardized matrices, changes with the data, the features or the split
+    """
+    digest = hashlib.sha256(json.dumps(list(matrices["feature_cols"])).encode())
+    for key in ["X_train", "y_train", "X_test", "y_test", "train_row_seasons"]:
+        digest.update(np.ascontiguousarray(matrices[key]).tobytes())
+    return digest.hexdigest()
+
+
+def ledger_fingerprint(model_name, fold_paths, fold_fingerprints):
+    """
+    What a ledger's trial MAEs depend on: every fold's matrices and the model's search settings
+    """
+    return hashlib.sha256(json.dumps({
+        "folds": [[season, fold_fingerprints[season]] for season, _ in fold_paths],
+        "space": SEARCH_SPACES[model_name],
+        "fixed": XGB_FIXED_PARAMS if model_name == "XGBoost" else {},
+        "early_stopping_rounds": EARLY_STOPPING_ROUNDS if model_name == "XGBoost" else None,
+    }, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def sample_configs(model_name, n_configs=N_CONFIGS, seed=RANDOM_SEED):
+    """
+    Configs to search, the whole grid if it is smaller than n_configs
+    """
+    space = SEARCH_SPACES[model_name]
+    grid = ParameterGrid(space)
+    if len(grid) <= n_configs:
+        return list(grid)
+    return list(ParameterSampler(space, n_iter=n_configs, random_state=seed))
+
+
+def _run_trial(job):
+    """
+    Worker entry point: score one config on one validation season
+    """
+    threads = job["n_threads"]
+    n_jobs = threads if job["model_name"] in THREADED_MODELS else None
+    matrices = load_shared_matrices(job["matrices_path"])
+    best_iteration = None
+
+    with threadpool_limits(limits=threads):
+        if job["model_name"] == "XGBoost":
+            X_train, y_train = matrices["X_train"], matrices["y_train"]
+            inner = np.asarray(matrices["train_row_seasons"]) == matrices["train_seasons"][-1]
+
+            params = {**XGB_FIXED_PARAMS, **job["params"], "early_stopping_rounds": EARLY_STOPPING_ROUNDS}
+            model = build_model("XGBoost", n_jobs=n_jobs, params=params)
+            model.fit(X_train[~inner], y_train[~inner], eval_set=[(X_train[inner], y_train[inner])], verbose=False)
+            best_iteration = int(model.best_iteration) + 1
+
+            #the whole fold with that round count, the way training fits the published params (final_params)
+            params = {**XGB_FIXED_PARAMS, **job["params"], "n_estimators": best_iteration}
+            model = build_model("XGBoost", n_jobs=n_jobs, params=params)
+            model.fit(X_train, y_train, verbose=False)
+            predictions = model.predict(matrices["X_test"])
+        else:
+            _, predictions = fit_predict(job["model_name"], matrices, n_jobs=n_jobs, params=job["params"])
+
+    return {
+        "config": job["config"],
+        "fold": job["fold"],
+        "mae": float(mean_absolute_error(matrices["y_test"], predictions)),
+        "best_iteration": best_iteration,
+    }
+
+
+def final_params(model_name, trial):
+    """
+    Registry params for a winning config (xgboost gets a fixed round count instead of early stopping)
+    """
+    params = dict(trial["params"])
+    if model_name == "XGBoost":
+        iterations = [f["best_iteration"] for f in trial["folds"].values()]
+        params = {**XGB_FIXED_PARAMS, **params, "n_estimators": int(np.median(iterations))}
+    return params
+
+
+def tune_model(pool, stat, model_name, fold_paths, ledger_uri, workers_threads, n_configs=N_CONFIGS,
+               fold_fingerprints=None):
+    """
+    Successive halving for one (stat, model)
+
+    fold_paths: [(validation season, matrices path)] newest first
+    fold_fingerprints: {validation season: matrices_fingerprint}
+    Results are written to ledger_uri as they come in; trials already there are not rerun, unless the
+    folds or the search space changed since (re-ingest, new features), then the ledger starts over
+    Returns the winning trial
+    """
+    fingerprint = ledger_fingerprint(model_name, fold_paths, fold_fingerprints or {})
+    ledger = read_json(ledger_uri, default={"trials": {}})
+    if ledger.get("fingerprint") != fingerprint:
+        if ledger["trials"]:
+            print(f"{stat} {model_name}: folds or search space changed, previous trials discarded")
+        ledger = {"fingerprint": fingerprint, "trials": {}}
+    trials = ledger["trials"]
+    configs = sample_configs(model_name, n_configs)
+    for params in configs:
+        trials.setdefault(_config_key(params), {"params": params, "folds": {}})
+
+    alive = [_config_key(p) for p in configs]
+    n_folds = 1
+
+    while True:
+        rung_folds = fold_paths[:n_folds]
+        jobs = [
+            {
+                "model_name": model_name,
+                "config": key,
+                "params": trials[key]["params"],
+                "fold": str(season),
+                "matrices_path": path,
+                "n_threads": workers_threads,
+            }
+            for key in alive
+            for season, path in rung_folds
+            if str(season) not in trials[key]["folds"]
+        ]
+
+        rung_start = time.perf_counter()
+        for future in as_completed([pool.submit(_run_trial, job) for job in jobs]):
+            result = future.result()
+            trials[result["config"]]["folds"][result["fold"]] = {
+                "mae": result["mae"],
+                "best_iteration": result["best_iteration"],
+            }
+            write_json(ledger_uri, ledger)
+
+        seasons = [str(season) for season, _ in rung_folds]
+        for key in alive:
+            trials[key]["score"] = float(np.mean([trials[key]["folds"][s]["mae"] for s in seasons]))
+        alive.sort(key=lambda key: trials[key]["score"])
+
+        print(f"{stat} {model_name}: {len(alive)} configs x {len(rung_folds)} seasons "
+              f"({len(jobs)} new fits, {time.perf_counter() - rung_start:.1f}s), "
+              f"best MAE {trials[alive[0]]['score']:.4f}")
+
+        if len(alive) == 1 or n_folds >= len(fold_paths):
+            break
+        alive = alive[:max(1, math.ceil(len(alive) / ETA))]
+        n_folds = min(n_folds * ETA, len(fold_paths))
+
+    write_json(ledger_uri, ledger)
+    return trials[alive[0]]
+
+
+def run_tuning(feature_uris, models_uri, model_names=None, n_configs=N_CONFIGS, max_folds=MAX_FOLDS,
+               max_workers=None, n_cores=None, publish=True):
+    """
+    Tune every (stat, model) and publish the winners for training.scheduler to pick up
+
+    feature_uris: {stat: features parquet uri}
+    Returns {"{stat}_{model}": params}
+    """
+    model_names = [m for m in (model_names or list(SEARCH_SPACES)) if m in SEARCH_SPACES]
+    start = time.perf_counter()
+
+    workers, inner_threads = plan_core_budget(n_configs, n_cores=n_cores, max_workers=max_workers)
+    print(f"Tuning {model_names} with {workers} processes x {inner_threads} threads")
+
+    matrices_dir = tempfile.mkdtemp(prefix="inningai_tuning_")
+    winners = {}
+
+    #spawn rather than fork, forking after xgboost/openmp has started threads can deadlock
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for stat, input_uri in feature_uris.items():
+            train_df, _, feature_cols = load_training_split(input_uri, stat)
+
+            #validation folds come from the training seasons only, standardized once per fold; each one needs
+            #two earlier seasons, the newest of them is xgboost's early stopping set
+            seasons = sorted(int(s) for s in train_df["Next_Season"].unique())
+            folds = [s for s in season_folds(train_df, max_folds) if sum(x < s for x in seasons) >= 2]
+
+            fold_paths, fold_fingerprints = [], {}
+            for season in folds:
+                matrices = prepare_matrices(
+                    train_df[train_df["Next_Season"] < season],
+                    train_df[train_df["Next_Season"] == season],
+                    feature_cols, stat
+                )
+                path = os.path.join(matrices_dir, f"{stat}_{season}.joblib")
+                joblib.dump(matrices, path)
+                fold_paths.append((season, path))
+                fold_fingerprints[season] = matrices_fingerprint(matrices)
+
+            for model_name in model_names:
+                name = f"{stat}_{model_name}"
+                ledger_uri = f"{models_uri.rstrip('/')}/tuning/{name}.json"
+                best = tune_model(pool, stat, model_name, fold_paths, ledger_uri, inner_threads, n_configs,
+                                  fold_fingerprints=fold_fingerprints)
+
+                winners[name] = final_params(model_name, best)
+                print(f"{name}: best {winners[name]} (MAE {best['score']:.4f})")
+                if publish:
+                    publish_tuned_params(models_uri, name, winners[name], best["score"])
+
+    shutil.rmtree(matrices_dir, ignore_errors=True)
+    print(f"Tuning done in {time.perf_counter() - start:.1f}s")
+    return winners
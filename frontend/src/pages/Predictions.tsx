@@ -317,6 +317,7 @@ export default function Predictions() {
                         <option value="RandomForest">Random Forest</option>
                         <option value="LinearRegression">Linear Regression</option>
                         <option value="Ridge">Ridge</option>
+                        <option value="Ensemble">Ensemble</option>
                     </select>
                 </div>
                 <button className="btn-primary" onClick={handleRunPredictions} disabled={loading}>
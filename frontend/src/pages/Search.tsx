@@ -57,6 +57,7 @@ const MODEL_OPTIONS = [
     { value: "ridge", label: "Ridge" },
     { value: "randomforest", label: "Random Forest" },
     { value: "xgboost", label: "XGBoost" },
+    { value: "ensemble", label: "Ensemble" },
 ];
 
 const fadeUp = {